@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from PyQt5.QtWidgets import QTableWidgetItem, QMessageBox
+from PyQt5.QtWidgets import QMessageBox
 from PyQt5 import QtCore
 import qtawesome as qta
 from datetime import date
+from table_models import RecordTableModel
+from sqlite_utils import PHONE_REGEX
 
 tday = date.today()
 
@@ -49,37 +51,33 @@ def table_column_size(table, columns: list):
         table.setColumnWidth(c, size)
 
 
-def display_table_records(table, rows, headers, right_column):
-    table.clear()
-    table.setRowCount(len(rows))       # required set row count for the tableWidget
-    table_row = 0                           # table Row
-    for row in rows:
-        # we are inside a tuple of records
-        for column, r in enumerate(row):
-            # index, item_text
-            item = QTableWidgetItem(str(r))                     # required; item must be QTableWidgetItem
-            table.setItem(table_row, column, item)         # add item to the table
-            if column in right_column:
-                item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)   # align credit field left
-        table_row += 1
+def set_table_model(table, headers, right_column=(), money_column=()):
+    # the views share one model for their whole life; refresh only swap its rows
+    model = RecordTableModel(headers, right_column, money_column, parent=table)
+    table.setModel(model)
+    return model
 
-    # horizontal headers labels
-    table.setHorizontalHeaderLabels(headers)
+
+def display_table_records(table, rows, headers, right_column, money_column=None):
+    model = table.model()
+    if not isinstance(model, RecordTableModel):
+        model = set_table_model(table, headers, right_column, money_column or ())
+    model.set_rows(rows, headers, right_column, money_column)
 
 
 def get_item_id(table):
-    row = table.currentRow()
-    id_table = str(table.item(row, 0).text())   # column 0 = art_id; this will return QTableWidgetItem.text()
+    row = table.currentIndex().row()
+    if row < 0:
+        return ''
+    id_table = str(table.model().row_id(row))   # column 0 = art_id
     return id_table
 
 
 def validate_phonenumber(phone):
-    import re
-    phone_regex = re.compile(r'^0(5|6|7)\d{8}')
     if len(phone) > 10:
         return False
     else:
-        if phone_regex.search(phone):
+        if PHONE_REGEX.search(phone):
             return True
         else:
             return False
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+#
+# description   : benchmarks for sqlite_utils
+#
+# usage         : python -m benchmarks.generate --credits 100000 --output /tmp/bench.db
+#                 python -m benchmarks.run /tmp/bench.db --output result.json [--compare previous.json]
+#                 python -m benchmarks.load_test /tmp/bench.db --readers 4 --writers 2
+#                 python -m benchmarks.group_commit /tmp/bench.db --credits 2000
+# ----------------------------------------------------------------------------
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       : 18-October-2026
+# description   : generate a synthetic creadit.db with the app schema
+#                 clients are skewed: a few clients own most of the credits
+#
+# usage         : python -m benchmarks.generate --credits 1000000 --output /tmp/bench.db
+# ----------------------------------------------------------------------------
+
+import argparse
+import pathlib
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import sqlite_utils
+
+FIRST_NAMES = ['mohamed', 'ahmed', 'karim', 'yacine', 'samir', 'nadia', 'amina', 'sara', 'omar', 'rachid',
+               'fatima', 'khaled', 'walid', 'nabil', 'houda', 'sofiane', 'ines', 'lyes', 'meriem', 'bilal']
+LAST_NAMES = ['benali', 'bouzid', 'haddad', 'mansouri', 'belkacem', 'saidi', 'cherif', 'djebbar',
+              'rahmani', 'ziani', 'boudiaf', 'hamidi', 'amrani', 'khelifi', 'lounis', 'touati']
+CHUNK = 50000
+
+
+def skewed_client(rnd, clients):
+    # power law; client 1 is the busiest
+    return int(clients * rnd.random() ** 3) + 1
+
+
+def generate(db_name, credits=10000, clients=None, max_payments=4, seed=1):
+    """
+    usage : generate('/tmp/bench.db', credits=100000)
+    return: dict with the number of rows of each table
+    """
+    path = pathlib.Path(db_name)
+    if path.exists():
+        path.unlink()
+    clients = clients or max(credits // 10, 1)
+    rnd = random.Random(seed)
+    start_date = datetime(2015, 1, 1)
+    days = (datetime(2026, 1, 1) - start_date).days
+
+    sqlite_utils.create_database(db_name)
+    conn = sqlite3.connect(db_name)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+
+    rows = []
+    for client_id in range(1, clients + 1):
+        name = '{} {}'.format(rnd.choice(FIRST_NAMES), rnd.choice(LAST_NAMES))
+        phone = '0{}{:08d}'.format(5 + client_id % 3, client_id)
+        rows.append((client_id, name, phone, 0))
+        if len(rows) == CHUNK:
+            conn.executemany('INSERT INTO Clients(id, name, phone, credit) VALUES(?, ?, ?, ?)', rows)
+            rows = []
+    conn.executemany('INSERT INTO Clients(id, name, phone, credit) VALUES(?, ?, ?, ?)', rows)
+
+    credit_rows, payment_rows = [], []
+    payments = 0
+    for fact_id in range(1, credits + 1):
+        credit_date = start_date + timedelta(days=rnd.randrange(days))
+        credit = rnd.randrange(5, 2000) * 100
+        versement = 0
+        for _ in range(rnd.randrange(max_payments + 1)):
+            payment = min(rnd.randrange(1, 20) * 100, credit - versement)
+            if payment <= 0:
+                break
+            versement += payment
+            payment_date = credit_date + timedelta(days=rnd.randrange(1, 120))
+            payment_rows.append((fact_id, str(payment_date), payment))
+        reste = credit - versement
+        paid = 'paid' if reste == 0 else 'not paid'
+        credit_rows.append((fact_id, skewed_client(rnd, clients), str(credit_date.date()), credit, versement, reste, paid))
+        if len(credit_rows) == CHUNK:
+            payments += flush(conn, credit_rows, payment_rows)
+            credit_rows, payment_rows = [], []
+    payments += flush(conn, credit_rows, payment_rows)
+
+    conn.execute('UPDATE Clients SET credit = (SELECT COALESCE(SUM(reste), 0) FROM Credits WHERE client_id = Clients.id)')
+    conn.commit()
+    conn.close()
+
+    # indexes, full-text index and dashboard are built by the app migrations
+    db_handler = sqlite_utils.SqliteFunc(db_name)
+    db_handler.migrate()
+    db_handler.close()
+    return {'clients': clients, 'credits': credits, 'payments': payments}
+
+
+def flush(conn, credit_rows, payment_rows):
+    conn.executemany('INSERT INTO Credits(id, client_id, credit_date, credit, versement, reste, paid) '
+                     'VALUES(?, ?, ?, ?, ?, ?, ?)', credit_rows)
+    conn.executemany('INSERT INTO Payments_log(fact_id, payment_date, payment) VALUES(?, ?, ?)', payment_rows)
+    conn.commit()
+    return len(payment_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='generate a synthetic credit app database')
+    parser.add_argument('--credits', type=int, default=10000, help='number of Credits rows (default 10000)')
+    parser.add_argument('--clients', type=int, default=None, help='number of clients (default credits / 10)')
+    parser.add_argument('--max-payments', type=int, default=4, help='max payments per credit (default 4)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='./bench.db')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = generate(args.output, args.credits, args.clients, args.max_payments, args.seed)
+    print('{} generated in {:.1f}s: {}'.format(args.output, time.perf_counter() - start, counts))
+
+
+if __name__ == '__main__':
+    main()
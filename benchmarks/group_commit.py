@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       : 18-October-2026
+# description   : credits inserted per second; one commit per credit vs group commit (WriteQueue)
+#                 every mode is durable (synchronous=FULL) except 'single_normal', the WAL default
+#
+# usage         : python -m benchmarks.group_commit /tmp/bench.db --credits 2000 --threads 8
+# ----------------------------------------------------------------------------
+
+import argparse
+import json
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date
+
+import sqlite_utils
+
+
+def open_db(db_name, group_commit, commit_window=0.0):
+    db_handler = sqlite_utils.SqliteFunc(db_name, wal=True, group_commit=group_commit, commit_window=commit_window)
+    db_handler.error_msg = lambda msg: None
+    return db_handler
+
+
+def client_ids(db_handler, count, seed=1):
+    desc, rows = db_handler.make_query('SELECT MAX(id) FROM Clients')
+    rnd = random.Random(seed)
+    return [rnd.randrange(1, rows[0][0] + 1) for _ in range(count)]
+
+
+def single(db_handler, ids, threads=1):
+    # one add_credit (one transaction) after the other
+    for client_id in ids:
+        db_handler.add_credit(client_id, 10, date.today())
+
+
+def burst(db_handler, ids, threads=1):
+    # the month end keying: submit every credit, then wait for all of them
+    futures = [db_handler.submit_credit(client_id, 10, date.today()) for client_id in ids]
+    return [future.result() for future in futures]
+
+
+def threaded(db_handler, ids, threads=8):
+    # several cashiers (threads) calling the blocking add_credit
+    parts = [ids[index::threads] for index in range(threads)]
+    workers = [threading.Thread(target=single, args=(db_handler, part)) for part in parts]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+MODES = {
+    # name: (function, group_commit, synchronous)
+    'single_normal': (single, False, 'NORMAL'),
+    'single_full': (single, False, 'FULL'),
+    'threads_full': (threaded, False, 'FULL'),
+    'group_threads': (threaded, True, 'FULL'),
+    'group_burst': (burst, True, 'FULL'),
+}
+
+
+def run(db_name, credits=2000, threads=8, commit_window=0.0):
+    report = {}
+    for name, (func, group_commit, synchronous) in MODES.items():
+        tmp_dir = tempfile.mkdtemp(prefix='credit_group_')
+        db_handler = open_db(shutil.copy(db_name, tmp_dir), group_commit, commit_window)
+        try:
+            if not group_commit:
+                db_handler.manager.writer.execute('PRAGMA synchronous = {}'.format(synchronous))
+            ids = client_ids(db_handler, credits)
+            start = time.perf_counter()
+            func(db_handler, ids, threads)
+            elapsed = time.perf_counter() - start
+            report[name] = {'credits': credits, 'seconds': elapsed, 'inserts_per_sec': credits / elapsed}
+            if db_handler.write_queue is not None:
+                report[name].update(db_handler.write_queue.stats)
+        finally:
+            db_handler.close()
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='group commit benchmark')
+    parser.add_argument('db_name')
+    parser.add_argument('--credits', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--commit-window', type=float, default=0.0, help='seconds')
+    args = parser.parse_args()
+    print(json.dumps(run(args.db_name, args.credits, args.threads, args.commit_window), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       : 18-October-2026
+# description   : several processes on the same database, like cashiers running the app together;
+#                 readers run long scans while writers add credits.
+#                 run once with the rollback journal and once with WAL and compare the writers latency
+#
+# usage         : python -m benchmarks.load_test /tmp/bench.db --readers 4 --writers 2 --seconds 10
+# ----------------------------------------------------------------------------
+
+import argparse
+import json
+import multiprocessing
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import date
+
+import sqlite_utils
+from benchmarks.run import percentile
+
+# a full scan; keep a shared lock on the file for its whole duration with the rollback journal
+READ_QUERY = 'SELECT client_id, SUM(reste), COUNT(id) FROM Credits GROUP BY client_id'
+
+
+def open_db(db_name, wal, busy_timeout):
+    db_handler = sqlite_utils.SqliteFunc(db_name, readers=True, wal=wal, busy_timeout=busy_timeout)
+    db_handler.error_msg = lambda msg: None         # failures are counted, not printed
+    return db_handler
+
+
+def reader(db_name, wal, busy_timeout, stop_at, results):
+    db_handler = open_db(db_name, wal, busy_timeout)
+    durations, failures = [], 0
+    while time.time() < stop_at:
+        start = time.perf_counter()
+        result = db_handler.make_query(READ_QUERY)
+        durations.append(time.perf_counter() - start)
+        if result is None:
+            failures += 1
+    db_handler.close()
+    results.put(('reader', durations, failures, 0))
+
+
+def writer(db_name, wal, busy_timeout, stop_at, results, seed):
+    db_handler = open_db(db_name, wal, busy_timeout)
+    rnd = random.Random(seed)
+    desc, rows = db_handler.make_query('SELECT MAX(id) FROM Clients')
+    clients = rows[0][0]
+    durations, failures = [], 0
+    while time.time() < stop_at:
+        start = time.perf_counter()
+        try:
+            result = db_handler.add_credit(rnd.randrange(1, clients + 1), rnd.randrange(1, 100), date.today())
+        except sqlite3.Error:
+            result = None
+        durations.append(time.perf_counter() - start)
+        if result is None:
+            failures += 1
+    retries = db_handler.manager.retry.retries
+    db_handler.close()
+    results.put(('writer', durations, failures, retries))
+
+
+def summary(durations, failures, seconds, retries=None):
+    durations.sort()
+    result = {
+        'operations': len(durations),
+        'failures': failures,
+        'ops_per_sec': len(durations) / seconds,
+        'p50_ms': percentile(durations, 50) * 1000 if durations else None,
+        'p99_ms': percentile(durations, 99) * 1000 if durations else None,
+        'max_ms': durations[-1] * 1000 if durations else None,
+    }
+    if retries is not None:
+        result['busy_retries'] = retries
+    return result
+
+
+def run(db_name, wal, readers=4, writers=2, seconds=10, busy_timeout=5000):
+    """
+    run the readers and writers processes on a copy of db_name
+    return: dict {'readers': summary, 'writers': summary}
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='credit_load_')
+    copy = shutil.copy(db_name, tmp_dir)
+    conn = sqlite3.connect(copy)
+    conn.execute('PRAGMA journal_mode = {}'.format('WAL' if wal else 'DELETE'))
+    conn.close()
+
+    results = multiprocessing.Queue()
+    stop_at = time.time() + seconds
+    processes = [multiprocessing.Process(target=reader, args=(copy, wal, busy_timeout, stop_at, results))
+                 for _ in range(readers)]
+    processes += [multiprocessing.Process(target=writer, args=(copy, wal, busy_timeout, stop_at, results, seed))
+                  for seed in range(writers)]
+    for process in processes:
+        process.start()
+    collected = {'reader': [[], 0, 0], 'writer': [[], 0, 0]}
+    for _ in processes:
+        kind, durations, failures, retries = results.get()
+        collected[kind][0].extend(durations)
+        collected[kind][1] += failures
+        collected[kind][2] += retries
+    for process in processes:
+        process.join()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return {
+        'readers': summary(collected['reader'][0], collected['reader'][1], seconds),
+        'writers': summary(collected['writer'][0], collected['writer'][1], seconds, collected['writer'][2]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='multi-process load test: rollback journal vs WAL')
+    parser.add_argument('db_name')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--busy-timeout', type=int, default=5000, help='ms')
+    args = parser.parse_args()
+
+    report = {}
+    for mode, wal in (('rollback_journal', False), ('wal', True)):
+        report[mode] = run(args.db_name, wal, args.readers, args.writers, args.seconds, args.busy_timeout)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
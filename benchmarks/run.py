@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       : 18-October-2026
+# description   : time the SqliteFunc operations on a generated database; report p50/p99 as json
+#                 the writes run on a copy of the database so the same file can be reused
+#
+# usage         : python -m benchmarks.run /tmp/bench.db --output result.json --compare previous.json
+# ----------------------------------------------------------------------------
+
+import argparse
+import json
+import pathlib
+import random
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+from datetime import date
+
+import sqlite_utils
+
+# the clients table load its rows by pages as it scrolls (table_models.RecordTableModel.set_source)
+PAGE_SIZE = 500
+RESTE_QUERY = 'SELECT reste FROM Credits WHERE id = ?'
+
+
+class Bench:
+    def __init__(self, db_handler, seed=1):
+        self.db = db_handler
+        self.rnd = random.Random(seed)
+        desc, rows = self.db.make_query('SELECT MAX(id) FROM Clients')
+        self.clients = rows[0][0] or 0
+        desc, rows = self.db.make_query('SELECT MAX(id) FROM Credits')
+        self.credits = rows[0][0] or 0
+        desc, rows = self.db.make_query('SELECT name FROM Clients ORDER BY random() LIMIT 100')
+        self.words = [name[0][:4] for name in rows if name[0]] or ['client']
+        self.phone = 0
+
+    def client_id(self):
+        return int(self.clients * self.rnd.random() ** 3) + 1
+
+    def fact_id(self):
+        return self.rnd.randrange(1, self.credits + 1)
+
+    # =========| Operations |=============================================
+    def add_client(self):
+        self.phone += 1
+        self.db.add_clients('bench client', '09{:08d}'.format(self.phone))
+
+    def add_credit(self):
+        self.db.add_credit(self.client_id(), self.rnd.randrange(5, 2000) * 100, date.today())
+
+    def add_payment(self):
+        fact_id = self.fact_id()
+        client = self.db.make_query('SELECT client_id FROM Credits WHERE id = ?', [fact_id])[1]
+        self.db.add_payment(client[0][0], fact_id, 1)
+
+    def search(self):
+        self.db.search_clients(self.rnd.choice(self.words))
+
+    def get_payment_log(self):
+        self.db.get_payment_log(self.fact_id())
+
+    def total_credit(self):
+        self.db.dashboard()
+
+    def refresh_listing(self):
+        # first page; what a refresh of the clients table read
+        self.db.clients_page(0, PAGE_SIZE)
+
+    def scroll_listing(self):
+        self.db.clients_page(self.rnd.randrange(0, self.clients + 1), PAGE_SIZE)
+
+    def refresh_details(self):
+        self.db.load_client_history(self.client_id(), archived=True)
+
+    def refresh_reste(self):
+        self.db.make_query(RESTE_QUERY, [self.fact_id()])
+
+    def client_badge(self):
+        self.db.client_badge(self.client_id())
+
+    OPERATIONS = ['add_client', 'add_credit', 'add_payment', 'search', 'get_payment_log', 'total_credit',
+                  'refresh_listing', 'scroll_listing', 'refresh_details', 'refresh_reste', 'client_badge']
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def time_operation(func, iterations):
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    durations.sort()
+    total = sum(durations)
+    return {
+        'iterations': iterations,
+        'p50_ms': percentile(durations, 50) * 1000,
+        'p99_ms': percentile(durations, 99) * 1000,
+        'mean_ms': total / iterations * 1000,
+        'ops_per_sec': iterations / total if total else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=pathlib.Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(db_name, iterations=200, operations=None, seed=1, in_place=False):
+    """
+    usage : run('/tmp/bench.db', iterations=100)
+    return: dict ready for json.dump
+    """
+    tmp_dir = None
+    if not in_place:
+        tmp_dir = tempfile.mkdtemp(prefix='credit_bench_')
+        db_name = shutil.copy(db_name, tmp_dir)
+
+    db_handler = sqlite_utils.SqliteFunc(db_name)
+    db_handler.migrate()
+    bench = Bench(db_handler, seed)
+    report = {
+        'commit': git_commit(),
+        'sqlite_version': sqlite3.sqlite_version,
+        'database': {'clients': bench.clients, 'credits': bench.credits,
+                     'size_mb': pathlib.Path(db_name).stat().st_size / 2 ** 20},
+        'operations': {},
+    }
+    try:
+        for name in operations or Bench.OPERATIONS:
+            report['operations'][name] = time_operation(getattr(bench, name), iterations)
+        report['badge_cache'] = db_handler.badge_cache.stats
+    finally:
+        db_handler.close()
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return report
+
+
+def compare(report, previous):
+    # p50 ratio against a previous report; > 1 means slower now
+    lines = []
+    for name, stats in report['operations'].items():
+        old = previous.get('operations', {}).get(name)
+        if old and old['p50_ms']:
+            lines.append('{:<18} p50 {:>9.3f}ms  was {:>9.3f}ms  x{:.2f}'.format(
+                name, stats['p50_ms'], old['p50_ms'], stats['p50_ms'] / old['p50_ms']))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark sqlite_utils on a generated database')
+    parser.add_argument('db_name')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--operations', nargs='*', choices=Bench.OPERATIONS)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--in-place', action='store_true', help='run the writes on the database itself')
+    parser.add_argument('--output', help='json file; default print to stdout')
+    parser.add_argument('--compare', help='previous json report')
+    args = parser.parse_args()
+
+    report = run(args.db_name, args.iterations, args.operations, args.seed, args.in_place)
+    result = json.dumps(report, indent=2)
+    if args.output:
+        pathlib.Path(args.output).write_text(result)
+    else:
+        print(result)
+    if args.compare:
+        print(compare(report, json.loads(pathlib.Path(args.compare).read_text())))
+
+
+if __name__ == '__main__':
+    main()
@@ -605,21 +605,11 @@ class Ui_MainWindow(object):
         self.horizontalLayout_18.addWidget(self.pushButtonAddCredit)
         self.horizontalLayout_7.addWidget(self.addCreditFrame)
         self.verticalLayout_13.addLayout(self.horizontalLayout_7)
-        self.tableWidget = QtWidgets.QTableWidget(self.main_page)
+        self.tableWidget = QtWidgets.QTableView(self.main_page)
         self.tableWidget.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         self.tableWidget.setAlternatingRowColors(True)
         self.tableWidget.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
         self.tableWidget.setObjectName("tableWidget")
-        self.tableWidget.setColumnCount(4)
-        self.tableWidget.setRowCount(0)
-        item = QtWidgets.QTableWidgetItem()
-        self.tableWidget.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.tableWidget.setHorizontalHeaderItem(1, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.tableWidget.setHorizontalHeaderItem(2, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.tableWidget.setHorizontalHeaderItem(3, item)
         self.tableWidget.horizontalHeader().setStretchLastSection(True)
         self.tableWidget.verticalHeader().setVisible(False)
         self.verticalLayout_13.addWidget(self.tableWidget)
@@ -692,7 +682,7 @@ class Ui_MainWindow(object):
         self.horizontalLayout_9 = QtWidgets.QHBoxLayout()
         self.horizontalLayout_9.setContentsMargins(-1, -1, -1, 10)
         self.horizontalLayout_9.setObjectName("horizontalLayout_9")
-        self.tableWidgetDetails = QtWidgets.QTableWidget(self.details_page)
+        self.tableWidgetDetails = QtWidgets.QTableView(self.details_page)
         self.tableWidgetDetails.setMinimumSize(QtCore.QSize(640, 0))
         font = QtGui.QFont()
         font.setFamily("Monaco")
@@ -703,21 +693,7 @@ class Ui_MainWindow(object):
         self.tableWidgetDetails.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
         self.tableWidgetDetails.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
         self.tableWidgetDetails.setGridStyle(QtCore.Qt.DashLine)
-        self.tableWidgetDetails.setColumnCount(6)
         self.tableWidgetDetails.setObjectName("tableWidgetDetails")
-        self.tableWidgetDetails.setRowCount(0)
-        item = QtWidgets.QTableWidgetItem()
-        self.tableWidgetDetails.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.tableWidgetDetails.setHorizontalHeaderItem(1, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.tableWidgetDetails.setHorizontalHeaderItem(2, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.tableWidgetDetails.setHorizontalHeaderItem(3, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.tableWidgetDetails.setHorizontalHeaderItem(4, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.tableWidgetDetails.setHorizontalHeaderItem(5, item)
         self.tableWidgetDetails.horizontalHeader().setDefaultSectionSize(100)
         self.tableWidgetDetails.horizontalHeader().setStretchLastSection(True)
         self.tableWidgetDetails.verticalHeader().setVisible(False)
@@ -731,7 +707,7 @@ class Ui_MainWindow(object):
         self.verticalLayout_7.setContentsMargins(0, 0, 0, 0)
         self.verticalLayout_7.setSpacing(0)
         self.verticalLayout_7.setObjectName("verticalLayout_7")
-        self.tableWidgetPayement = QtWidgets.QTableWidget(self.versementDetailFrame)
+        self.tableWidgetPayement = QtWidgets.QTableView(self.versementDetailFrame)
         font = QtGui.QFont()
         font.setFamily("Monaco")
         font.setPointSize(12)
@@ -739,12 +715,6 @@ class Ui_MainWindow(object):
         self.tableWidgetPayement.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         self.tableWidgetPayement.setAlternatingRowColors(True)
         self.tableWidgetPayement.setObjectName("tableWidgetPayement")
-        self.tableWidgetPayement.setColumnCount(2)
-        self.tableWidgetPayement.setRowCount(0)
-        item = QtWidgets.QTableWidgetItem()
-        self.tableWidgetPayement.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.tableWidgetPayement.setHorizontalHeaderItem(1, item)
         self.tableWidgetPayement.horizontalHeader().setDefaultSectionSize(140)
         self.tableWidgetPayement.horizontalHeader().setStretchLastSection(True)
         self.verticalLayout_7.addWidget(self.tableWidgetPayement)
@@ -784,32 +754,8 @@ class Ui_MainWindow(object):
         self.dateEditCredit.setToolTip(_translate("MainWindow", "تاريخ أخذ المال"))
         self.dateEditCredit.setDisplayFormat(_translate("MainWindow", "dd/MM/yyyy"))
         self.doubleSpinBoxCredit.setToolTip(_translate("MainWindow", "شحال تدي دراهم"))
-        item = self.tableWidget.horizontalHeaderItem(0)
-        item.setText(_translate("MainWindow", "ID"))
-        item = self.tableWidget.horizontalHeaderItem(1)
-        item.setText(_translate("MainWindow", "Name"))
-        item = self.tableWidget.horizontalHeaderItem(2)
-        item.setText(_translate("MainWindow", "Phone"))
-        item = self.tableWidget.horizontalHeaderItem(3)
-        item.setText(_translate("MainWindow", "Credits"))
         self.pushButtonMainPage.setToolTip(_translate("MainWindow", "Return To Main Table"))
         self.labelPaymentTitle.setText(_translate("MainWindow", "Payment"))
         self.doubleSpinBoxPayment.setToolTip(_translate("MainWindow", "شحال تدفع"))
-        item = self.tableWidgetDetails.horizontalHeaderItem(0)
-        item.setText(_translate("MainWindow", "ID"))
-        item = self.tableWidgetDetails.horizontalHeaderItem(1)
-        item.setText(_translate("MainWindow", "Date"))
-        item = self.tableWidgetDetails.horizontalHeaderItem(2)
-        item.setText(_translate("MainWindow", "Credit"))
-        item = self.tableWidgetDetails.horizontalHeaderItem(3)
-        item.setText(_translate("MainWindow", "Payment"))
-        item = self.tableWidgetDetails.horizontalHeaderItem(4)
-        item.setText(_translate("MainWindow", "Reste"))
-        item = self.tableWidgetDetails.horizontalHeaderItem(5)
-        item.setText(_translate("MainWindow", "Paid"))
-        item = self.tableWidgetPayement.horizontalHeaderItem(0)
-        item.setText(_translate("MainWindow", "Date"))
-        item = self.tableWidgetPayement.horizontalHeaderItem(1)
-        item.setText(_translate("MainWindow", "Payment"))
 from stacked_widgetAnimation import QCustomStackedWidget
 import resource_rc
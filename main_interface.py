@@ -9,14 +9,31 @@
 # self.stackedWidgetMain = QCustomStackedWidget(self.widget_2)
 # ----------------------------------------------------------------------------
 
+import os
 from PyQt5.QtWidgets import QApplication, QMainWindow, QMessageBox
 from PyQt5 import QtCore
 import qtawesome as qta
 from headers.h_interface import Ui_MainWindow
 import app_utils
 import sqlite_utils
+import sqlite_backup
+from query_worker import QueryWorker
 db_name = './creadit.db'
-db_handler = sqlite_utils.SqliteFunc(db_name)
+# several cashiers may run the app on the same file: WAL, separate readers (one per worker thread) and busy retry
+# no group commit: one window write one credit or payment at a time, a group would hold a single write
+# and pay the full fsync of the WriteQueue for it (see benchmarks/group_commit.py for the bursts it helps)
+db_handler = sqlite_utils.SqliteFunc(db_name, readers=True, wal=True, busy_timeout=5000)
+db_handler.migrate()
+
+# CREDIT_APP_QUERY_STATS=stats.json python main_interface.py; dump the query stats on exit
+query_stats_file = os.environ.get('CREDIT_APP_QUERY_STATS')
+query_stats = sqlite_utils.QueryStats(slow_ms=50) if query_stats_file else None
+if query_stats:
+    db_handler.add_instrument(query_stats)
+
+# CREDIT_APP_BACKUP_DIR=./backups python main_interface.py; online backup every hour while the app runs
+backup_dir = os.environ.get('CREDIT_APP_BACKUP_DIR')
+backups = sqlite_backup.BackupScheduler(db_handler, backup_dir, interval=3600) if backup_dir else None
 
 
 class CreditApp(QMainWindow):
@@ -28,6 +45,18 @@ class CreditApp(QMainWindow):
         self.table = self.ui.tableWidget
         self.table_details = self.ui.tableWidgetDetails
         self.client_id = ''
+        self.history = None             # ClientHistory of the client on the details page
+
+        # =========| Background Queries |=============================================
+        self.worker = QueryWorker(self)
+        self.worker.failed.connect(lambda key, error: app_utils.error_msgbox(self, error))
+
+        # =========| Table Models |===================================================
+        # money columns hold integer cents
+        app_utils.set_table_model(self.table, ['ID', 'Name', 'Phone', 'Credit'], money_column=[3])
+        app_utils.set_table_model(self.table_details, ['ID', 'Date', 'Credit', 'Payment', 'Reste', 'Paid'],
+                                  [2, 3, 4, 5], money_column=[2, 3, 4])
+        app_utils.set_table_model(self.ui.tableWidgetPayement, ['Date', 'Payment'], money_column=[1])
 
         # set main table column size
         columns_size = [(0, 60), (1, 300), (2, 300)]
@@ -46,10 +75,17 @@ class CreditApp(QMainWindow):
         self.ui.lineEditCalculator.returnPressed.connect(self.calculate)
         self.ui.pushButtonMenu.clicked.connect(self.display_menu)
 
-        self.table.itemDoubleClicked.connect(self.display_client_details)
-        self.table.itemSelectionChanged.connect(self.enable_credits)
-        self.table_details.itemSelectionChanged.connect(self.enable_payment_form)
-
+        self.table.doubleClicked.connect(self.display_client_details)
+        self.table.selectionModel().selectionChanged.connect(self.enable_credits)
+        self.table_details.selectionModel().selectionChanged.connect(self.enable_payment_form)
+
+        # search as you type; wait for a pause in the keystrokes before searching
+        self.client_search = sqlite_utils.IncrementalSearch(db_handler.search_clients)
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.search)
+        self.ui.lineEditSearch.textChanged.connect(self.search_typed)
         self.ui.lineEditSearch.returnPressed.connect(self.search)
 
         self.ui.pushButtonAddClient.clicked.connect(self.create_client)
@@ -61,7 +97,6 @@ class CreditApp(QMainWindow):
 
         # =========| Initial Display |================================================
         self.display_all_records()
-        self.total_credit()
 
     def calculate(self):
         try:
@@ -70,17 +105,48 @@ class CreditApp(QMainWindow):
             to_calculate = 'number + number'
         self.ui.lineEditCalculator.setText(str(to_calculate))
 
+    def search_typed(self, text):
+        # a word extending the previous one is refined in memory right away; only a database search wait
+        # for a pause in the keystrokes
+        if self.ui.stackedWidgetMain.currentIndex() == 0 and text.strip() and self.refine_clients(text):
+            self.search_timer.stop()
+            return
+        self.search_timer.start()
+
+    def refine_clients(self, search_word):
+        rows = self.client_search.cached(search_word)
+        if rows is None:
+            return False
+        self.worker.cancel('clients')
+        app_utils.display_table_records(self.table, rows, ['ID', 'Name', 'Phone', 'Credit'], [3])
+        return True
+
     def search(self):
+        self.search_timer.stop()
         by = self.ui.stackedWidgetMain.currentIndex()
         search_word = self.ui.lineEditSearch.text()
         if by == 0:
-            table_name = 'Clients'
+            # clients are searched on all fields at once with the full-text index
             table_widget = self.table
-            fields = ['id', 'name', 'phone', 'credit']
-            search_fields = ['name', 'phone', 'credit']
             headers = ['ID', 'Name', 'Phone', 'Credit']
             right_column = [3]
+            if not search_word.strip():
+                self.display_all_records()
+                return
+            if self.refine_clients(search_word):
+                return
+
+            def display(rows):
+                self.client_search.store(search_word, rows)
+                app_utils.display_table_records(table_widget, rows, headers, right_column)
+
+            self.worker.submit('clients', db_handler.search_clients, search_word, callback=display)
+            return
         elif by == 1:
+            if not search_word.strip():
+                # search box cleared: back to the invoices of the current client, not every client
+                self.dump_client_records()
+                return
             table_name = 'Credits'
             table_widget = self.table_details
             fields = ['id', 'credit_date', 'credit', 'versement', 'reste', 'paid']
@@ -88,8 +154,9 @@ class CreditApp(QMainWindow):
             headers = ['ID', 'Date', 'Credit', 'Versement', 'Reste', 'Paid']
             right_column = [2, 3, 4, 5]
 
-        rows = db_handler.search(search_word, table_name, fields, search_fields)
-        app_utils.display_table_records(table_widget, rows, headers, right_column)
+        # a new search or listing make the previous one stale
+        self.worker.submit('details', db_handler.search, search_word, table_name, fields, search_fields,
+                           callback=lambda rows: app_utils.display_table_records(table_widget, rows, headers, right_column))
 
     def display_menu(self):
         left_menu = self.ui.leftMenuContainer
@@ -116,22 +183,23 @@ class CreditApp(QMainWindow):
         self.display_all_records()
 
     def display_all_records(self):
-        # this function dump all records; send result to display_records method
-        # fields = ['id', 'name', 'phone', 'credit']
-        query = 'SELECT id, name, phone, credit FROM Clients'
-        params = []
-        desc, rows = db_handler.make_query(query, params)
-        headers = ['ID', 'Name', 'Phone', 'Credit']
-        right_column = []
-        app_utils.display_table_records(self.table, rows, headers, right_column)
+        # the clients are loaded page by page as the table scroll (fetchMore), on the worker
+        self.client_search.reset()
+        self.worker.submit('refresh_badges', db_handler.refresh_badges)
+        self.worker.cancel('clients')           # drop a pending search result
+        self.table.model().set_source(db_handler.clients_page, submit=self.fetch_clients)
         self.total_credit()         # count total credits and clients
 
+    def fetch_clients(self, fetch_page, after_id, limit, callback):
+        # a page and a search share the key: the newer one make the other stale
+        self.worker.submit('clients', fetch_page, after_id, limit, callback=callback)
+
     def total_credit(self):
-        query = 'SELECT COUNT(id), SUM(credit) FROM Clients'
-        desc, rows = db_handler.make_query(query)
-        clients, credits = rows[0]
-        self.ui.labelTotalClients.setText(str(clients))
-        self.ui.labelTotalCredits.setText(str(credits) + ' DA')
+        self.worker.submit('dashboard', db_handler.dashboard, callback=self.show_dashboard)
+
+    def show_dashboard(self, dashboard):
+        self.ui.labelTotalClients.setText(str(dashboard.total_clients))
+        self.ui.labelTotalCredits.setText(str(dashboard.total_credit) + ' DA')
 
     def create_client(self):
         name = self.ui.lineEditName.text()
@@ -141,23 +209,77 @@ class CreditApp(QMainWindow):
             error_msg = 'Invalid phone number.\nMust start with 05 | 06 | 07 and 10 digits long\nExample: 0556000000'
             app_utils.error_msgbox(self, error_msg)
         else:
-            result = db_handler.add_clients(name, phone)
-            if result == 'sqlite integrity error':
-                # if result == 'UNIQUE constraint failed: Clients.phone':
-                error_msg = 'This phone already exist.'
-                app_utils.error_msgbox(self, error_msg)
-            self.display_all_records()
+            def added(result):
+                if result == 'sqlite integrity error':
+                    # if result == 'UNIQUE constraint failed: Clients.phone':
+                    error_msg = 'This phone already exist.'
+                    app_utils.error_msgbox(self, error_msg)
+
+            self.submit_write('add_client', db_handler.add_clients, name, phone, callback=added)
+
+    def submit_write(self, key, func, *args, callback=None):
+        """
+        run the write on the worker write thread, then read there the rows it touched (changed_rows);
+        the gui thread only patch its tables with them
+        callback(result of func) once the tables are patched
+        """
+        details = self.ui.stackedWidgetMain.currentWidget() == self.ui.details_page
+
+        def write():
+            result = func(*args)
+            if isinstance(result, sqlite_utils.ChangeSet):
+                return result, self.changed_rows(result, details)
+            return result, None
+
+        def done(written):
+            result, rows = written
+            if rows is not None:
+                self.apply_changes(result, rows)
+            if callback is not None:
+                callback(result)
+
+        self.worker.submit(key, write, write=True, callback=done)
+
+    @staticmethod
+    def changed_rows(changes, details):
+        # on the worker thread: the rows a write touched, and the new totals
+        rows = {'clients': [], 'credits': [], 'payment_logs': [], 'dashboard': db_handler.dashboard()}
+        ids = changes.changed.get('Clients')
+        if ids:
+            rows['clients'] = db_handler.client_rows(ids)
+        ids = changes.changed.get('Credits')
+        if ids and details:
+            rows['credits'] = db_handler.credit_rows(ids)
+            rows['payment_logs'] = db_handler.payment_logs(ids)
+        return rows
+
+    def apply_changes(self, changes, rows):
+        # patch only the rows a write touched; the tables are not reloaded
+        self.client_search.reset()
+        deleted = changes.deleted.get('Clients')
+        if deleted:
+            self.table.model().remove_ids(deleted)
+        if rows['clients']:
+            # a search result is displayed (no paged source): a new or changed client may not match it
+            searching = self.table.model().fetch_page is None
+            self.table.model().patch_rows(rows['clients'], append=False if searching else None)
+        if rows['credits'] and self.ui.stackedWidgetMain.currentWidget() == self.ui.details_page:
+            self.table_details.model().patch_rows(rows['credits'], append=False)
+            if self.history is not None:
+                self.history.patch(rows['credits'], rows['payment_logs'])
+        self.show_dashboard(rows['dashboard'])
 
     def get_badge(self, reset=False):
         if reset:
-            self.ui.labelClientName.setText('')
-            self.ui.labelClientPhone.setText('')
-            self.ui.labelClientTotalCredit.setText('')
+            self.worker.cancel('badge')
+            self.show_badge(None)
         else:
-            badge = db_handler.client_badge(self.client_id)
-            self.ui.labelClientName.setText(badge.name)
-            self.ui.labelClientPhone.setText(badge.phone)
-            self.ui.labelClientTotalCredit.setText(str(badge.credit))
+            self.worker.submit('badge', db_handler.client_badge, self.client_id, callback=self.show_badge)
+
+    def show_badge(self, badge):
+        self.ui.labelClientName.setText(badge.name if badge else '')
+        self.ui.labelClientPhone.setText(badge.phone if badge else '')
+        self.ui.labelClientTotalCredit.setText(str(badge.credit) if badge else '')
 
     def enable_credits(self):
         self.client_id = app_utils.get_item_id(self.table)
@@ -195,19 +317,26 @@ class CreditApp(QMainWindow):
         msg = 'Are you sure to delete Client.'
         msg_box = app_utils.question_msgbox(self, msg_title, msg)
         if msg_box == QMessageBox.Yes:
-            result = db_handler.delete_client(self.client_id)
-            if result:
-                self.get_badge(reset=True)
-                self.display_all_records()
-                self.ui.stackedWidgetMain.setCurrentWidget(self.ui.main_page)
+            def deleted(result):
+                if result:
+                    self.get_badge(reset=True)
+                    self.ui.stackedWidgetMain.setCurrentWidget(self.ui.main_page)
+
+            self.submit_write('del_client', db_handler.delete_client, self.client_id, callback=deleted)
 
     def dump_client_records(self):
-        query = 'SELECT id, DATE(credit_date), credit, versement, reste, paid FROM Credits WHERE client_id = ? ORDER BY id'
-        params = [self.client_id]
-        desc, rows = db_handler.make_query(query, params)
+        # invoices and all their payments in one query; selections are then served from self.history
+        # the paid invoices moved to the yearly archives are read back too (only for clients who have some)
         headers = ['ID', 'Date', 'Credit', 'Payment', 'Reste', 'Paid']
         right_column = [2, 3, 4, 5]
-        app_utils.display_table_records(self.table_details, rows, headers, right_column)
+
+        def display(history):
+            self.history = history
+            app_utils.display_table_records(self.table_details, history.invoices, headers, right_column)
+
+        self.history = None
+        self.worker.submit('details', db_handler.load_client_history, self.client_id, archived=True,
+                           callback=display)
 
     def add_credit(self):
         # client_id = app_utils.get_item_id(self.table)
@@ -217,25 +346,33 @@ class CreditApp(QMainWindow):
             error_msg = 'You must add a credit.'
             app_utils.error_msgbox(self, error_msg)
         else:
-            db_handler.add_credit(self.client_id, credit, credit_date)
+            def added(changes):
+                if changes:
+                    self.display_client_details()
+                    self.get_badge()
+
             self.ui.doubleSpinBoxCredit.setValue(0)
-            self.display_client_details()
-            self.total_credit()
-            self.get_badge()
+            self.submit_write('add_credit', db_handler.add_credit, self.client_id, credit, credit_date, callback=added)
 
     def enable_payment_form(self):
         fact_id = app_utils.get_item_id(self.table_details)
-        # display data in payment table
-        rows = db_handler.get_payment_log(fact_id)
-        app_utils.display_table_records(self.ui.tableWidgetPayement, rows, ['Date', 'Payment'], [])
-
-        query = 'SELECT reste FROM Credits WHERE id = ?'
-        desc, rows = db_handler.make_query(query, [fact_id])
-        try:
-            reste = rows[0][0]
-        except Exception:
-            pass
-        else:
+        if not fact_id:
+            return
+        if self.history is not None and fact_id in self.history:
+            # loaded with the client history; no query
+            app_utils.display_table_records(self.ui.tableWidgetPayement, self.history.payment_log(fact_id),
+                                            ['Date', 'Payment'], [])
+            self.toggle_payment_form(self.history.reste(fact_id))
+            return
+
+        # an invoice of another client (search on the details page)
+        self.worker.submit('payment_log', db_handler.get_payment_log, fact_id,
+                           callback=lambda rows: app_utils.display_table_records(self.ui.tableWidgetPayement,
+                                                                                 rows, ['Date', 'Payment'], []))
+        self.worker.submit('reste', db_handler.get_client_reste, fact_id, callback=self.toggle_payment_form)
+
+    def toggle_payment_form(self, reste):
+        if reste is not None:
             if len(self.table_details.selectionModel().selectedRows()) > 0 and reste != 0:
                 self.ui.doubleSpinBoxPayment.setEnabled(True)
                 self.ui.pushButtonAddPayment.setEnabled(True)
@@ -252,14 +389,35 @@ class CreditApp(QMainWindow):
         fact_id = app_utils.get_item_id(self.table_details)
 
         # fetch if Payment !> facture reste
-        reste = db_handler.get_client_reste(fact_id)
-        if payment > reste:
-            error_msg = 'Your payment is greater than reste'
-            app_utils.error_msgbox(self, error_msg)
+        if self.history is not None and fact_id in self.history:
+            self.check_payment(self.client_id, fact_id, payment, self.history.reste(fact_id))
         else:
-            db_handler.add_payment(self.client_id, fact_id, payment)
-            self.dump_client_records()
-            self.total_credit()
+            client_id = self.client_id
+            self.worker.submit('payment_reste', db_handler.get_client_reste, fact_id,
+                               callback=lambda reste: self.check_payment(client_id, fact_id, payment, reste))
+
+    def check_payment(self, client_id, fact_id, payment, reste):
+        if sqlite_utils.Money.from_amount(payment) <= reste:
+            self.submit_write('add_payment', db_handler.add_payment, client_id, fact_id, payment,
+                              callback=self.payment_added)
+            return
+
+        def on_account(badge):
+            if sqlite_utils.Money.from_amount(payment) > badge.credit:
+                error_msg = 'Your payment is greater than the client credit'
+                app_utils.error_msgbox(self, error_msg)
+                return
+            # "something on account": spread over all the open invoices of the client, oldest first
+            msg = 'Your payment is greater than reste.\nPay the open invoices of the client, oldest first?'
+            if app_utils.question_msgbox(self, 'Payment on account', msg) == QMessageBox.Yes:
+                self.submit_write('add_payment', db_handler.pay_on_account, client_id, payment,
+                                  callback=self.payment_added)
+
+        self.worker.submit('payment_badge', db_handler.client_badge, client_id, callback=on_account)
+
+    def payment_added(self, changes):
+        if changes:
+            self.enable_payment_form()          # payment log and reste of the selected invoice
             self.get_badge()
 
 
@@ -267,5 +425,12 @@ if __name__ == '__main__':
     import sys
     app = QApplication(sys.argv)
     window = CreditApp()
+    app.aboutToQuit.connect(window.worker.shutdown)
+    if query_stats:
+        app.aboutToQuit.connect(lambda: query_stats.dump(query_stats_file))
+    if backups:
+        backups.start()
+        app.aboutToQuit.connect(backups.stop)
+    app.aboutToQuit.connect(db_handler.close)
     window.show()
     sys.exit(app.exec_())
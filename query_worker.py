@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       : 18-October-2026
+# description   : run SqliteFunc calls off the gui thread and deliver the results with signals
+#
+# usage         : worker = QueryWorker(self)
+#                 worker.submit('search', db_handler.search_clients, word, callback=self.show_rows)
+# ----------------------------------------------------------------------------
+
+import threading
+from PyQt5 import QtCore
+
+
+class QueryTask(QtCore.QRunnable):
+    def __init__(self, worker, key, generation, func, args, kwargs, callback):
+        super().__init__()
+        self.worker = worker
+        self.key = key
+        self.generation = generation
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.callback = callback
+
+    def run(self):
+        # a newer request with the same key was submitted before this one started; skip it
+        if not self.worker.is_current(self.key, self.generation):
+            return
+        try:
+            result = self.func(*self.args, **self.kwargs)
+        except Exception as err:
+            self.worker._failed.emit(self.key, self.generation, str(err))
+        else:
+            self.worker._done.emit(self.key, self.generation, result, self.callback)
+
+
+class QueryWorker(QtCore.QObject):
+    """
+    Reads run on a small thread pool; writes on a single thread so they keep their order.
+    every read has a key; submitting again with the same key make the previous one stale:
+    it is skipped if not started yet and its result is dropped otherwise.
+    writes are never cancelled (generation 0).
+    """
+    finished = QtCore.pyqtSignal(str, object)       # key, result
+    failed = QtCore.pyqtSignal(str, str)            # key, error message
+
+    _done = QtCore.pyqtSignal(str, int, object, object)
+    _failed = QtCore.pyqtSignal(str, int, str)
+
+    def __init__(self, parent=None, max_threads=2):
+        super().__init__(parent)
+        # the pool threads never expire: each one keep its reader connection (ConnectionManager.reader)
+        # for the whole session instead of leaking one per new thread
+        self.read_pool = QtCore.QThreadPool(self)
+        self.read_pool.setMaxThreadCount(max_threads)
+        self.read_pool.setExpiryTimeout(-1)
+        self.write_pool = QtCore.QThreadPool(self)
+        self.write_pool.setMaxThreadCount(1)
+        self.write_pool.setExpiryTimeout(-1)
+        self.generations = {}
+        self.lock = threading.Lock()
+
+        # emitted from the pool threads; queued to the thread of this object (the gui thread)
+        self._done.connect(self._deliver)
+        self._failed.connect(self._deliver_error)
+
+    def submit(self, key, func, *args, callback=None, write=False, **kwargs):
+        """
+        usage : submit('clients', db_handler.make_query, query, params, callback=self.display)
+        return: generation number of the request
+        """
+        if write:
+            generation = 0
+        else:
+            with self.lock:
+                generation = self.generations.get(key, 0) + 1
+                self.generations[key] = generation
+        task = QueryTask(self, key, generation, func, args, kwargs, callback)
+        if write:
+            self.write_pool.start(task)
+        else:
+            self.read_pool.start(task)
+        return generation
+
+    def cancel(self, key):
+        with self.lock:
+            self.generations[key] = self.generations.get(key, 0) + 1
+
+    def is_current(self, key, generation):
+        if generation == 0:
+            return True
+        with self.lock:
+            return self.generations.get(key) == generation
+
+    def _deliver(self, key, generation, result, callback):
+        if not self.is_current(key, generation):
+            return
+        if callback is not None:
+            callback(result)
+        self.finished.emit(key, result)
+
+    def _deliver_error(self, key, generation, error):
+        if self.is_current(key, generation):
+            self.failed.emit(key, error)
+
+    def shutdown(self):
+        # wait for the running requests; called before closing the database
+        self.read_pool.clear()
+        self.read_pool.waitForDone()
+        self.write_pool.waitForDone()
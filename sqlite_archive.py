@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       : 18-October-2026
+# description   : move the paid invoices and their payment logs out of creadit.db
+#                 into one archive database per year (creadit_2019.db, ...)
+#                 SqliteFunc.load_client_history(client_id, archived=True) read them back
+#
+# usage         : python sqlite_archive.py --db creadit.db --before 2025-01-01 [--vacuum]
+# ----------------------------------------------------------------------------
+
+import argparse
+import json
+import sqlite3
+from datetime import date
+
+import sqlite_utils
+from sqlite_utils import ARCHIVE_SCHEMA, archive_path, atache_database
+
+BATCH_SIZE = 2000
+
+
+def create_archive(path):
+    conn = sqlite3.connect(path)
+    try:
+        for query in ARCHIVE_SCHEMA:
+            conn.execute(query)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def archive_years(db_handler, before):
+    query = ("SELECT DISTINCT CAST(strftime('%Y', credit_date) AS INTEGER) FROM Credits "
+             "WHERE paid = 'paid' AND DATE(credit_date) < DATE(?) ORDER BY 1")
+    desc, rows = db_handler.make_query(query, [str(before)])
+    return [year for year, in rows if year]
+
+
+def archive_batch(manager, year, before, batch_size):
+    """
+    move one batch of paid invoices of the year; two transactions:
+    1 copy the invoices and their logs into the archive (INSERT OR REPLACE, so a batch copied again is harmless)
+    2 delete from the hot database only what the archive hold
+    a crash between the two leaves the batch in both files, never in none; the next run finish it
+    return: number of invoices moved
+    """
+    select_ids = ("SELECT id FROM main.Credits WHERE paid = 'paid' AND DATE(credit_date) < DATE(?) "
+                  "AND credit_date >= ? AND credit_date < ? ORDER BY id LIMIT ?")
+    with manager.transaction() as curs:
+        curs.execute(select_ids, [str(before), '{}-01-01'.format(year), '{}-01-01'.format(year + 1), batch_size])
+        ids = json.dumps([fact_id for fact_id, in curs.fetchall()])
+        curs.execute('INSERT OR REPLACE INTO archive.Credits(id, client_id, credit_date, credit, versement, reste, paid) '
+                     'SELECT id, client_id, credit_date, credit, versement, reste, paid FROM main.Credits '
+                     'WHERE id IN (SELECT value FROM json_each(?))', [ids])
+        moved = curs.rowcount
+        curs.execute('INSERT OR REPLACE INTO archive.Payments_log(id, fact_id, payment_date, payment) '
+                     'SELECT id, fact_id, payment_date, payment FROM main.Payments_log '
+                     'WHERE fact_id IN (SELECT value FROM json_each(?))', [ids])
+    if not moved:
+        return 0
+
+    with manager.transaction() as curs:
+        archived = 'SELECT id FROM archive.Credits WHERE id IN (SELECT value FROM json_each(?))'
+        curs.execute('INSERT INTO Archive_index(client_id, year, invoices) '
+                     'SELECT client_id, ?, COUNT(id) FROM main.Credits WHERE id IN ({}) GROUP BY client_id '
+                     'ON CONFLICT(client_id, year) DO UPDATE SET invoices = invoices + excluded.invoices'
+                     .format(archived), [year, ids])
+        curs.execute('SELECT COUNT(id), COALESCE(SUM(payment), 0) FROM main.Payments_log '
+                     'WHERE fact_id IN ({})'.format(archived), [ids])
+        payments, total = curs.fetchone()
+        curs.execute('SELECT COALESCE(MAX(seq), 0) FROM main.Changes')
+        last_seq = curs.fetchone()[0]
+        curs.execute('DELETE FROM main.Payments_log WHERE fact_id IN ({})'.format(archived), [ids])
+        curs.execute('DELETE FROM main.Credits WHERE id IN ({})'.format(archived), [ids])
+        invoices = curs.rowcount
+        # archived, not deleted: the merge with another shop (sqlite_sync) must not delete them there
+        curs.execute("UPDATE main.Changes SET op = 'A' WHERE seq > ? AND op = 'D'", [last_seq])
+        # the Dashboard triggers just removed them; the archived invoices still count in the totals
+        curs.execute('UPDATE Dashboard SET paid_invoices = paid_invoices + ?, total_payments = total_payments + ?',
+                     [invoices, total])
+    return invoices
+
+
+def archive_paid(db_handler, before=None, batch_size=BATCH_SIZE, vacuum=False, progress=None):
+    """
+    move the paid invoices with a credit_date before `before` (default: the 1st January of this year)
+    usage : archive_paid(db_handler, before='2025-01-01')
+            progress(year, moved) after each batch
+    return: dict {year: invoices moved}
+    """
+    before = before or date(date.today().year, 1, 1)
+    manager = db_handler.manager
+    moved = {}
+    for year in archive_years(db_handler, before):
+        path = archive_path(db_handler.db_name, year)
+        create_archive(path)
+        # ATTACH is not allowed inside a transaction; attach to the writer for the whole year
+        with manager.write_lock:
+            curs = manager.writer.cursor()
+            atache_database(curs, "'{}'".format(path.replace("'", "''")), 'archive')
+            try:
+                while True:
+                    count = archive_batch(manager, year, before, batch_size)
+                    if not count:
+                        break
+                    moved[year] = moved.get(year, 0) + count
+                    if progress is not None:
+                        progress(year, moved[year])
+            finally:
+                curs.execute('DETACH DATABASE archive')
+    if moved:
+        db_handler.badge_cache.clear()
+        if vacuum:
+            # give the freed pages back to the file system; rewrite the whole file
+            with manager.write_lock:
+                manager.writer.execute('VACUUM')
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description='move the paid invoices into yearly archive databases')
+    parser.add_argument('--db', default='./creadit.db')
+    parser.add_argument('--before', help='YYYY-MM-DD; default the 1st January of this year')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--vacuum', action='store_true', help='shrink creadit.db after the move')
+    args = parser.parse_args()
+
+    db_handler = sqlite_utils.SqliteFunc(args.db)
+    db_handler.migrate()
+    try:
+        moved = archive_paid(db_handler, args.before, args.batch_size, args.vacuum,
+                             progress=lambda year, count: print('{}: {} invoices'.format(year, count)))
+    finally:
+        db_handler.close()
+    print(moved)
+
+
+if __name__ == '__main__':
+    main()
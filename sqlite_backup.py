@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       : 18-October-2026
+# description   : online backup of creadit.db with the sqlite backup api, while the app keep working
+#                 the pages are copied a few at a time with a pause between the steps;
+#                 the copy is checked with PRAGMA integrity_check, gzip compressed and the old
+#                 generations are removed
+#
+# usage         : python sqlite_backup.py ./backups --db creadit.db --keep 7 [--every 3600]
+#                 python sqlite_backup.py --verify ./backups/creadit-20261018-120000-000000.db.gz
+# ----------------------------------------------------------------------------
+
+import argparse
+import gzip
+import os
+import pathlib
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import sqlite_utils
+
+PAGES = 256                 # pages per step; 1MB with the default 4096 bytes pages
+SLEEP = 0.01                # seconds between two steps; the app connections get the database meanwhile
+RESTARTS = 3                # copies restarted by a write of the app before the copy in one step
+KEEP = 7
+
+
+class BackupError(Exception):
+    pass
+
+
+class BackupRestarted(Exception):
+    pass
+
+
+def integrity_check(path):
+    """
+    return: list of problems; empty when the database is ok
+    """
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute('PRAGMA integrity_check').fetchall()
+    except sqlite3.DatabaseError as err:
+        return [str(err)]           # too damaged for the check itself (malformed, not a database)
+    finally:
+        conn.close()
+    return [] if rows == [('ok',)] else [row[0] for row in rows]
+
+
+def verify_backup(path):
+    # a .gz generation is decompressed in a temporary file first
+    path = pathlib.Path(path)
+    if path.suffix != '.gz':
+        return integrity_check(str(path))
+    with tempfile.TemporaryDirectory(prefix='credit_verify_') as tmp_dir:
+        copy = pathlib.Path(tmp_dir) / path.stem
+        with gzip.open(path, 'rb') as source, open(copy, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        return integrity_check(str(copy))
+
+
+def generations(directory, stem):
+    # the backups of this database, newest first; not the copies still in progress
+    return sorted((path for path in pathlib.Path(directory).glob('{}-*.db*'.format(stem))
+                   if path.suffix != '.partial'), reverse=True)
+
+
+def copy_pages(source, target, pages, sleep, restarts, progress):
+    """
+    copy `pages` pages per step; a write of the app between two steps make sqlite start the copy again.
+    after `restarts` restarts the copy is made in one step: one read transaction, that with WAL
+    does not block the writers either
+    """
+    remaining = [None, 0]            # remaining pages after the last step, restarts seen
+
+    def step(status, left, total):
+        if remaining[0] is not None and left > remaining[0]:
+            remaining[1] += 1
+            if remaining[1] > restarts:
+                raise BackupRestarted()
+        remaining[0] = left
+        if progress is not None:
+            progress(status, left, total)
+
+    try:
+        source.backup(target, pages=pages, progress=step, sleep=sleep)
+    except BackupRestarted:
+        source.backup(target, pages=-1, progress=progress)
+    return remaining[1]
+
+
+def backup(db_handler, directory, pages=PAGES, sleep=SLEEP, keep=KEEP, compress=True, restarts=RESTARTS,
+           progress=None):
+    """
+    usage : path = backup(db_handler, './backups')
+            progress(status, remaining, total) is called after each step (see sqlite3.Connection.backup)
+    the copy is made from a connection of its own, never from the app connections
+    return: path of the new generation; raise BackupError when the copy is not sound
+    """
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    stem = pathlib.Path(db_handler.db_name).stem
+    # microseconds: two backups in the same second are two generations; the names still sort by time
+    name = '{}-{}.db'.format(stem, datetime.now().strftime('%Y%m%d-%H%M%S-%f'))
+    partial = directory / (name + '.partial')
+    path = directory / (name + '.gz' if compress else name)
+    try:
+        open(partial, 'x').close()          # claim the name; another backup never replace this one
+    except FileExistsError:
+        raise BackupError('{} is already being written'.format(partial))
+    if path.exists():
+        partial.unlink()
+        raise BackupError('{} already exists'.format(path))
+
+    source = db_handler.manager.connect()
+    target = sqlite3.connect(str(partial))
+    try:
+        copy_pages(source, target, pages, sleep, restarts, progress)
+        # a single file copy; the app WAL mode is not needed to read a backup
+        target.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        target.close()
+        source.close()
+
+    problems = integrity_check(str(partial))
+    if problems:
+        partial.unlink()
+        raise BackupError('backup of {} failed the integrity check: {}'.format(db_handler.db_name, problems[:5]))
+
+    if compress:
+        with open(partial, 'rb') as source_file, gzip.open(str(path) + '.partial', 'wb', compresslevel=6) as target_file:
+            shutil.copyfileobj(source_file, target_file, 1024 * 1024)
+        os.replace(str(path) + '.partial', str(path))
+        partial.unlink()
+    else:
+        os.replace(str(partial), str(path))
+
+    for old in generations(directory, stem)[keep:]:
+        old.unlink()
+    return path
+
+
+class BackupScheduler:
+    def __init__(self, db_handler, directory, interval=3600, **options):
+        """
+        Run backup() every `interval` seconds on a background thread.
+        options: pages, sleep, keep, compress, restarts (see backup)
+        usage : scheduler = BackupScheduler(db_handler, './backups', interval=3600); scheduler.start()
+        """
+        self.db_handler = db_handler
+        self.directory = directory
+        self.interval = interval
+        self.options = options
+        self.last_path = None
+        self.last_error = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def run_now(self):
+        try:
+            self.last_path = backup(self.db_handler, self.directory, **self.options)
+            self.last_error = None
+        except (sqlite3.Error, OSError, BackupError) as err:
+            self.last_error = err
+            self.db_handler.error_msg('backup failed: {}'.format(err))
+        return self.last_path
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.run_now()
+
+    def start(self):
+        if self.thread is None:
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self.run, name='sqlite-backup', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        # wait for a running backup to finish
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='online backup of the credit app database')
+    parser.add_argument('directory', nargs='?', default='./backups')
+    parser.add_argument('--db', default='./creadit.db')
+    parser.add_argument('--pages', type=int, default=PAGES, help='pages per step')
+    parser.add_argument('--sleep', type=float, default=SLEEP, help='seconds between steps')
+    parser.add_argument('--keep', type=int, default=KEEP, help='generations to keep')
+    parser.add_argument('--no-compress', action='store_true')
+    parser.add_argument('--every', type=float, help='seconds; run again and again')
+    parser.add_argument('--verify', help='check a backup file instead')
+    args = parser.parse_args()
+
+    if args.verify:
+        problems = verify_backup(args.verify)
+        print('ok' if not problems else '\n'.join(problems))
+        return
+
+    db_handler = sqlite_utils.SqliteFunc(args.db)
+    options = {'pages': args.pages, 'sleep': args.sleep, 'keep': args.keep, 'compress': not args.no_compress}
+    try:
+        while True:
+            start = time.perf_counter()
+            path = backup(db_handler, args.directory, **options)
+            print('{} in {:.1f}s'.format(path, time.perf_counter() - start))
+            if not args.every:
+                break
+            time.sleep(args.every)
+    finally:
+        db_handler.close()
+
+
+if __name__ == '__main__':
+    main()
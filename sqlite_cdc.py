@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       : 18-October-2026
+# description   : ship the changes of a credit app database to another node (shop)
+#                 the Changes table (filled by triggers, see sqlite_utils.migration_changes) tell which
+#                 rows changed after a seq; a batch carry the current state of these rows once each,
+#                 so bringing a node up to date cost O(changes) and not a copy of the whole file
+#                 one way: a node follows another one; see sqlite_sync for the two ways merge
+#
+# usage         : python sqlite_cdc.py export --db shop_a.db --since 1200 --output ./outbox
+#                 python sqlite_cdc.py apply ./outbox/changes-*.json.gz --db shop_b.db
+#                 python sqlite_cdc.py pull --source shop_a.db --db shop_b.db
+#                 python sqlite_cdc.py renew --db shop_b.db [--source shop_a.db]     # shop_b.db is a copy
+# ----------------------------------------------------------------------------
+
+import argparse
+import gzip
+import json
+import pathlib
+
+import sqlite_utils
+from sqlite_utils import CDC_TABLES, ChangeSet, Error
+
+COLUMNS = {
+    'Clients': ['id', 'add_date', 'name', 'phone', 'credit'],
+    'Credits': ['id', 'client_id', 'credit_date', 'credit', 'versement', 'reste', 'paid', 'uid'],
+    'Payments_log': ['id', 'fact_id', 'payment_date', 'payment', 'uid'],
+}
+BATCH_SIZE = 5000           # Changes rows per batch
+LAST_OPS = """SELECT row_id, op FROM Changes WHERE seq IN (
+                  SELECT MAX(seq) FROM Changes WHERE seq > ? AND seq <= ? AND table_name = ? GROUP BY row_id)"""
+
+
+def node_id(conn):
+    return conn.execute('SELECT node_id FROM Cdc_node').fetchone()[0]
+
+
+def renew_node(db_handler, original_handler=None):
+    """
+    a new node id for a database just copied from another one (same Cdc_node); the copy already has
+    the changes of the original up to now. with original_handler the original also learn that the
+    copy hold nothing new yet, and the first merge does not ship the common rows back
+    usage : shutil.copy('shop_a.db', 'shop_b.db'); renew_node(SqliteFunc('shop_b.db'), SqliteFunc('shop_a.db'))
+    return: the new node id
+    """
+    with db_handler.manager.transaction() as curs:
+        old_node = node_id(curs)
+        curs.execute('UPDATE Cdc_node SET node_id = lower(hex(randomblob(8)))')
+        curs.execute('SELECT COALESCE(MAX(seq), 0) FROM Changes')
+        copied = curs.fetchone()[0]
+        curs.execute('INSERT OR REPLACE INTO Cdc_peers(node_id, last_seq) VALUES(?, ?)', [old_node, copied])
+        new_node = node_id(curs)
+    if original_handler is not None:
+        original_handler.make_query('INSERT OR REPLACE INTO Cdc_peers(node_id, last_seq) VALUES(?, ?)',
+                                    [new_node, copied])
+    return new_node
+
+
+def check_since(conn, since):
+    # the changes after `since` must all be there; Changes pruned beyond it can not be shipped
+    first = conn.execute('SELECT MIN(seq) FROM Changes').fetchone()[0]
+    if first is None:
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'Changes'").fetchone()
+        first = row[0] + 1 if row else 1
+    if since + 1 < first:
+        # a backup copy keep the node id of its database: renew it before it applies or ships changes
+        raise Error('the changes before seq {} were pruned; start this node from a backup copy '
+                    'and give it its own node id (python sqlite_cdc.py renew)'.format(first))
+
+
+def batch_end(conn, since, batch_size, until=None):
+    # last seq of the batch after since: batch_size Changes rows at most, never after until
+    check_since(conn, since)
+    row = conn.execute('SELECT seq FROM Changes WHERE seq > ? ORDER BY seq LIMIT 1 OFFSET ?',
+                       [since, batch_size - 1]).fetchone()
+    to_seq = row[0] if row else conn.execute('SELECT MAX(seq) FROM Changes').fetchone()[0]
+    if until is not None and to_seq is not None:
+        to_seq = min(to_seq, until)
+    if to_seq is None or to_seq <= since:
+        return None
+    return to_seq
+
+
+# =========| Export |===========================================================
+def export_changes(db_handler, since=0, batch_size=BATCH_SIZE):
+    """
+    the rows changed after seq `since`; at most batch_size Changes rows
+    return: batch dict {'node', 'from_seq', 'to_seq', 'tables': {table: {'columns', 'upserts', 'deletes'}}}
+            | None when there is nothing after since
+    """
+    conn = db_handler.manager.connect()
+    conn.execute('BEGIN')           # one snapshot for the seq range and the rows
+    try:
+        to_seq = batch_end(conn, since, batch_size)
+        if to_seq is None:
+            return None
+        batch = {'node': node_id(conn), 'from_seq': since, 'to_seq': to_seq, 'tables': {}}
+        for table in CDC_TABLES:
+            # the last op of each changed row; a row archived (sqlite_archive) is gone from here, not deleted
+            last_ops = dict(conn.execute(LAST_OPS, [since, to_seq, table]))
+            ids = list(last_ops)
+            if not ids:
+                continue
+            # a row changed several times is shipped once, as it is now; gone rows become deletes
+            upserts = conn.execute('SELECT {} FROM {} WHERE id IN (SELECT value FROM json_each(?)) ORDER BY id'.format(
+                ', '.join(COLUMNS[table]), table), [json.dumps(ids)]).fetchall()
+            found = {row[0] for row in upserts}
+            batch['tables'][table] = {'columns': COLUMNS[table], 'upserts': [list(row) for row in upserts],
+                                      'deletes': sorted(row_id for row_id in set(ids) - found if last_ops[row_id] != 'A')}
+        return batch
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def export_batches(db_handler, since=0, batch_size=BATCH_SIZE):
+    # every batch after since, in order
+    while True:
+        batch = export_changes(db_handler, since, batch_size)
+        if batch is None:
+            return
+        yield batch
+        since = batch['to_seq']
+
+
+def write_batch(batch, path):
+    with gzip.open(path, 'wt', encoding='utf-8') as file:
+        json.dump(batch, file, ensure_ascii=False, separators=(',', ':'))
+
+
+def read_batch(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        return json.load(file)
+
+
+# =========| Apply |============================================================
+def last_seq(db_handler, source_node):
+    # last seq of source_node applied to this database
+    desc, rows = db_handler.make_query('SELECT last_seq FROM Cdc_peers WHERE node_id = ?', [source_node])
+    return rows[0][0] if rows else 0
+
+
+def check_batch(curs, batch):
+    """
+    inside the apply transaction
+    return: False for a batch already applied; raise Error for our own batch or a batch after a missing one
+    """
+    if node_id(curs) == batch['node']:
+        raise Error('a database can not apply its own changes; a copied database need its own node id first '
+                    '(python sqlite_cdc.py renew)')
+    curs.execute('SELECT last_seq FROM Cdc_peers WHERE node_id = ?', [batch['node']])
+    row = curs.fetchone()
+    applied = row[0] if row else 0
+    if batch['to_seq'] <= applied:
+        return False
+    if batch['from_seq'] > applied:
+        raise Error('missing changes of node {}: seq {} to {}'.format(batch['node'], applied, batch['from_seq']))
+    return True
+
+
+def set_last_seq(curs, batch):
+    curs.execute('INSERT INTO Cdc_peers(node_id, last_seq) VALUES(?, ?) '
+                 'ON CONFLICT(node_id) DO UPDATE SET last_seq = excluded.last_seq', [batch['node'], batch['to_seq']])
+
+
+def apply_changes(db_handler, batch):
+    """
+    apply a batch in one transaction, with the new last seq of its node (Cdc_peers)
+    a batch already applied is skipped; a batch after a missing one raise Error
+    return: ChangeSet of the rows written
+    """
+    changes = ChangeSet()
+    with db_handler.manager.transaction() as curs:
+        if not check_batch(curs, batch):
+            return changes
+
+        tables = batch['tables']
+        # deletes first, children first (a deleted client phone can be taken again by a new client)
+        for table in reversed(CDC_TABLES):
+            if table in tables and tables[table]['deletes']:
+                curs.execute('DELETE FROM {} WHERE id IN (SELECT value FROM json_each(?))'.format(table),
+                             [json.dumps(tables[table]['deletes'])])
+                for row_id in tables[table]['deletes']:
+                    changes.delete(table, row_id)
+        # then parents first; an upsert fire the update triggers (dashboard, full-text index)
+        for table in CDC_TABLES:
+            if table not in tables or not tables[table]['upserts']:
+                continue
+            columns = tables[table]['columns']
+            curs.executemany('INSERT INTO {0}({1}) VALUES({2}) ON CONFLICT(id) DO UPDATE SET {3}'.format(
+                table, ', '.join(columns), ', '.join('?' * len(columns)),
+                ', '.join('{0} = excluded.{0}'.format(column) for column in columns[1:])), tables[table]['upserts'])
+            for row in tables[table]['upserts']:
+                changes.change(table, row[0])
+
+        set_last_seq(curs, batch)
+    db_handler.badge_cache.clear()
+    return changes
+
+
+def pull(db_handler, source_handler, batch_size=BATCH_SIZE):
+    """
+    bring db_handler up to date with source_handler; both databases reachable from here
+    return: number of batches applied
+    """
+    desc, rows = source_handler.make_query('SELECT node_id FROM Cdc_node')
+    source_node = rows[0][0]
+    desc, rows = db_handler.make_query('SELECT node_id FROM Cdc_node')
+    if rows[0][0] == source_node:
+        # db_handler was copied from the source (a backup restored): it already has everything up to now
+        renew_node(db_handler, source_handler)
+    count = 0
+    for batch in export_batches(source_handler, last_seq(db_handler, source_node), batch_size):
+        apply_changes(db_handler, batch)
+        count += 1
+    return count
+
+
+def prune_changes(db_handler, upto_seq):
+    """
+    forget the Changes up to upto_seq, once every node has applied them
+    usage : prune_changes(db_handler, min(seq applied by each node))
+    """
+    return db_handler.make_query('DELETE FROM Changes WHERE seq <= ?', [upto_seq])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ship the changes of a credit app database to another node')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help='write the changes after a seq as batch files')
+    export.add_argument('--db', default='./creadit.db')
+    export.add_argument('--since', type=int, default=0, help='last seq the other node applied')
+    export.add_argument('--output', default='./outbox')
+    export.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    apply = commands.add_parser('apply', help='apply batch files, in order')
+    apply.add_argument('batches', nargs='+')
+    apply.add_argument('--db', default='./creadit.db')
+    pull_command = commands.add_parser('pull', help='apply the changes of another database file')
+    pull_command.add_argument('--source', required=True)
+    pull_command.add_argument('--db', default='./creadit.db')
+    pull_command.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    renew = commands.add_parser('renew', help='a new node id for a database copied from another one')
+    renew.add_argument('--db', default='./creadit.db')
+    renew.add_argument('--source', help='the database it was copied from')
+    args = parser.parse_args()
+
+    db_handler = sqlite_utils.SqliteFunc(args.db)
+    db_handler.migrate()
+    try:
+        if args.command == 'export':
+            output = pathlib.Path(args.output)
+            output.mkdir(parents=True, exist_ok=True)
+            for batch in export_batches(db_handler, args.since, args.batch_size):
+                path = output / 'changes-{}-{:012d}.json.gz'.format(batch['node'], batch['to_seq'])
+                write_batch(batch, path)
+                print(path)
+        elif args.command == 'apply':
+            for path in sorted(args.batches):
+                print(path, apply_changes(db_handler, read_batch(path)))
+        elif args.command == 'renew':
+            source_handler = sqlite_utils.SqliteFunc(args.source) if args.source else None
+            try:
+                print('node id {}'.format(renew_node(db_handler, source_handler)))
+            finally:
+                if source_handler is not None:
+                    source_handler.close()
+        else:
+            source_handler = sqlite_utils.SqliteFunc(args.source)
+            source_handler.migrate()
+            try:
+                print('{} batches applied'.format(pull(db_handler, source_handler, args.batch_size)))
+            finally:
+                source_handler.close()
+    finally:
+        db_handler.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       : 18-October-2026
+# description   : export Clients, Credits and Payments_log to csv, xlsx or json lines
+#                 rows are streamed from the cursor by batches; the whole table is never in memory
+#                 (xlsxwriter constant_memory mode write each row to disk as it comes)
+# requirement   : xlsxwriter for xlsx files
+#
+# usage         : python sqlite_export.py ./export --db creadit.db --format csv --from 2024-01-01 --to 2024-12-31
+#                 python sqlite_export.py ledger.xlsx --db creadit.db --client 12 --client 15
+# ----------------------------------------------------------------------------
+
+import argparse
+import csv
+import json
+import pathlib
+
+import sqlite_utils
+from sqlite_utils import format_money
+
+# table: (select, date column, client column, money columns (indexes))
+EXPORTS = {
+    'Clients': ('SELECT id, add_date, name, phone, credit FROM Clients',
+                'add_date', 'id', [4]),
+    'Credits': ('SELECT id, client_id, credit_date, credit, versement, reste, paid FROM Credits',
+                'credit_date', 'client_id', [3, 4, 5]),
+    'Payments_log': ('SELECT Payments_log.id, Credits.client_id, fact_id, payment_date, payment '
+                     'FROM Payments_log JOIN Credits ON Credits.id = Payments_log.fact_id',
+                     'payment_date', 'Credits.client_id', [4]),
+}
+FORMATS = ['csv', 'xlsx', 'jsonl']
+BATCH_SIZE = 5000
+XLSX_MAX_ROWS = 1048576         # rows of an excel sheet; the rest go to 'Credits (2)', ...
+
+
+def export_query(table, date_from=None, date_to=None, client_ids=None):
+    """
+    return: (query, params) of the table with the filters; ordered by id
+    """
+    query, date_column, client_column, money = EXPORTS[table]
+    where, params = [], []
+    if date_from:
+        where.append('DATE({}) >= DATE(?)'.format(date_column))
+        params.append(str(date_from))
+    if date_to:
+        where.append('DATE({}) <= DATE(?)'.format(date_column))
+        params.append(str(date_to))
+    if client_ids:
+        # one parameter whatever the number of clients
+        where.append('{} IN (SELECT value FROM json_each(?))'.format(client_column))
+        params.append(json.dumps([int(client_id) for client_id in client_ids]))
+    if where:
+        query += ' WHERE ' + ' AND '.join(where)
+    return query + ' ORDER BY {}.id'.format(table), params
+
+
+def stream_rows(conn, query, params, batch_size=BATCH_SIZE):
+    # yield the rows by batches of fetchmany; one batch in memory at a time
+    curs = conn.cursor()
+    curs.arraysize = batch_size
+    curs.execute(query, params)
+    yield [column[0] for column in curs.description]
+    while True:
+        rows = curs.fetchmany()
+        if not rows:
+            return
+        yield from rows
+
+
+def money_row(row, money):
+    row = list(row)
+    for index in money:
+        row[index] = format_money(row[index])
+    return row
+
+
+# =========| Writers |==========================================================
+def write_csv(path, rows, money):
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(next(rows))
+        for row in rows:
+            writer.writerow(money_row(row, money))
+            count += 1
+    return count
+
+
+def write_jsonl(path, rows, money):
+    count = 0
+    with open(path, 'w', encoding='utf-8') as file:
+        header = next(rows)
+        for row in rows:
+            file.write(json.dumps(dict(zip(header, money_row(row, money))), ensure_ascii=False))
+            file.write('\n')
+            count += 1
+    return count
+
+
+def write_sheets(workbook, table, rows, money):
+    # amounts are written as numbers with 2 decimals; a full sheet continue on the next one
+    money_format = workbook.add_format({'num_format': '0.00'})
+    header = next(rows)
+    count, sheet_row, sheets = 0, XLSX_MAX_ROWS, 0
+    for row in rows:
+        if sheet_row == XLSX_MAX_ROWS:
+            sheets += 1
+            worksheet = workbook.add_worksheet(table if sheets == 1 else '{} ({})'.format(table, sheets))
+            worksheet.write_row(0, 0, header)
+            sheet_row = 1
+        for column, value in enumerate(row):
+            if column in money and isinstance(value, int):
+                worksheet.write_number(sheet_row, column, value / 100, money_format)
+            else:
+                worksheet.write(sheet_row, column, value)
+        sheet_row += 1
+        count += 1
+    if not sheets:
+        workbook.add_worksheet(table).write_row(0, 0, header)
+    return count
+
+
+def xlsx_workbook(path):
+    try:
+        import xlsxwriter
+    except ImportError:
+        raise ImportError('xlsxwriter is needed to export xlsx files: pip install xlsxwriter')
+    return xlsxwriter.Workbook(str(path), {'constant_memory': True, 'strings_to_numbers': False})
+
+
+# =========| Export |===========================================================
+def export_ledger(db_handler, path, fmt=None, tables=None, date_from=None, date_to=None, client_ids=None,
+                  batch_size=BATCH_SIZE):
+    """
+    usage : export_ledger(db_handler, 'ledger.xlsx', date_from='2024-01-01')
+            export_ledger(db_handler, './export', 'csv', client_ids=[12])     # export/Clients.csv, ...
+    xlsx: one workbook, a sheet per table; csv and jsonl: one file per table in the directory path
+    return: dict {table: exported rows}
+    """
+    path = pathlib.Path(path)
+    fmt = fmt or path.suffix.lstrip('.').lower()
+    if fmt not in FORMATS:
+        raise ValueError('unknown export format {!r}; one of {}'.format(fmt, ', '.join(FORMATS)))
+    tables = tables or list(EXPORTS)
+
+    # its own connection: a long export does not hold the app connections; one read transaction
+    # so the tables are exported from the same snapshot
+    conn = db_handler.manager.connect()
+    conn.execute('BEGIN')
+    workbook = xlsx_workbook(path) if fmt == 'xlsx' else None
+    if workbook is None:
+        path.mkdir(parents=True, exist_ok=True)
+    counts = {}
+    try:
+        for table in tables:
+            query, params = export_query(table, date_from, date_to, client_ids)
+            rows = stream_rows(conn, query, params, batch_size)
+            money = EXPORTS[table][3]
+            if workbook is not None:
+                counts[table] = write_sheets(workbook, table, rows, money)
+            elif fmt == 'csv':
+                counts[table] = write_csv(path / '{}.csv'.format(table), rows, money)
+            else:
+                counts[table] = write_jsonl(path / '{}.jsonl'.format(table), rows, money)
+    finally:
+        if workbook is not None:
+            workbook.close()
+        conn.rollback()
+        conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='export the credit ledger to csv, xlsx or json lines')
+    parser.add_argument('path', help='xlsx file, or directory for csv and jsonl')
+    parser.add_argument('--db', default='./creadit.db')
+    parser.add_argument('--format', choices=FORMATS, help='default: the extension of path')
+    parser.add_argument('--tables', nargs='*', choices=list(EXPORTS))
+    parser.add_argument('--from', dest='date_from', help='YYYY-MM-DD')
+    parser.add_argument('--to', dest='date_to', help='YYYY-MM-DD')
+    parser.add_argument('--client', dest='client_ids', type=int, action='append', help='client id; repeatable')
+    args = parser.parse_args()
+
+    db_handler = sqlite_utils.SqliteFunc(args.db)
+    try:
+        counts = export_ledger(db_handler, args.path, args.format, args.tables, args.date_from, args.date_to,
+                               args.client_ids)
+    finally:
+        db_handler.close()
+    print(counts)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       : 18-October-2026
+# description   : bulk import of clients and their opening credit from a csv or xlsx file
+#                 the file is read by chunks; each chunk is one transaction that also record
+#                 the last imported line in Import_jobs, so an interrupted import resume where it stopped
+# requirement   : openpyxl for xlsx files
+#
+# usage         : python sqlite_import.py legacy.csv --db creadit.db
+#                 columns: name, phone, credit [, credit_date]; a header line is optional
+# ----------------------------------------------------------------------------
+
+import argparse
+import csv
+import pathlib
+import re
+import time
+from datetime import date, datetime
+from decimal import InvalidOperation
+
+import sqlite_utils
+from sqlite_utils import Money, PHONE_REGEX
+
+COLUMNS = ['name', 'phone', 'credit', 'credit_date']
+HEADER_NAMES = {
+    'name': 'name', 'nom': 'name', 'client': 'name',
+    'phone': 'phone', 'tel': 'phone', 'telephone': 'phone', 'mobile': 'phone',
+    'credit': 'credit', 'balance': 'credit', 'solde': 'credit',
+    'credit_date': 'credit_date', 'date': 'credit_date',
+}
+CHUNK_SIZE = 10000
+IN_CHUNK = 500              # phones per IN (...) query; under the sqlite variables limit
+
+
+class ImportReport:
+    def __init__(self, source):
+        self.source = source
+        self.imported = 0
+        self.duplicates = []        # (line, phone, name); phone already in Clients or earlier in the file
+        self.invalid = []           # (line, value, reason)
+        self.resumed_at = 0         # last line imported by a previous (interrupted) run
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return '<ImportReport {}: imported={} duplicates={} invalid={} resumed_at={} in {:.1f}s>'.format(
+            self.source, self.imported, len(self.duplicates), len(self.invalid), self.resumed_at, self.seconds)
+
+
+# =========| Reading |==========================================================
+def normalize_phone(phone):
+    """
+    '+213 550-12.34.56' -> '0550123456'
+    return: the phone | None when it is not a valid mobile number
+    """
+    if phone is None:
+        return None
+    if isinstance(phone, (int, float)):
+        phone = '0{:d}'.format(int(phone))          # xlsx cells lose the leading 0
+    phone = re.sub(r'[\s\-.()/]', '', str(phone))
+    if phone.startswith('+213'):
+        phone = '0' + phone[4:]
+    elif phone.startswith('00213'):
+        phone = '0' + phone[5:]
+    if len(phone) == 10 and PHONE_REGEX.match(phone):
+        return phone
+    return None
+
+
+def parse_amount(value):
+    # '1 500,50' | 1500.5 | '' -> Money; raise ValueError
+    if value is None or value == '':
+        return Money(0)
+    if isinstance(value, str):
+        value = value.replace(' ', '').replace('\xa0', '')
+        if ',' in value and '.' not in value:
+            value = value.replace(',', '.')
+    try:
+        amount = Money.from_amount(value)
+    except InvalidOperation:
+        raise ValueError('invalid amount {!r}'.format(value))
+    if amount < 0:
+        raise ValueError('negative amount {!r}'.format(value))
+    return amount
+
+
+def parse_date(value):
+    if value is None or value == '':
+        return str(date.today())
+    if isinstance(value, datetime):
+        return str(value.date())
+    return str(value)
+
+
+def header_columns(row):
+    """
+    return: list of column names for a header line | None when the row is data
+    """
+    names = [HEADER_NAMES.get(str(value or '').strip().lower()) for value in row]
+    return names if 'phone' in names else None
+
+
+def read_rows(path):
+    # yield (line number, tuple of cells); line 1 is the first line of the file
+    path = pathlib.Path(path)
+    if path.suffix.lower() in ('.xlsx', '.xlsm'):
+        try:
+            import openpyxl
+        except ImportError:
+            raise ImportError('openpyxl is needed to import xlsx files: pip install openpyxl')
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            for line, row in enumerate(workbook.active.iter_rows(values_only=True), 1):
+                yield line, row
+        finally:
+            workbook.close()
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as file:
+            sample = file.read(4096)
+            file.seek(0)
+            try:
+                dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+            except csv.Error:
+                dialect = csv.excel
+            for line, row in enumerate(csv.reader(file, dialect), 1):
+                yield line, row
+
+
+def read_chunks(path, chunk_size=CHUNK_SIZE, skip_to=0):
+    """
+    yield lists of (line, record dict); the lines <= skip_to are not parsed
+    """
+    columns = COLUMNS
+    chunk = []
+    for line, row in read_rows(path):
+        if line == 1:
+            header = header_columns(row)
+            if header is not None:
+                columns = header
+                continue
+        if line <= skip_to or not any(row):
+            continue
+        chunk.append((line, {column: value for column, value in zip(columns, row) if column}))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def validate_chunk(chunk, report, seen):
+    """
+    normalize the chunk; invalid rows and phones repeated in the file go to the report
+    seen: phones of the file already taken by an earlier line (across chunks)
+    return: list of (line, name, phone, Money credit, credit_date)
+    """
+    rows = []
+    for line, record in chunk:
+        phone = normalize_phone(record.get('phone'))
+        if phone is None:
+            report.invalid.append((line, record.get('phone'), 'invalid phone number'))
+            continue
+        try:
+            credit = parse_amount(record.get('credit'))
+        except ValueError as err:
+            report.invalid.append((line, record.get('credit'), str(err)))
+            continue
+        name = str(record.get('name') or '').strip()
+        if phone in seen:
+            report.duplicates.append((line, phone, name))
+            continue
+        seen.add(phone)
+        rows.append((line, name, phone, credit, parse_date(record.get('credit_date'))))
+    return rows
+
+
+def existing_phones(curs, phones):
+    found = set()
+    for start in range(0, len(phones), IN_CHUNK):
+        part = phones[start:start + IN_CHUNK]
+        curs.execute('SELECT phone FROM Clients WHERE phone IN ({})'.format(', '.join('?' * len(part))), part)
+        found.update(phone for phone, in curs.fetchall())
+    return found
+
+
+# =========| Import |===========================================================
+def insert_clients(curs, rows):
+    """
+    rows: (name, phone, credit)
+    the full-text trigger tokenize the clients one by one; during the import it is dropped and the new
+    clients are indexed with one INSERT ... SELECT, then it is created again (same transaction)
+    """
+    curs.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'clients_fts_insert'")
+    trigger = curs.fetchone()
+    curs.execute('SELECT COALESCE(MAX(id), 0) FROM Clients')
+    last_id = curs.fetchone()[0]
+    if trigger:
+        curs.execute('DROP TRIGGER clients_fts_insert')
+    curs.executemany('INSERT INTO Clients(name, phone, credit) VALUES(?, ?, ?)', rows)
+    if trigger:
+        curs.execute('INSERT INTO Clients_fts(rowid, name, phone) '
+                     'SELECT id, name, phone FROM Clients WHERE id > ?', [last_id])
+        curs.execute(trigger[0])
+
+
+def import_clients(db_handler, path, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    import clients and their opening credit; phones already in Clients are reported, not imported
+    usage : report = import_clients(db_handler, 'legacy.xlsx')
+            progress(report) is called after each committed chunk
+    return: ImportReport
+    """
+    path = pathlib.Path(path)
+    source = str(path.resolve())
+    size = path.stat().st_size
+    report = ImportReport(source)
+    start = time.perf_counter()
+
+    desc, rows = db_handler.make_query('SELECT size, last_line, imported, duplicates, invalid, finished '
+                                       'FROM Import_jobs WHERE source = ?', [source])
+    previous = (0, 0)           # duplicates, invalid of the interrupted run
+    if rows and rows[0][0] == size and not rows[0][5]:
+        report.resumed_at = rows[0][1]
+        report.imported = rows[0][2]
+        previous = rows[0][3:5]
+    else:
+        # new file, or changed / already fully imported: start from the first line
+        db_handler.make_query('INSERT OR REPLACE INTO Import_jobs(source, size) VALUES(?, ?)', [source, size])
+
+    seen = set()
+    for chunk in read_chunks(path, chunk_size, report.resumed_at):
+        rows = validate_chunk(chunk, report, seen)
+        with db_handler.manager.transaction() as curs:
+            taken = existing_phones(curs, [row[2] for row in rows])
+            new_rows = []
+            for row in rows:
+                if row[2] in taken:
+                    report.duplicates.append((row[0], row[2], row[1]))
+                else:
+                    new_rows.append(row)
+            insert_clients(curs, [(name, phone, credit) for line, name, phone, credit, credit_date in new_rows])
+            curs.executemany('INSERT INTO Credits(client_id, credit_date, credit, reste) '
+                             'SELECT id, ?, ?, ? FROM Clients WHERE phone = ?',
+                             [(credit_date, credit, credit, phone)
+                              for line, name, phone, credit, credit_date in new_rows if credit])
+            report.imported += len(new_rows)
+            curs.execute('UPDATE Import_jobs SET last_line = ?, imported = ?, duplicates = ?, invalid = ? '
+                         'WHERE source = ?', [chunk[-1][0], report.imported, previous[0] + len(report.duplicates),
+                                              previous[1] + len(report.invalid), source])
+        if progress is not None:
+            progress(report)
+    db_handler.make_query('UPDATE Import_jobs SET finished = 1 WHERE source = ?', [source])
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='bulk import clients and opening credits from csv or xlsx')
+    parser.add_argument('source', help='csv or xlsx file; columns name, phone, credit [, credit_date]')
+    parser.add_argument('--db', default='./creadit.db')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--report', help='csv file listing the duplicate and invalid lines')
+    args = parser.parse_args()
+
+    db_handler = sqlite_utils.SqliteFunc(args.db)
+    db_handler.migrate()
+    try:
+        report = import_clients(db_handler, args.source, args.chunk_size,
+                                progress=lambda report: print('{} clients imported'.format(report.imported)))
+    finally:
+        db_handler.close()
+    print(report)
+    if args.report:
+        with open(args.report, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['line', 'value', 'problem'])
+            writer.writerows((line, phone, 'duplicate phone') for line, phone, name in report.duplicates)
+            writer.writerows(report.invalid)
+
+
+if __name__ == '__main__':
+    main()
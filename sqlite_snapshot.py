@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       : 18-October-2026
+# description   : columnar snapshot of Clients, Credits and Payments_log for the analysts
+#                 parquet or arrow ipc files with pyarrow; otherwise gzip json lines, one line per row group
+#                 each run append a part with the rows added or changed since the previous run
+# requirement   : pyarrow (optional)
+#
+# usage         : python sqlite_snapshot.py ./analytics --db creadit.db [--format parquet|arrow|columns] [--full]
+#                 the rows of a table are its parts in order; keep the last row of each id (_snapshot column)
+# ----------------------------------------------------------------------------
+
+import argparse
+import gzip
+import json
+import os
+import pathlib
+from datetime import datetime
+
+import sqlite_utils
+
+# table: [(column, type)]; the money columns are integer cents
+SCHEMAS = {
+    'Clients': [('id', 'int'), ('add_date', 'str'), ('name', 'str'), ('phone', 'str'), ('credit', 'int')],
+    'Credits': [('id', 'int'), ('client_id', 'int'), ('credit_date', 'str'), ('credit', 'int'),
+                ('versement', 'int'), ('reste', 'int'), ('paid', 'str')],
+    'Payments_log': [('id', 'int'), ('fact_id', 'int'), ('payment_date', 'str'), ('payment', 'int')],
+}
+MONEY_COLUMNS = sqlite_utils.MONEY_COLUMNS
+
+# rows added since the last snapshot, and the rows a payment changed since (versement, reste, paid, credit)
+# :client, :credit, :payment are the last ids of the previous snapshot
+CHANGED_CREDITS = 'id > :credit OR id IN (SELECT fact_id FROM Payments_log WHERE id > :payment)'
+INCREMENTS = {
+    'Clients': 'id > :client OR id IN (SELECT client_id FROM Credits WHERE {})'.format(CHANGED_CREDITS),
+    'Credits': CHANGED_CREDITS,
+    'Payments_log': 'id > :payment',
+}
+LAST_ID_NAMES = {'Clients': 'client', 'Credits': 'credit', 'Payments_log': 'payment'}
+EXTENSIONS = {'parquet': 'parquet', 'arrow': 'arrow', 'columns': 'json.gz'}
+ROW_GROUP = 65536
+MANIFEST = 'snapshot.json'
+
+
+def default_format():
+    try:
+        import pyarrow     # noqa: F401
+    except ImportError:
+        return 'columns'
+    return 'parquet'
+
+
+# =========| Writers |==========================================================
+class ArrowWriter:
+    def __init__(self, path, table, fmt):
+        """
+        parquet: one row group per batch; arrow: one record batch per batch (ipc file format)
+        """
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError('pyarrow is needed for the {} format: pip install pyarrow'.format(fmt))
+        self.pa = pyarrow
+        types = {'int': pyarrow.int64(), 'str': pyarrow.string()}
+        self.schema = pyarrow.schema([(name, types[kind]) for name, kind in SCHEMAS[table]] +
+                                     [('_snapshot', pyarrow.int64())])
+        if fmt == 'parquet':
+            import pyarrow.parquet
+            self.writer = pyarrow.parquet.ParquetWriter(str(path), self.schema, compression='zstd')
+        else:
+            import pyarrow.ipc
+            self.writer = pyarrow.ipc.new_file(str(path), self.schema)
+
+    def write(self, columns):
+        self.writer.write_batch(self.pa.record_batch(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class ColumnsWriter:
+    def __init__(self, path, table, fmt='columns'):
+        """
+        pure python fallback: gzip text; first line the schema, then one json object per row group
+        {"column": [values, ...], ...}; read it back with read_columns(path)
+        """
+        self.file = gzip.open(path, 'wt', compresslevel=6, encoding='utf-8')
+        self.file.write(json.dumps({'table': table, 'schema': SCHEMAS[table] + [('_snapshot', 'int')]}) + '\n')
+
+    def write(self, columns):
+        self.file.write(json.dumps(columns, ensure_ascii=False) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+WRITERS = {'parquet': ArrowWriter, 'arrow': ArrowWriter, 'columns': ColumnsWriter}
+
+
+def read_columns(path):
+    """
+    usage : for group in read_columns('analytics/Credits/part-00001.json.gz'): group['reste']
+    yield: dict {column: list of values} per row group
+    """
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        next(file)
+        for line in file:
+            yield json.loads(line)
+
+
+# =========| Snapshot |=========================================================
+def load_manifest(directory):
+    path = directory / MANIFEST
+    if path.exists():
+        return json.loads(path.read_text())
+    return None
+
+
+def save_manifest(directory, manifest):
+    # parts not listed in the manifest (an interrupted run) are ignored and written again
+    tmp = directory / (MANIFEST + '.tmp')
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(str(tmp), str(directory / MANIFEST))
+
+
+def write_part(conn, path, table, fmt, query, params, snapshot, row_group=ROW_GROUP):
+    # stream the cursor into the part; one row group per fetchmany
+    names = [name for name, kind in SCHEMAS[table]]
+    curs = conn.cursor()
+    curs.arraysize = row_group
+    curs.execute(query, params)
+    writer = WRITERS[fmt](path, table, fmt)
+    count = 0
+    try:
+        while True:
+            rows = curs.fetchmany()
+            if not rows:
+                break
+            columns = {name: list(values) for name, values in zip(names, zip(*rows))}
+            columns['_snapshot'] = [snapshot] * len(rows)
+            writer.write(columns)
+            count += len(rows)
+    finally:
+        writer.close()
+    return count
+
+
+def snapshot(db_handler, directory, fmt=None, full=False, row_group=ROW_GROUP):
+    """
+    write the rows added or changed since the previous snapshot as a new part of each table
+    full: start again with a new complete snapshot (also drop the deleted clients)
+    usage : snapshot(db_handler, './analytics')
+    return: dict {table: rows written}
+    """
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest = None if full else load_manifest(directory)
+    if manifest is None:
+        manifest = {'format': fmt or default_format(), 'snapshot': 0,
+                    'last_ids': {'client': 0, 'credit': 0, 'payment': 0},
+                    'money_columns': MONEY_COLUMNS, 'tables': {table: [] for table in SCHEMAS}}
+        for part in directory.glob('*/part-*'):
+            part.unlink()
+    elif fmt and fmt != manifest['format']:
+        raise ValueError('the snapshot in {} is {}; use full=True to change the format'.format(
+            directory, manifest['format']))
+    fmt = manifest['format']
+    number = manifest['snapshot'] + 1
+    params = manifest['last_ids']
+
+    # one read transaction: the parts and the new last ids come from the same state of the database
+    conn = db_handler.manager.connect()
+    conn.execute('BEGIN')
+    counts = {}
+    try:
+        last_ids = {}
+        for table, name in LAST_ID_NAMES.items():
+            last_ids[name] = conn.execute('SELECT COALESCE(MAX(id), 0) FROM {}'.format(table)).fetchone()[0]
+        for table, schema in SCHEMAS.items():
+            query = 'SELECT {} FROM {} WHERE ({}) AND id <= :last_{} ORDER BY id'.format(
+                ', '.join(name for name, kind in schema), table, INCREMENTS[table], LAST_ID_NAMES[table])
+            query_params = dict(params, **{'last_' + LAST_ID_NAMES[table]: last_ids[LAST_ID_NAMES[table]]})
+            (directory / table).mkdir(exist_ok=True)
+            part = '{}/part-{:05d}.{}'.format(table, number, EXTENSIONS[fmt])
+            counts[table] = write_part(conn, directory / part, table, fmt, query, query_params, number, row_group)
+            if counts[table]:
+                manifest['tables'][table].append({'part': part, 'rows': counts[table]})
+            else:
+                (directory / part).unlink()
+    finally:
+        conn.rollback()
+        conn.close()
+
+    manifest['snapshot'] = number
+    manifest['last_ids'] = last_ids
+    manifest['taken_at'] = datetime.now().isoformat()
+    save_manifest(directory, manifest)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='columnar snapshot of the credit ledger for analytics')
+    parser.add_argument('directory')
+    parser.add_argument('--db', default='./creadit.db')
+    parser.add_argument('--format', choices=list(WRITERS), help='default parquet with pyarrow, else columns')
+    parser.add_argument('--full', action='store_true', help='new complete snapshot instead of an increment')
+    args = parser.parse_args()
+
+    db_handler = sqlite_utils.SqliteFunc(args.db)
+    try:
+        print(snapshot(db_handler, args.directory, args.format, args.full))
+    finally:
+        db_handler.close()
+
+
+if __name__ == '__main__':
+    main()
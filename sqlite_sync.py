@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       : 18-October-2026
+# description   : two ways merge of two creadit.db edited apart (two shops, a laptop offline)
+#                 rows are matched by global keys: a client by its phone, an invoice and a payment by their
+#                 uid (see sqlite_utils.migration_sync_keys); the local ids are never shipped.
+#                 invoices and payments are facts merged by union; versement, reste, paid and the client
+#                 credit are computed again from the payments, never copied.
+#                 a deleted client take away the invoices the deleting shop knew; an invoice added
+#                 meanwhile in the other shop bring the client back. a name conflict keep the oldest client
+#
+# usage         : python sqlite_sync.py shop_a.db shop_b.db [--batch-size 5000]
+#                 python sqlite_sync.py shop_a.db shop_b.db --renew      # shop_b.db was just copied from shop_a.db
+# ----------------------------------------------------------------------------
+
+import argparse
+import json
+
+import sqlite_utils
+from sqlite_utils import ChangeSet, Error
+from sqlite_cdc import BATCH_SIZE, batch_end, check_batch, last_seq, node_id, renew_node, set_last_seq
+
+CHANGED = "SELECT row_id FROM Changes WHERE seq > :since AND seq <= :to_seq AND table_name = '{}'"
+CHANGED_CREDITS = '{} UNION SELECT fact_id FROM Payments_log WHERE id IN ({})'.format(
+    CHANGED.format('Credits'), CHANGED.format('Payments_log'))
+
+# the batch rows; an exported payment bring its invoice, an exported invoice bring its client
+EXPORT_QUERIES = {
+    'clients': """SELECT phone, name, add_date FROM Clients
+                  WHERE id IN ({}) OR id IN (SELECT client_id FROM Credits WHERE id IN ({}))
+                  ORDER BY id""".format(CHANGED.format('Clients'), CHANGED_CREDITS),
+    'credits': """SELECT Credits.uid, Clients.phone, credit_date, Credits.credit
+                  FROM Credits JOIN Clients ON Clients.id = Credits.client_id
+                  WHERE Credits.id IN ({}) ORDER BY Credits.id""".format(CHANGED_CREDITS),
+    'payments': """SELECT Payments_log.uid, Credits.uid, payment_date, payment
+                   FROM Payments_log JOIN Credits ON Credits.id = Payments_log.fact_id
+                   WHERE Payments_log.id IN ({}) ORDER BY Payments_log.id""".format(CHANGED.format('Payments_log')),
+}
+# keys deleted in the seq range and not there again (a phone can be given to a new client)
+DELETED_QUERY = """SELECT DISTINCT key FROM Changes
+                   WHERE seq > :since AND seq <= :to_seq AND op = 'D' AND table_name = '{0}'
+                   AND NOT EXISTS (SELECT 1 FROM {0} WHERE {1} = Changes.key)"""
+DELETED_NAMES = {'Clients': 'deleted_clients', 'Credits': 'deleted_credits', 'Payments_log': 'deleted_payments'}
+
+# keys this database deleted and the other one had not seen when it exported the batch
+CONCURRENT = ("SELECT key FROM Changes WHERE seq > :seen AND seq <= :local_seq AND op = 'D' AND table_name = '{}' "
+              "AND key IS NOT NULL")
+
+
+def field(alias, index):
+    return "json_extract({}.value, '$[{:d}]')".format(alias, index)
+
+
+# applied in order in one transaction; temp.Sync_clients and temp.Sync_credits collect the rows to compute again
+MERGE_QUERIES = [
+    # deletes; the invoices first, their payments go with them (ON DELETE CASCADE)
+    """INSERT OR IGNORE INTO temp.Sync_clients(id)
+       SELECT client_id FROM Credits WHERE uid IN (SELECT value FROM json_each(:deleted_credits))""",
+    """INSERT OR IGNORE INTO temp.Sync_credits(id)
+       SELECT fact_id FROM Payments_log WHERE uid IN (SELECT value FROM json_each(:deleted_payments))""",
+    'DELETE FROM Credits WHERE uid IN (SELECT value FROM json_each(:deleted_credits))',
+    'DELETE FROM Payments_log WHERE uid IN (SELECT value FROM json_each(:deleted_payments))',
+    # new clients; not a client deleted here meanwhile, unless it come with an invoice not known here
+    """INSERT INTO Clients(phone, name, add_date, credit)
+       SELECT {0}, {1}, {2}, 0 FROM json_each(:clients) AS c
+       WHERE NOT EXISTS (SELECT 1 FROM Clients WHERE phone = {0})
+       AND ({0} NOT IN ({3})
+            OR {0} IN (SELECT {5} FROM json_each(:credits) AS f
+                       WHERE {4} NOT IN ({6}) AND NOT EXISTS (SELECT 1 FROM Credits WHERE uid = {4})))""".format(
+        field('c', 0), field('c', 1), field('c', 2), CONCURRENT.format('Clients'),
+        field('f', 0), field('f', 1), CONCURRENT.format('Credits')),
+    # same phone created in both shops: the oldest client (add_date, then name) win on both sides
+    """UPDATE Clients SET name = {1}, add_date = {2} FROM json_each(:clients) AS c
+       WHERE Clients.phone = {0}
+       AND (COALESCE({2}, ''), COALESCE({1}, '')) < (COALESCE(Clients.add_date, ''), COALESCE(Clients.name, ''))""".format(
+        field('c', 0), field('c', 1), field('c', 2)),
+    """INSERT OR IGNORE INTO temp.Sync_clients(id)
+       SELECT id FROM Clients WHERE phone IN (SELECT {} FROM json_each(:clients) AS c)""".format(field('c', 0)),
+    # new invoices and payments; the amounts paid are set below
+    """INSERT INTO Credits(uid, client_id, credit_date, credit, versement, reste, paid)
+       SELECT {0}, Clients.id, {2}, {3}, 0, {3}, 'not paid'
+       FROM json_each(:credits) AS f JOIN Clients ON Clients.phone = {1}
+       WHERE NOT EXISTS (SELECT 1 FROM Credits WHERE uid = {0}) AND {0} NOT IN ({4})""".format(
+        field('f', 0), field('f', 1), field('f', 2), field('f', 3), CONCURRENT.format('Credits')),
+    """INSERT INTO Payments_log(uid, fact_id, payment_date, payment)
+       SELECT {0}, Credits.id, {2}, {3}
+       FROM json_each(:payments) AS p JOIN Credits ON Credits.uid = {1}
+       WHERE NOT EXISTS (SELECT 1 FROM Payments_log WHERE uid = {0}) AND {0} NOT IN ({4})""".format(
+        field('p', 0), field('p', 1), field('p', 2), field('p', 3), CONCURRENT.format('Payments_log')),
+    # an exported payment bring its invoice: the invoices of the batch are all the invoices to compute again
+    """INSERT OR IGNORE INTO temp.Sync_credits(id)
+       SELECT id FROM Credits WHERE uid IN (SELECT {} FROM json_each(:credits) AS f)""".format(field('f', 0)),
+    """INSERT OR IGNORE INTO temp.Sync_clients(id)
+       SELECT client_id FROM Credits WHERE id IN (SELECT id FROM temp.Sync_credits)""",
+    # balances from the ledger; only the rows that differ are written (no change, no Changes row)
+    """UPDATE Credits SET versement = ledger.versement, reste = ledger.reste, paid = ledger.paid
+       FROM (SELECT Credits.id, COALESCE(SUM(payment), 0) AS versement,
+                    Credits.credit - COALESCE(SUM(payment), 0) AS reste,
+                    CASE WHEN Credits.credit - COALESCE(SUM(payment), 0) <= 0 THEN 'paid'
+                         WHEN Credits.paid = 'paid' THEN 'not paid' ELSE Credits.paid END AS paid
+             FROM temp.Sync_credits JOIN Credits ON Credits.id = Sync_credits.id
+             LEFT JOIN Payments_log ON Payments_log.fact_id = Credits.id GROUP BY Credits.id) AS ledger
+       WHERE Credits.id = ledger.id
+       AND (Credits.versement IS NOT ledger.versement OR Credits.reste IS NOT ledger.reste
+            OR Credits.paid IS NOT ledger.paid)""",
+    """UPDATE Clients SET credit = ledger.credit
+       FROM (SELECT Sync_clients.id, COALESCE(SUM(Credits.reste), 0) AS credit
+             FROM temp.Sync_clients LEFT JOIN Credits ON Credits.client_id = Sync_clients.id
+             GROUP BY Sync_clients.id) AS ledger
+       WHERE Clients.id = ledger.id AND Clients.credit IS NOT ledger.credit""",
+]
+# a deleted client stay when it still has invoices (added here, unknown to the other shop)
+DELETED_CLIENTS = """SELECT id FROM Clients WHERE phone IN (SELECT value FROM json_each(:deleted_clients))
+                     AND NOT EXISTS (SELECT 1 FROM Credits WHERE client_id = Clients.id)"""
+WRITTEN = "SELECT row_id FROM Changes WHERE seq > :local_seq AND table_name = '{}'"
+WRITTEN_CREDITS = 'SELECT id FROM Credits WHERE id IN ({}) OR id IN (SELECT fact_id FROM Payments_log WHERE id IN ({}))'.format(
+    WRITTEN.format('Credits'), WRITTEN.format('Payments_log'))
+WRITTEN_CLIENTS = 'SELECT id FROM Clients WHERE id IN ({}) OR id IN (SELECT client_id FROM Credits WHERE id IN ({}))'.format(
+    WRITTEN.format('Clients'), WRITTEN_CREDITS)
+
+
+def max_seq(db_handler):
+    desc, rows = db_handler.make_query('SELECT COALESCE(MAX(seq), 0) FROM Changes')
+    return rows[0][0]
+
+
+def database_node(db_handler):
+    desc, rows = db_handler.make_query('SELECT node_id FROM Cdc_node')
+    return rows[0][0]
+
+
+# =========| Export |===========================================================
+def export_batch(db_handler, peer, since=0, until=None, batch_size=BATCH_SIZE):
+    """
+    the rows changed after seq `since` (and not after until), by global keys, for the node `peer`
+    return: batch dict {'node', 'from_seq', 'to_seq', 'seen', 'clients', 'credits', 'payments',
+                        'deleted_clients', 'deleted_credits', 'deleted_payments'} | None
+            seen: last seq of peer applied here; the deletes of peer after it are news for this node
+    """
+    conn = db_handler.manager.connect()
+    conn.execute('BEGIN')           # one snapshot for the seq range and the rows
+    try:
+        to_seq = batch_end(conn, since, batch_size, until)
+        if to_seq is None:
+            return None
+        row = conn.execute('SELECT last_seq FROM Cdc_peers WHERE node_id = ?', [peer]).fetchone()
+        batch = {'node': node_id(conn), 'from_seq': since, 'to_seq': to_seq, 'seen': row[0] if row else 0}
+        params = {'since': since, 'to_seq': to_seq}
+        for name, query in EXPORT_QUERIES.items():
+            batch[name] = [list(row) for row in conn.execute(query, params)]
+        for table, name in DELETED_NAMES.items():
+            batch[name] = [key for key, in conn.execute(DELETED_QUERY.format(table, sqlite_utils.SYNC_KEYS[table]),
+                                                        params)]
+        return batch
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+# =========| Apply |============================================================
+def apply_batch(db_handler, batch):
+    """
+    merge a batch of the other node in one transaction, with the new last seq of its node (Cdc_peers)
+    applying a batch again change nothing
+    return: ChangeSet of the clients and invoices written
+    """
+    changes = ChangeSet()
+    with db_handler.manager.transaction() as curs:
+        if not check_batch(curs, batch):
+            return changes
+        for table in ('Sync_clients', 'Sync_credits'):
+            curs.execute('CREATE TEMP TABLE IF NOT EXISTS {}(id INTEGER NOT NULL PRIMARY KEY)'.format(table))
+            curs.execute('DELETE FROM temp.{}'.format(table))
+        curs.execute('SELECT COALESCE(MAX(seq), 0) FROM Changes')
+        params = {'seen': batch['seen'], 'local_seq': curs.fetchone()[0]}
+        for name in ('clients', 'credits', 'payments') + tuple(DELETED_NAMES.values()):
+            params[name] = json.dumps(batch[name])
+
+        for query in MERGE_QUERIES:
+            curs.execute(query, params)
+        curs.execute(DELETED_CLIENTS, params)
+        deleted = [client_id for client_id, in curs.fetchall()]
+        curs.execute('DELETE FROM Clients WHERE id IN (SELECT value FROM json_each(?))', [json.dumps(deleted)])
+        # the rows really written are the Changes rows of this transaction
+        for table, query in (('Credits', WRITTEN_CREDITS), ('Clients', WRITTEN_CLIENTS)):
+            for row_id, in curs.execute(query, params):
+                changes.change(table, row_id)
+        for client_id in deleted:
+            changes.delete('Clients', client_id)
+        set_last_seq(curs, batch)
+    db_handler.badge_cache.clear()
+    return changes
+
+
+def pull(db_handler, source_handler, until=None, batch_size=BATCH_SIZE):
+    # merge the changes of source_handler not merged yet into db_handler; a transaction per batch
+    node, source_node = database_node(db_handler), database_node(source_handler)
+    since = last_seq(db_handler, source_node)
+    changes = ChangeSet()
+    while True:
+        batch = export_batch(source_handler, node, since, until, batch_size)
+        if batch is None:
+            return changes
+        changes.merge(apply_batch(db_handler, batch))
+        since = batch['to_seq']
+
+
+def merge(db_handler, other_handler, batch_size=BATCH_SIZE):
+    """
+    bring the two databases to the same clients, invoices, payments and balances
+    usage : merge(SqliteFunc('shop_a.db'), SqliteFunc('shop_b.db'))
+    the rows one side receive are not shipped back by this merge; the next one ship them and they change nothing
+    return: (ChangeSet of db_handler, ChangeSet of other_handler)
+    """
+    if database_node(db_handler) == database_node(other_handler):
+        raise Error('{} and {} have the same node id; one is a copy of the other, renew_node() on it first'.format(
+            db_handler.db_name, other_handler.db_name))
+    until, other_until = max_seq(db_handler), max_seq(other_handler)
+    changes = pull(db_handler, other_handler, other_until, batch_size)
+    other_changes = pull(other_handler, db_handler, until, batch_size)
+    return changes, other_changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='two ways merge of two credit app databases')
+    parser.add_argument('db')
+    parser.add_argument('other_db')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Changes rows per transaction')
+    parser.add_argument('--renew', action='store_true', help='other_db was just copied from db; give it its own node id')
+    args = parser.parse_args()
+
+    db_handler = sqlite_utils.SqliteFunc(args.db)
+    other_handler = sqlite_utils.SqliteFunc(args.other_db)
+    try:
+        db_handler.migrate()
+        other_handler.migrate()
+        if args.renew:
+            renew_node(other_handler, db_handler)
+        changes, other_changes = merge(db_handler, other_handler, args.batch_size)
+        print('{}: {} clients changed, {} deleted'.format(args.db, len(changes.changed.get('Clients', ())),
+                                                          len(changes.deleted.get('Clients', ()))))
+        print('{}: {} clients changed, {} deleted'.format(args.other_db, len(other_changes.changed.get('Clients', ())),
+                                                          len(other_changes.deleted.get('Clients', ()))))
+    finally:
+        db_handler.close()
+        other_handler.close()
+
+
+if __name__ == '__main__':
+    main()
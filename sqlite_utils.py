@@ -5,20 +5,28 @@
 # author  : daBve, dabve@gmail.fr
 #
 # description   : sqlite operations to help work with sqlite databases
+#                 amounts are stored as integer cents (see Money)
 # requirement   : sys, csv, collections(namedtuple, OrderedDict), sqlite3, terminaltables, xlsxwriter
 # version       : from 1.0.0 to 1.1.0
 # ---------------------------------------------------------------------------------------------
 
 
-import pathlib, sys
-from collections import namedtuple, OrderedDict
+import pathlib, queue, random, re, sys, threading, time, json
+from collections import namedtuple, OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from decimal import Decimal, ROUND_HALF_UP
+from functools import wraps
 import sqlite3
 from sqlite3 import Error
 from sqlite3 import IntegrityError
 
 from prompt_toolkit import print_formatted_text, HTML
 from datetime import datetime
-tday = datetime.today()
+
+
+# mobile numbers: 05, 06 or 07 and 8 digits
+PHONE_REGEX = re.compile(r'^0(5|6|7)\d{8}')
 
 
 class MissingDbName(BaseException):
@@ -26,6 +34,124 @@ class MissingDbName(BaseException):
         return 'You need to specify a database name'
 
 
+class Money(int):
+    """
+    Amount of money stored as an integer number of cents; exact sums and comparisons.
+    usage : Money.from_amount(12.5) -> Money(1250); str(Money(1250)) -> '12.50'
+    """
+    @classmethod
+    def from_amount(cls, amount):
+        # amount in DA (float, str, Decimal); a Money is already in cents
+        if isinstance(amount, Money):
+            return amount
+        cents = (Decimal(str(amount)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+        return cls(int(cents))
+
+    @property
+    def amount(self):
+        return Decimal(int(self)).scaleb(-2)
+
+    def __add__(self, other):
+        return Money(int(self) + int(other))
+
+    def __sub__(self, other):
+        return Money(int(self) - int(other))
+
+    def __neg__(self):
+        return Money(-int(self))
+
+    def __str__(self):
+        return '{:.2f}'.format(self.amount)
+
+    def __repr__(self):
+        return 'Money({})'.format(self)
+
+
+def format_money(value):
+    # cents from the database to '1234.50'
+    return str(Money(value)) if isinstance(value, int) else str(value)
+
+
+def money_text(column):
+    # sql expression giving the cents of column as format_money does; amounts are searched as shown
+    return "printf('%.2f', {} / 100.0)".format(column)
+
+
+class ChangeSet:
+    def __init__(self):
+        """
+        Row ids touched by a write; returned by the SqliteFunc write methods
+        so the views can patch these rows instead of reloading everything.
+        usage : changes.changed['Clients'] -> {7}; changes.deleted['Clients'] -> set()
+        """
+        self.changed = {}
+        self.deleted = {}
+
+    def change(self, table, *ids):
+        self.changed.setdefault(table, set()).update(ids)
+        return self
+
+    def delete(self, table, *ids):
+        self.deleted.setdefault(table, set()).update(ids)
+        return self
+
+    def merge(self, other):
+        for table, ids in other.changed.items():
+            self.change(table, *ids)
+        for table, ids in other.deleted.items():
+            self.delete(table, *ids)
+        return self
+
+    def __repr__(self):
+        return '<ChangeSet changed={!r} deleted={!r}>'.format(self.changed, self.deleted)
+
+
+class ClientHistory:
+    def __init__(self, client_id, rows=()):
+        """
+        A client invoices with all their payment logs, loaded by one query
+        (SqliteFunc.load_client_history); selections on the details table are served from here.
+        rows: (id, date, credit, versement, reste, paid, payment_date, payment); one per payment
+        """
+        self.client_id = int(client_id)
+        self.invoices = []              # rows of the details table, ordered by id
+        self.positions = {}             # fact_id: index in invoices
+        self.payments = {}              # fact_id: [(date, payment), ]
+        for row in rows:
+            fact_id = row[0]
+            if fact_id not in self.positions:
+                self.positions[fact_id] = len(self.invoices)
+                self.invoices.append(tuple(row[:6]))
+                self.payments[fact_id] = []
+            if row[6] is not None:
+                self.payments[fact_id].append((row[6], row[7]))
+
+    def __contains__(self, fact_id):
+        return int(fact_id) in self.positions
+
+    def payment_log(self, fact_id):
+        return self.payments[int(fact_id)]
+
+    def reste(self, fact_id):
+        return Money(self.invoices[self.positions[int(fact_id)]][4])
+
+    def patch(self, invoice_rows, payment_rows):
+        """
+        replace the invoices after a write; payment_rows (fact_id, date, payment) are the full
+        logs of these invoices
+        """
+        for row in invoice_rows:
+            fact_id = row[0]
+            if fact_id in self.positions:
+                self.invoices[self.positions[fact_id]] = tuple(row)
+            else:
+                self.positions[fact_id] = len(self.invoices)
+                self.invoices.append(tuple(row))
+            self.payments[fact_id] = []
+        for fact_id, payment_date, payment in payment_rows:
+            self.payments.setdefault(fact_id, []).append((payment_date, payment))
+
+
 class Display:
     def __init__(self, desc, rows):
         """
@@ -59,8 +185,824 @@ class Display:
         return rows
 
 
+class RetryPolicy:
+    SQLITE_BUSY = 5
+    SQLITE_LOCKED = 6
+
+    def __init__(self, attempts=6, delay=0.05, max_delay=1.0):
+        """
+        Retry a call failing with SQLITE_BUSY ("database is locked") once busy_timeout is spent;
+        exponential backoff with jitter: delay, 2 * delay, ... up to max_delay
+        """
+        self.attempts = attempts
+        self.delay = delay
+        self.max_delay = max_delay
+        self.retries = 0
+
+    def is_busy(self, err):
+        if not isinstance(err, sqlite3.OperationalError):
+            return False
+        code = getattr(err, 'sqlite_errorcode', None)            # python >= 3.11
+        if code is not None:
+            return code & 0xff in (self.SQLITE_BUSY, self.SQLITE_LOCKED)
+        return 'locked' in str(err) or 'busy' in str(err)
+
+    def call(self, func, *args, on_retry=None):
+        delay = self.delay
+        for attempt in range(self.attempts):
+            try:
+                return func(*args)
+            except sqlite3.OperationalError as err:
+                if attempt == self.attempts - 1 or not self.is_busy(err):
+                    raise
+                if on_retry is not None:
+                    on_retry()
+                self.retries += 1
+                time.sleep(delay * (1 + random.random()))
+                delay = min(delay * 2, self.max_delay)
+
+
+class ConnectionManager:
+    def __init__(self, db_name, readers=False, wal=False, busy_timeout=5000, retry=None):
+        """
+        Keep long lived connections instead of connecting on every call.
+        one writer connection shared by all threads and guarded by write_lock,
+        optional reader connections; one per thread (sqlite3 connections are thread-affine)
+        wal: write-ahead log; readers don't block the writer and the writer don't block readers
+        busy_timeout: ms sqlite wait for a lock held by another process before SQLITE_BUSY
+        """
+        self.db_name = db_name
+        self.readers = readers
+        self.wal = wal
+        self.busy_timeout = busy_timeout
+        self.retry = retry or RetryPolicy()
+        self.write_lock = threading.RLock()
+        self._writer = None
+        self._local = threading.local()
+        self._all_readers = []
+        self._data_version = None
+        self.timings = {}           # name: [calls, total_seconds, last_seconds]
+
+    def connect(self, check_same_thread=True):
+        conn = sqlite3.connect(self.db_name, timeout=self.busy_timeout / 1000, check_same_thread=check_same_thread)
+        conn.execute('PRAGMA busy_timeout = {:d}'.format(self.busy_timeout))
+        conn.execute('PRAGMA foreign_keys = 1')
+        if self.wal:
+            # never corrupt with WAL, but a power loss can undo the last commits (the WAL is not synced
+            # on each commit); the WriteQueue use FULL for the writes that must survive it
+            conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+
+    @property
+    def writer(self):
+        with self.write_lock:
+            if self._writer is None:
+                conn = self.connect(check_same_thread=False)
+                if self.wal:
+                    # persistent in the database file; every process then use WAL
+                    self.retry.call(conn.execute, 'PRAGMA journal_mode = WAL')
+                self._writer = conn
+            return self._writer
+
+    def external_changes(self):
+        """
+        True when another connection (another process) committed since the last call
+        PRAGMA data_version does not change for the commits of the writer itself
+        """
+        with self.write_lock:
+            version = self.writer.execute('PRAGMA data_version').fetchone()[0]
+            changed = self._data_version is not None and version != self._data_version
+            self._data_version = version
+            return changed
+
+    @contextmanager
+    def transaction(self):
+        """
+        usage : with manager.transaction() as curs: curs.execute(query, params)
+        BEGIN IMMEDIATE take the database write lock up front; commit on success, rollback on error
+        """
+        with self.write_lock:
+            conn = self.writer
+            self.retry.call(conn.execute, 'BEGIN IMMEDIATE')
+            try:
+                yield conn.cursor()
+                # with the rollback journal the commit itself can be busy (a reader holds the file)
+                self.retry.call(conn.commit)
+            except BaseException:
+                conn.rollback()
+                raise
+
+    @property
+    def reader(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if self.wal:
+                self.writer             # switch the file to WAL before the first read
+            conn = self.connect()
+            self._local.conn = conn
+            self._all_readers.append(conn)
+        return conn
+
+    @contextmanager
+    def reading(self):
+        # without readers every select goes through the writer connection; so hold the lock
+        if self.readers:
+            yield self.reader
+        else:
+            with self.write_lock:
+                yield self.writer
+
+    def record(self, name, elapsed):
+        stats = self.timings.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = elapsed
+
+    @property
+    def call_timings(self):
+        """
+        return: dict {name: {'calls', 'total_ms', 'avg_ms', 'last_ms'}}
+        """
+        result = {}
+        for name, (calls, total, last) in self.timings.items():
+            result[name] = {'calls': calls, 'total_ms': total * 1000,
+                            'avg_ms': total * 1000 / calls, 'last_ms': last * 1000}
+        return result
+
+    def close(self):
+        with self.write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        for conn in self._all_readers:
+            try:
+                conn.close()
+            except Error:
+                pass            # reader owned by another thread; sqlite close it at thread exit
+        self._all_readers = []
+        self._local = threading.local()
+
+
+# =========| Query instrumentation |============================================
+def fingerprint(query):
+    # the statement without its literals and extra white space; same shape = same fingerprint
+    query = re.sub(r"'(?:[^']|'')*'", '?', query)
+    query = re.sub(r'\b\d+(\.\d+)?\b', '?', query)
+    return ' '.join(query.split())
+
+
+class QueryStats:
+    # histogram buckets upper bounds in ms; the last one catch everything
+    BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, float('inf')]
+
+    def __init__(self, window=10000, slow_ms=50, slow_log_size=100):
+        """
+        Instrument for SqliteFunc.make_query and write; keep the last `window` statements
+        (rolling) and the EXPLAIN QUERY PLAN of the statements slower than slow_ms.
+        usage : stats = QueryStats(slow_ms=20); db_handler.add_instrument(stats); stats.dump('stats.json')
+        """
+        self.slow_ms = slow_ms
+        self.samples = deque(maxlen=window)             # (fingerprint, ms, rows, error)
+        self.slow_log = deque(maxlen=slow_log_size)
+        self.lock = threading.Lock()
+
+    def wants_plan(self, elapsed):
+        return self.slow_ms is not None and elapsed * 1000 >= self.slow_ms
+
+    def record(self, query, params, elapsed, rows, error=None, plan=None):
+        key = fingerprint(query)
+        ms = elapsed * 1000
+        with self.lock:
+            self.samples.append((key, ms, rows, error))
+            if plan is not None:
+                if isinstance(params, dict):
+                    params = {name: str(value) for name, value in params.items()}
+                else:
+                    params = [str(value) for value in params]
+                self.slow_log.append({'fingerprint': key, 'query': query, 'params': params,
+                                      'ms': ms, 'plan': plan, 'at': datetime.now().isoformat()})
+
+    def histogram(self, key=None):
+        """
+        return: list of (bucket upper bound in ms, count) for the rolling window; key filter one fingerprint
+        """
+        counts = [0] * len(self.BUCKETS)
+        with self.lock:
+            samples = list(self.samples)
+        for fp, ms, rows, error in samples:
+            if key is not None and fp != key:
+                continue
+            for index, bound in enumerate(self.BUCKETS):
+                if ms <= bound:
+                    counts[index] += 1
+                    break
+        return list(zip(self.BUCKETS, counts))
+
+    def summary(self):
+        """
+        return: list of dict per fingerprint; the most expensive (total ms) first
+        """
+        grouped = {}
+        with self.lock:
+            samples = list(self.samples)
+        for key, ms, rows, error in samples:
+            grouped.setdefault(key, []).append((ms, rows, error))
+        result = []
+        for key, values in grouped.items():
+            times = sorted(ms for ms, rows, error in values)
+            result.append({
+                'fingerprint': key,
+                'calls': len(values),
+                'total_ms': sum(times),
+                'p50_ms': times[len(times) // 2],
+                'p99_ms': times[min(len(times) - 1, int(len(times) * 0.99))],
+                'max_ms': times[-1],
+                'rows': sum(rows or 0 for ms, rows, error in values),
+                'errors': sum(1 for ms, rows, error in values if error),
+            })
+        result.sort(key=lambda item: item['total_ms'], reverse=True)
+        return result
+
+    def export(self):
+        return {
+            'summary': self.summary(),
+            'histogram': [[bound if bound != float('inf') else None, count] for bound, count in self.histogram()],
+            'slow_log': list(self.slow_log),
+        }
+
+    def dump(self, file_name):
+        with open(file_name, 'w') as file:
+            json.dump(self.export(), file, indent=2)
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+            self.slow_log.clear()
+
+
+class InstrumentedCursor:
+    def __init__(self, curs, db_handler):
+        """
+        Cursor of a write transaction reporting each statement to the instruments of db_handler,
+        as make_query does for its own; everything else is the wrapped cursor.
+        usage : db_handler.write(func) give func this cursor once an instrument is added
+        """
+        self.curs = curs
+        self.db_handler = db_handler
+
+    def __getattr__(self, name):
+        return getattr(self.curs, name)
+
+    def __iter__(self):
+        return iter(self.curs)
+
+    def execute(self, query, params=()):
+        return self.run(self.curs.execute, query, params, params)
+
+    def executemany(self, query, seq_of_params):
+        # the first params stand for all of them in the slow log plan
+        seq_of_params = list(seq_of_params)
+        return self.run(self.curs.executemany, query, seq_of_params, seq_of_params[0] if seq_of_params else ())
+
+    def run(self, method, query, params, sample):
+        conn = self.curs.connection
+        start = time.perf_counter()
+        try:
+            method(query, params)
+        except Error as err:
+            self.db_handler.instrument(conn, query, sample, time.perf_counter() - start, 0, str(err))
+            raise
+        self.db_handler.instrument(conn, query, sample, time.perf_counter() - start, max(self.curs.rowcount, 0))
+        return self
+
+
+class LRUCache:
+    def __init__(self, maxsize=256):
+        """
+        Bounded least recently used cache with hit/miss counters.
+        version change on every invalidation: a value read from the database before an invalidation
+        is not stored after it (put(key, value, version) with the version taken before the read)
+        """
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key in self.data:
+                self.data.move_to_end(key)
+                self.hits += 1
+                return self.data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, version=None):
+        with self.lock:
+            if version is not None and version != self.version:
+                return
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self.lock:
+            self.version += 1
+            for key in keys:
+                self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.version += 1
+            self.data.clear()
+
+    @property
+    def stats(self):
+        return {'size': len(self.data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+
+class WriteQueue:
+    def __init__(self, manager, window=0.0, max_batch=256, durable=True):
+        """
+        Group commit: the writes queued while a commit is running (or within `window` seconds)
+        are committed together in one transaction, so one fsync for the whole group.
+        each write run in its own SAVEPOINT; a failing write is rolled back alone and its error
+        is given back to its caller, the others of the group still commit.
+        durable: synchronous=FULL; a write is acknowledged only once its commit is on disk
+        usage : queue = WriteQueue(manager); fact_id = queue.submit(func, *args).result()
+                func(curs, *args) run inside the transaction
+        """
+        self.manager = manager
+        self.window = window
+        self.max_batch = max_batch
+        self.pending = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.writes = 0
+        if durable:
+            with manager.write_lock:
+                manager.writer.execute('PRAGMA synchronous = FULL')
+
+    def submit(self, func, *args):
+        """
+        return: concurrent.futures.Future; result() wait for the commit and return func result
+                or raise its error
+        """
+        future = Future()
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='sqlite-write-queue', daemon=True)
+                self.thread.start()
+            self.pending.put((future, func, args))
+        return future
+
+    def next_batch(self):
+        item = self.pending.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                # writes already waiting; then the ones arriving before the end of the window
+                item = self.pending.get(timeout=max(deadline - time.monotonic(), 0)) \
+                    if self.window else self.pending.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self.pending.put(None)          # stop after this batch
+                break
+            batch.append(item)
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            if batch is None:
+                return
+            self.commit(batch)
+
+    def commit(self, batch):
+        outcomes = []
+        try:
+            with self.manager.transaction() as curs:
+                for future, func, args in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    curs.execute('SAVEPOINT queued_write')
+                    try:
+                        outcomes.append((future, func(curs, *args), None))
+                    except Exception as err:
+                        curs.execute('ROLLBACK TO queued_write')
+                        outcomes.append((future, None, err))
+                    curs.execute('RELEASE queued_write')
+        except Exception as err:
+            # BEGIN or COMMIT failed; nothing of the group is on disk. a failed BEGIN left the
+            # futures pending: every caller waiting on result() must get the error
+            for future, func, args in batch:
+                if future.running() or future.set_running_or_notify_cancel():
+                    future.set_exception(err)
+            return
+        self.batches += 1
+        self.writes += len(outcomes)
+        for future, result, err in outcomes:
+            if err is None:
+                future.set_result(result)
+            else:
+                future.set_exception(err)
+
+    @property
+    def stats(self):
+        return {'batches': self.batches, 'writes': self.writes,
+                'writes_per_batch': self.writes / self.batches if self.batches else 0}
+
+    def close(self):
+        # commit what is queued and stop the thread
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.pending.put(None)
+            thread.join()
+
+
+def timed(func):
+    # record the duration of each call in the connection manager timings
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            self.manager.record(func.__name__, time.perf_counter() - start)
+    return wrapper
+
+
+# =========| Schema |==========================================================
+# the base tables of creadit.db; MIGRATIONS add the rest
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS Clients(
+           id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+           add_date TIMESTAMP DEFAULT(CURRENT_TIMESTAMP),
+           name VARCHAR(255),
+           phone VARCHAR(20) NOT NULL UNIQUE,
+           credit DECIMAL(15, 2) NOT NULL
+       )""",
+    """CREATE TABLE IF NOT EXISTS Credits(
+           id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+           client_id INTEGER NOT NULL,
+           credit_date TIMESTAMP NOT NULL DEFAULT(CURRENT_TIMESTAMP),
+           credit DECIMAL(15, 2) NOT NULL,
+           versement DECIMAL(15, 2) DEFAULT(0),
+           reste DECIMAL(15, 2) DEFAULT(0),
+           paid VARCHAR(25) DEFAULT "not paid",
+           FOREIGN KEY("client_id") REFERENCES "clients"("id") ON DELETE CASCADE
+       )""",
+    """CREATE TABLE IF NOT EXISTS Payments_log(
+           id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+           fact_id INTEGER NOT NULL,
+           payment_date TIMESTAMP NOT NULL DEFAULT(CURRENT_TIMESTAMP),
+           payment DECIMAL(15, 2) DEFAULT(0),
+           FOREIGN KEY("fact_id") REFERENCES "Credits"("id") ON DELETE CASCADE
+       )""",
+]
+
+
+def create_database(db_name):
+    """
+    create an empty database with the credit app tables; without any prompt
+    usage : create_database('./creadit.db'); SqliteFunc('./creadit.db').migrate()
+    """
+    conn = sqlite3.connect(db_name)
+    try:
+        for query in SCHEMA:
+            conn.execute(query)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# =========| Schema migrations |==============================================
+# PRAGMA user_version keep the number of the last applied migration
+INDEXES = [
+    ('idx_credits_client', 'Credits(client_id, id)'),                             # details view, cascade
+    ('idx_payments_log_fact', 'Payments_log(fact_id, payment_date, payment)'),     # payment log, cascade
+]
+
+# (index expected in the plan, query); checked with EXPLAIN QUERY PLAN after migrate
+INDEX_PLANS = [
+    ('idx_credits_client', 'SELECT id, DATE(credit_date), credit, versement, reste, paid FROM Credits WHERE client_id = ? ORDER BY id'),
+    ('idx_credits_client', 'DELETE FROM Credits WHERE client_id = ?'),
+    ('idx_payments_log_fact', 'SELECT DATE(payment_date), payment FROM Payments_log WHERE fact_id = ?'),
+    ('idx_payments_log_fact', 'DELETE FROM Payments_log WHERE fact_id = ?'),
+]
+
+
+def migration_indexes(curs):
+    for index_name, on in INDEXES:
+        curs.execute('CREATE INDEX IF NOT EXISTS {} ON {}'.format(index_name, on))
+
+
+# external content fts5 index over Clients; trigram match any substring of 3 chars or more
+# name and phone only: the amounts are searched as shown (see search_clients), and a credit or a
+# payment must not rewrite the trigrams of its client
+CLIENTS_FTS_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS clients_fts_insert AFTER INSERT ON Clients BEGIN
+           INSERT INTO Clients_fts(rowid, name, phone) VALUES(new.id, new.name, new.phone);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS clients_fts_delete AFTER DELETE ON Clients BEGIN
+           INSERT INTO Clients_fts(Clients_fts, rowid, name, phone) VALUES('delete', old.id, old.name, old.phone);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS clients_fts_update AFTER UPDATE OF name, phone ON Clients BEGIN
+           INSERT INTO Clients_fts(Clients_fts, rowid, name, phone) VALUES('delete', old.id, old.name, old.phone);
+           INSERT INTO Clients_fts(rowid, name, phone) VALUES(new.id, new.name, new.phone);
+       END""",
+]
+
+
+def migration_clients_fts(curs):
+    try:
+        curs.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS Clients_fts
+                        USING fts5(name, phone, content='Clients', content_rowid='id', tokenize='trigram')""")
+    except Error:
+        return          # sqlite built without fts5 or trigram (< 3.34); search fall back to LIKE
+    for query in CLIENTS_FTS_TRIGGERS:
+        curs.execute(query)
+    curs.execute("INSERT INTO Clients_fts(Clients_fts) VALUES('rebuild')")
+
+
+def migration_clients_fts_columns(curs):
+    # the index of migration 2 also held the credit; build it again over name and phone
+    curs.execute("SELECT 1 FROM pragma_table_info('Clients_fts') WHERE name = 'credit'")
+    if not curs.fetchone():
+        return
+    for trigger in ('clients_fts_insert', 'clients_fts_delete', 'clients_fts_update'):
+        curs.execute('DROP TRIGGER IF EXISTS {}'.format(trigger))
+    curs.execute('DROP TABLE Clients_fts')
+    migration_clients_fts(curs)
+
+
+# one row aggregate table for the dashboard labels; kept up to date by triggers
+DASHBOARD_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS Dashboard(
+           id INTEGER NOT NULL PRIMARY KEY CHECK(id = 1),
+           total_clients INTEGER NOT NULL DEFAULT(0),
+           total_credit DECIMAL(15, 2) NOT NULL DEFAULT(0),
+           open_invoices INTEGER NOT NULL DEFAULT(0),
+           paid_invoices INTEGER NOT NULL DEFAULT(0),
+           total_payments DECIMAL(15, 2) NOT NULL DEFAULT(0)
+       )""",
+    """CREATE TRIGGER IF NOT EXISTS dashboard_clients_insert AFTER INSERT ON Clients BEGIN
+           UPDATE Dashboard SET total_clients = total_clients + 1, total_credit = total_credit + new.credit;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS dashboard_clients_delete AFTER DELETE ON Clients BEGIN
+           UPDATE Dashboard SET total_clients = total_clients - 1, total_credit = total_credit - old.credit;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS dashboard_clients_update AFTER UPDATE OF credit ON Clients BEGIN
+           UPDATE Dashboard SET total_credit = total_credit - old.credit + new.credit;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS dashboard_credits_insert AFTER INSERT ON Credits BEGIN
+           UPDATE Dashboard SET open_invoices = open_invoices + (new.paid IS NOT 'paid'),
+                                paid_invoices = paid_invoices + (new.paid IS 'paid');
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS dashboard_credits_delete AFTER DELETE ON Credits BEGIN
+           UPDATE Dashboard SET open_invoices = open_invoices - (old.paid IS NOT 'paid'),
+                                paid_invoices = paid_invoices - (old.paid IS 'paid');
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS dashboard_credits_update AFTER UPDATE OF paid ON Credits BEGIN
+           UPDATE Dashboard SET open_invoices = open_invoices - (old.paid IS NOT 'paid') + (new.paid IS NOT 'paid'),
+                                paid_invoices = paid_invoices - (old.paid IS 'paid') + (new.paid IS 'paid');
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS dashboard_payments_insert AFTER INSERT ON Payments_log BEGIN
+           UPDATE Dashboard SET total_payments = total_payments + new.payment;
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS dashboard_payments_delete AFTER DELETE ON Payments_log BEGIN
+           UPDATE Dashboard SET total_payments = total_payments - old.payment;
+       END""",
+]
+
+
+def migration_dashboard(curs):
+    for query in DASHBOARD_SCHEMA:
+        curs.execute(query)
+    curs.execute("""INSERT OR REPLACE INTO Dashboard VALUES(1,
+                        (SELECT COUNT(id) FROM Clients),
+                        (SELECT COALESCE(SUM(credit), 0) FROM Clients),
+                        (SELECT COUNT(id) FROM Credits WHERE paid IS NOT 'paid'),
+                        (SELECT COUNT(id) FROM Credits WHERE paid IS 'paid'),
+                        (SELECT COALESCE(SUM(payment), 0) FROM Payments_log))""")
+
+
+# amounts were DECIMAL(15, 2) columns stored as REAL by sqlite; they become integer cents.
+# 4 add <column>_cents shadow columns kept in sync by triggers (old code can keep writing),
+# backfill_money fill them by batches of ids (resumable), 5 swap them with the REAL columns.
+MONEY_COLUMNS = {
+    'Clients': ['credit'],
+    'Credits': ['credit', 'versement', 'reste'],
+    'Payments_log': ['payment'],
+}
+# triggers and indexes using a money column; dropped before the swap and created again after
+MONEY_DEPENDENTS = ['clients_fts_insert', 'clients_fts_delete', 'clients_fts_update',
+                    'dashboard_clients_insert', 'dashboard_clients_delete', 'dashboard_clients_update',
+                    'dashboard_payments_insert', 'dashboard_payments_delete']
+
+
+def to_cents(column):
+    return 'CAST(ROUND(COALESCE({}, 0) * 100) AS INTEGER)'.format(column)
+
+
+def migration_money_columns(curs):
+    curs.execute('CREATE TABLE IF NOT EXISTS Money_migration(table_name TEXT NOT NULL PRIMARY KEY, '
+                 'last_id INTEGER NOT NULL DEFAULT(0))')
+    for table, columns in MONEY_COLUMNS.items():
+        for column in columns:
+            curs.execute('ALTER TABLE {} ADD COLUMN {}_cents INTEGER NOT NULL DEFAULT(0)'.format(table, column))
+        sets = ', '.join('{}_cents = {}'.format(column, to_cents('new.' + column)) for column in columns)
+        curs.execute("""CREATE TRIGGER money_{0}_insert AFTER INSERT ON {0} BEGIN
+                            UPDATE {0} SET {1} WHERE id = new.id;
+                        END""".format(table, sets))
+        curs.execute("""CREATE TRIGGER money_{0}_update AFTER UPDATE OF {1} ON {0} BEGIN
+                            UPDATE {0} SET {2} WHERE id = new.id;
+                        END""".format(table, ', '.join(columns), sets))
+        curs.execute('INSERT OR IGNORE INTO Money_migration(table_name) VALUES(?)', [table])
+
+
+def backfill_money(db_handler, batch_size=5000):
+    """
+    fill the _cents columns by batches of ids; each batch is a short transaction
+    and record its progress in Money_migration, so an interrupted run resume where it stopped
+    """
+    for table, columns in MONEY_COLUMNS.items():
+        desc, rows = db_handler.make_query('SELECT last_id FROM Money_migration WHERE table_name = ?', [table])
+        last_id = rows[0][0]
+        desc, rows = db_handler.make_query('SELECT COALESCE(MAX(id), 0) FROM {}'.format(table))
+        max_id = rows[0][0]
+        sets = ', '.join('{}_cents = {}'.format(column, to_cents(column)) for column in columns)
+        while last_id < max_id:
+            with db_handler.manager.transaction() as curs:
+                curs.execute('UPDATE {} SET {} WHERE id > ? AND id <= ?'.format(table, sets),
+                             [last_id, last_id + batch_size])
+                last_id = min(last_id + batch_size, max_id)
+                curs.execute('UPDATE Money_migration SET last_id = ? WHERE table_name = ?', [last_id, table])
+
+
+def migration_money_switch(curs):
+    # needs sqlite >= 3.35 (DROP COLUMN)
+    for table in MONEY_COLUMNS:
+        curs.execute('DROP TRIGGER IF EXISTS money_{}_insert'.format(table))
+        curs.execute('DROP TRIGGER IF EXISTS money_{}_update'.format(table))
+    for trigger in MONEY_DEPENDENTS:
+        curs.execute('DROP TRIGGER IF EXISTS {}'.format(trigger))
+    for index_name, on in INDEXES:
+        curs.execute('DROP INDEX IF EXISTS {}'.format(index_name))
+    for table, columns in MONEY_COLUMNS.items():
+        for column in columns:
+            curs.execute('ALTER TABLE {0} DROP COLUMN {1}'.format(table, column))
+            curs.execute('ALTER TABLE {0} RENAME COLUMN {1}_cents TO {1}'.format(table, column))
+    curs.execute('DROP TABLE Money_migration')
+    migration_indexes(curs)
+    migration_dashboard(curs)
+    curs.execute("SELECT name FROM sqlite_master WHERE name = 'Clients_fts'")
+    if curs.fetchone():
+        migration_clients_fts(curs)
+
+
+def migration_import_jobs(curs):
+    # progress of the bulk imports (see sqlite_import); a crashed import resume after last_line
+    curs.execute("""CREATE TABLE IF NOT EXISTS Import_jobs(
+                        source TEXT NOT NULL PRIMARY KEY,
+                        size INTEGER NOT NULL,
+                        last_line INTEGER NOT NULL DEFAULT(0),
+                        imported INTEGER NOT NULL DEFAULT(0),
+                        duplicates INTEGER NOT NULL DEFAULT(0),
+                        invalid INTEGER NOT NULL DEFAULT(0),
+                        finished INTEGER NOT NULL DEFAULT(0)
+                    )""")
+
+
+def migration_archive_index(curs):
+    # years archived for each client (see sqlite_archive); a history read attach only these archives
+    curs.execute("""CREATE TABLE IF NOT EXISTS Archive_index(
+                        client_id INTEGER NOT NULL,
+                        year INTEGER NOT NULL,
+                        invoices INTEGER NOT NULL DEFAULT(0),
+                        PRIMARY KEY(client_id, year)
+                    ) WITHOUT ROWID""")
+
+
+# paid invoices moved out of the hot database; one file per year of credit_date, ids are kept
+ARCHIVE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS Credits(
+           id INTEGER NOT NULL PRIMARY KEY,
+           client_id INTEGER NOT NULL,
+           credit_date TIMESTAMP NOT NULL,
+           credit INTEGER NOT NULL,
+           versement INTEGER NOT NULL,
+           reste INTEGER NOT NULL,
+           paid VARCHAR(25)
+       )""",
+    """CREATE TABLE IF NOT EXISTS Payments_log(
+           id INTEGER NOT NULL PRIMARY KEY,
+           fact_id INTEGER NOT NULL,
+           payment_date TIMESTAMP NOT NULL,
+           payment INTEGER NOT NULL
+       )""",
+    'CREATE INDEX IF NOT EXISTS idx_credits_client ON Credits(client_id, id)',
+    'CREATE INDEX IF NOT EXISTS idx_payments_log_fact ON Payments_log(fact_id, id)',
+]
+
+
+def archive_path(db_name, year):
+    # ./creadit.db -> ./creadit_2019.db
+    path = pathlib.Path(db_name)
+    return str(path.with_name('{}_{}{}'.format(path.stem, year, path.suffix or '.db')))
+
+
+# change data capture: every insert, update and delete of these tables append (table, id, op) to Changes;
+# seq only grows (AUTOINCREMENT). sqlite_cdc ship the rows changed after a seq to another node
+CDC_TABLES = ['Clients', 'Credits', 'Payments_log']
+
+
+def migration_changes(curs):
+    curs.execute("""CREATE TABLE IF NOT EXISTS Changes(
+                        seq INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+                        table_name TEXT NOT NULL,
+                        row_id INTEGER NOT NULL,
+                        op TEXT NOT NULL
+                    )""")
+    # this database id, and the last seq applied from each other node
+    curs.execute('CREATE TABLE IF NOT EXISTS Cdc_node(node_id TEXT NOT NULL)')
+    curs.execute("INSERT INTO Cdc_node(node_id) SELECT lower(hex(randomblob(8))) WHERE NOT EXISTS (SELECT 1 FROM Cdc_node)")
+    curs.execute("""CREATE TABLE IF NOT EXISTS Cdc_peers(
+                        node_id TEXT NOT NULL PRIMARY KEY,
+                        last_seq INTEGER NOT NULL DEFAULT(0)
+                    )""")
+    for table in CDC_TABLES:
+        for event, row, op in (('INSERT', 'new', 'I'), ('UPDATE', 'new', 'U'), ('DELETE', 'old', 'D')):
+            curs.execute("""CREATE TRIGGER IF NOT EXISTS cdc_{0}_{1} AFTER {2} ON {0} BEGIN
+                                INSERT INTO Changes(table_name, row_id, op) VALUES('{0}', {3}.id, '{4}');
+                            END""".format(table, event.lower(), event, row, op))
+    # the rows already there are the first changes; a new node start from seq 0
+    for table in CDC_TABLES:
+        curs.execute("INSERT INTO Changes(table_name, row_id, op) SELECT '{0}', id, 'I' FROM {0} ORDER BY id".format(table))
+
+
+# global keys for the merge of two databases (sqlite_sync): a client is its phone, an invoice and a payment
+# get a random uid; a delete keep the key of the row in Changes.key
+SYNC_KEYS = {'Clients': 'phone', 'Credits': 'uid', 'Payments_log': 'uid'}
+
+
+def migration_sync_keys(curs):
+    for table in ('Credits', 'Payments_log'):
+        curs.execute('ALTER TABLE {} ADD COLUMN uid TEXT'.format(table))
+        curs.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_{}_uid ON {}(uid)'.format(table.lower(), table))
+        # giving a row its uid is not a change: the cdc update trigger skip it (the insert is logged as 'I' alone)
+        curs.execute('DROP TRIGGER IF EXISTS cdc_{}_update'.format(table))
+        curs.execute("""CREATE TRIGGER cdc_{0}_update AFTER UPDATE ON {0} WHEN old.uid IS NOT NULL OR new.uid IS NULL BEGIN
+                            INSERT INTO Changes(table_name, row_id, op) VALUES('{0}', new.id, 'U');
+                        END""".format(table))
+        curs.execute("""CREATE TRIGGER IF NOT EXISTS sync_{0}_uid AFTER INSERT ON {0} WHEN new.uid IS NULL BEGIN
+                            UPDATE {0} SET uid = lower(hex(randomblob(8))) WHERE id = new.id;
+                        END""".format(table))
+    # the rows already there get a uid made of the row itself: two copies of one file agree on their common rows
+    curs.execute("UPDATE Credits SET uid = printf('%d:%d:%s:%d', id, client_id, credit_date, credit)")
+    curs.execute("UPDATE Payments_log SET uid = printf('%d:%d:%s:%d', id, fact_id, payment_date, payment)")
+    curs.execute('ALTER TABLE Changes ADD COLUMN key TEXT')
+    for table, key in SYNC_KEYS.items():
+        curs.execute('DROP TRIGGER IF EXISTS cdc_{}_delete'.format(table))
+        curs.execute("""CREATE TRIGGER cdc_{0}_delete AFTER DELETE ON {0} BEGIN
+                            INSERT INTO Changes(table_name, row_id, op, key) VALUES('{0}', old.id, 'D', old.{1});
+                        END""".format(table, key))
+
+
+# invoices of a client with their payment logs; {0} is main or an attached archive
+HISTORY_QUERY = """SELECT {0}.Credits.id, DATE(credit_date), credit, versement, reste, paid,
+                          DATE(payment_date), payment, {0}.Payments_log.id
+                   FROM {0}.Credits LEFT JOIN {0}.Payments_log ON {0}.Payments_log.fact_id = {0}.Credits.id
+                   WHERE client_id = ? ORDER BY {0}.Credits.id, {0}.Payments_log.id"""
+
+
+# (version, description, migration(curs) [, prepare(db_handler) run before the migration transaction])
+MIGRATIONS = [
+    (1, 'foreign keys indexes', migration_indexes),
+    (2, 'clients full-text search', migration_clients_fts),
+    (3, 'dashboard aggregates', migration_dashboard),
+    (4, 'integer cents columns', migration_money_columns),
+    (5, 'integer cents switch', migration_money_switch, backfill_money),
+    (6, 'bulk import progress', migration_import_jobs),
+    (7, 'paid invoices archive index', migration_archive_index),
+    (8, 'change data capture', migration_changes),
+    (9, 'merge keys', migration_sync_keys),
+    (10, 'clients full-text search on name and phone', migration_clients_fts_columns),
+]
+
+
 class SqliteFunc:
-    def __init__(self, db_name):
+    def __init__(self, db_name, readers=False, badge_cache_size=256, wal=False, busy_timeout=5000, retry=None,
+                 group_commit=False, commit_window=0.0):
         if pathlib.Path(db_name).is_file() and pathlib.Path(db_name).exists():
             self.db_name = db_name
         else:
@@ -70,6 +1012,11 @@ class SqliteFunc:
                 self.db_name = db_name
             else:
                 sys.exit()
+        self.manager = ConnectionManager(self.db_name, readers=readers, wal=wal, busy_timeout=busy_timeout, retry=retry)
+        self.instruments = []           # see QueryStats
+        self.badge_cache = LRUCache(badge_cache_size)       # client_id: client_badge row
+        # add_credit and add_payment from several threads are committed by groups (see WriteQueue)
+        self.write_queue = WriteQueue(self.manager, commit_window) if group_commit else None
 
     def error_msg(self, msg):
         print_formatted_text(HTML('<b>[<style fg="#dc3545">error</style>] <style fg="#dc3545">{}</style></b>'.format(msg)))
@@ -80,16 +1027,61 @@ class SqliteFunc:
     def login(self):
         """
         login to database; if database does not exist; than create it
+        the connection is the shared writer of the connection manager; don't close it
         """
         try:
-            conn = sqlite3.connect(self.db_name)
+            conn = self.manager.writer
         except Error as err:
             print_formatted_text(HTML('<b><style fg="#dc3545">[Err] {}</style></b>'.format(err)))
         else:
-            conn.execute('PRAGMA foreign_keys = 1')
             curs = conn.cursor()
             return conn, curs
 
+    @property
+    def call_timings(self):
+        return self.manager.call_timings
+
+    def close(self):
+        if self.write_queue is not None:
+            self.write_queue.close()
+        self.manager.close()
+
+    def write(self, func, *args):
+        """
+        run func(curs, *args) in a transaction; through the write queue when group_commit is on
+        return: func result once committed; raise its error
+        """
+        func = self.instrumented(func)
+        if self.write_queue is not None:
+            return self.write_queue.submit(func, *args).result()
+        with self.manager.transaction() as curs:
+            return func(curs, *args)
+
+    def instrumented(self, func):
+        # func(curs, *args) with its statements reported to the instruments (see InstrumentedCursor)
+        if not self.instruments:
+            return func
+        return lambda curs, *args: func(InstrumentedCursor(curs, self), *args)
+
+    def add_instrument(self, instrument):
+        """
+        instrument: object with record(query, params, elapsed, rows, error, plan) and wants_plan(elapsed)
+        """
+        self.instruments.append(instrument)
+
+    def remove_instrument(self, instrument):
+        self.instruments.remove(instrument)
+
+    def instrument(self, conn, query, params, elapsed, rows, error=None):
+        plan = None
+        if error is None and any(inst.wants_plan(elapsed) for inst in self.instruments):
+            try:
+                plan = [row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + query, params)]
+            except Error:
+                pass
+        for inst in self.instruments:
+            inst.record(query, params, elapsed, rows, error, plan)
+
     @property
     def show_tables(self):
         """
@@ -100,32 +1092,92 @@ class SqliteFunc:
         desc, rows = self.make_query(query)
         return self.display(desc, rows)
 
+    @timed
     def make_query(self, query, params=(), display=False):
         """
         usage : make_query('select * from table_name where id = ?', [1])
         return: tuple (desc, rows) | rowcount for update and delete operations
         """
-        conn, curs = self.login()
-        try:
-            curs.execute(query, params)
-        except Error as err:
-            self.error_msg(err)
-        else:
-            stmt = query.split()[0].upper()
-            if stmt == 'SELECT':
+        stmt = query.split()[0].upper()
+        if stmt == 'SELECT':
+            with self.manager.reading() as conn:
+                curs = conn.cursor()
+                start = time.perf_counter()
+                try:
+                    rows = self.manager.retry.call(lambda: curs.execute(query, params).fetchall())
+                except Error as err:
+                    if self.instruments:
+                        self.instrument(conn, query, params, time.perf_counter() - start, 0, str(err))
+                    self.error_msg(err)
+                    return
+                if self.instruments:
+                    self.instrument(conn, query, params, time.perf_counter() - start, len(rows))
                 desc = [desc[0] for desc in curs.description]
-                rows = curs.fetchall()
-                if display:
-                    # return display instance ex.
-                    # >>> make_query(query, params, display=True).display(desc, rows).as_named_tuple
-                    return self.display(desc, rows)
-                else:
-                    return (desc, rows)
+            if display:
+                # return display instance ex.
+                # >>> make_query(query, params, display=True).display(desc, rows).as_named_tuple
+                return self.display(desc, rows)
             else:
-                conn.commit()
-                return True
-        finally:
-            if conn: conn.close()
+                return (desc, rows)
+        else:
+            with self.manager.write_lock:
+                conn, curs = self.login()
+                start = time.perf_counter()
+                try:
+                    self.manager.retry.call(curs.execute, query, params, on_retry=conn.rollback)
+                    self.manager.retry.call(conn.commit)
+                except Error as err:
+                    conn.rollback()
+                    if self.instruments:
+                        self.instrument(conn, query, params, time.perf_counter() - start, 0, str(err))
+                    self.error_msg(err)
+                else:
+                    if self.instruments:
+                        self.instrument(conn, query, params, time.perf_counter() - start, curs.rowcount)
+                    return True
+
+    @property
+    def schema_version(self):
+        desc, rows = self.make_query('SELECT * FROM pragma_user_version')
+        return rows[0][0]
+
+    def migrate(self):
+        """
+        apply pending MIGRATIONS; each one in its own transaction with the new user_version
+        return: list of applied versions
+        """
+        applied = []
+        current = self.schema_version
+        for version, description, migration, *prepare in MIGRATIONS:
+            if version <= current:
+                continue
+            try:
+                for func in prepare:
+                    func(self)
+                with self.manager.transaction() as curs:
+                    migration(curs)
+                    curs.execute('PRAGMA user_version = {:d}'.format(version))
+            except Error as err:
+                self.error_msg('migration {} ({}) failed: {}'.format(version, description, err))
+                break
+            applied.append(version)
+        for index_name, query, plan, used in self.verify_indexes():
+            if not used:
+                self.error_msg('{} not used by: {}'.format(index_name, query))
+        return applied
+
+    def verify_indexes(self):
+        """
+        run EXPLAIN QUERY PLAN on INDEX_PLANS
+        return: list of (index_name, query, plan, used)
+        """
+        result = []
+        with self.manager.reading() as conn:
+            for index_name, query in INDEX_PLANS:
+                params = [None] * query.count('?')
+                plan = ' | '.join(row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + query, params))
+                result.append((index_name, query, plan, index_name in plan))
+        return result
 
     def create_tables(self, table_name, fields):
         """
@@ -135,140 +1187,355 @@ class SqliteFunc:
         query = 'CREATE TABLE {}(\n{}\n)'.format(table_name, ',\n'.join(fields))
         return self.make_query(query)
 
+    @timed
     def add_clients(self, name, phone):
         # insert new client in database
 
-        conn, curs = self.login()
         query = 'INSERT INTO Clients(name, phone, credit) VALUES(?, ?, ?)'
         params = [name, phone, 0]
+        with self.manager.write_lock:
+            conn, curs = self.login()
+            try:
+                curs.execute(query, params)
+            except IntegrityError as err:
+                conn.rollback()
+                self.error_msg(err)
+                return 'sqlite integrity error'
+            else:
+                conn.commit()
+                return ChangeSet().change('Clients', curs.lastrowid)
+
+    @timed
+    def add_credit(self, client_id, credit, credit_date):
+        # one atomic unit; the balance is updated in sql so two cashiers never lose an update
         try:
-            curs.execute(query, params)
-        except IntegrityError as err:
+            fact_id = self.write(self.insert_credit, client_id, Money.from_amount(credit), credit_date)
+        except Error as err:
             self.error_msg(err)
-            return 'sqlite integrity error'
         else:
-            conn.commit()
-        finally:
-            if conn: conn.close()
+            return self.credit_changes(client_id, fact_id)
 
-    def add_credit(self, client_id, credit, credit_date):
-        conn, curs = self.login()
-        query = 'SELECT credit FROM Clients WHERE id = ?'
-        params = [client_id]
-        desc, rows = self.make_query(query, params)
-        old_credit = rows[0][0]
+    def submit_credit(self, client_id, credit, credit_date):
+        """
+        add_credit without waiting; for a burst of credits keyed one after the other
+        return: Future of the ChangeSet; result() raise the sqlite error of this credit
+        usage : futures = [db_handler.submit_credit(client_id, credit, day) for ...]
+        """
+        future = Future()
+        args = (self.insert_credit, client_id, Money.from_amount(credit), credit_date)
+        if self.write_queue is None:
+            try:
+                future.set_result(self.credit_changes(client_id, self.write(*args)))
+            except Error as err:
+                future.set_exception(err)
+            return future
+
+        def done(write):
+            if write.exception() is not None:
+                future.set_exception(write.exception())
+            else:
+                future.set_result(self.credit_changes(client_id, write.result()))
+        self.write_queue.submit(self.instrumented(args[0]), *args[1:]).add_done_callback(done)
+        return future
 
-        update_clients_query = 'UPDATE Clients SET credit = ? WHERE id = ?'
-        new_credit = old_credit + credit
+    @staticmethod
+    def insert_credit(curs, client_id, credit, credit_date):
+        curs.execute('UPDATE Clients SET credit = credit + ? WHERE id = ?', [credit, client_id])
+        curs.execute('INSERT INTO Credits(client_id, credit_date, credit, reste) VALUES(?, ?, ?, ?)',
+                     [client_id, credit_date, credit, credit])
+        return curs.lastrowid
 
-        reste = credit - 0
-        insert_credits_query = 'INSERT INTO Credits(client_id, credit_date, credit, reste) VALUES(?, ?, ?, ?)'
+    def credit_changes(self, client_id, fact_id):
+        self.badge_cache.invalidate(int(client_id))
+        return ChangeSet().change('Clients', int(client_id)).change('Credits', fact_id)
+
+    @timed
+    def add_payment(self, client_id, fact_id, payment):
+        # one atomic unit; versement, reste and the paid flag are computed by sqlite from the stored row
+        update_pay_query = """UPDATE Credits SET versement = versement + :payment,
+                                                 reste = credit - versement - :payment,
+                                                 paid = CASE WHEN credit - versement - :payment <= 0
+                                                             THEN 'paid' ELSE paid END
+                              WHERE id = :fact_id"""
+        update_client_credit = 'UPDATE Clients SET credit = credit - :payment WHERE id = :client_id'
+        insert_new_pay = 'INSERT INTO Payments_log(fact_id, payment_date, payment) VALUES(:fact_id, :tday, :payment)'
+        payment = Money.from_amount(payment)
+        params = {'payment': payment, 'fact_id': fact_id, 'client_id': client_id, 'tday': datetime.now()}
+
+        def pay(curs):
+            curs.execute(update_pay_query, params)
+            if curs.rowcount == 0:
+                raise Error('Credit with id {} does not exist.'.format(fact_id))
+            curs.execute(update_client_credit, params)
+            curs.execute(insert_new_pay, params)
+            return curs.lastrowid
         try:
-            curs.execute(update_clients_query, [new_credit, client_id])
-            curs.execute(insert_credits_query, [client_id, credit_date, credit, reste])
+            log_id = self.write(pay)
         except Error as err:
             self.error_msg(err)
         else:
-            conn.commit()
-            conn.close()
-
-    def add_payment(self, client_id, fact_id, payment):
-        conn, curs = self.login()
-        fetch_query = 'SELECT credit, versement FROM Credits WHERE id = ?'
-        rows = self.make_query(fetch_query, [fact_id], display=True).as_namedtuple
-        db_client = rows[0]
+            self.badge_cache.invalidate(int(client_id))
+            changes = ChangeSet().change('Clients', int(client_id)).change('Credits', int(fact_id))
+            return changes.change('Payments_log', log_id)
 
-        new_payment = payment + db_client.versement
-        reste = db_client.credit - new_payment
+    @timed
+    def pay_on_account(self, client_id, payment):
+        """
+        a payment "on account": spread over the client open invoices, oldest first (credit_date, id)
+        the shares are computed by sqlite with a running total, then one UPDATE and one INSERT for all
+        the invoices; a payment greater than the client open reste is refused (nothing written)
+        usage : changes = db_handler.pay_on_account(client_id, 2500)
+        return: ChangeSet of the client, the invoices and the payment logs
+        """
+        # share of an invoice: its reste, or what is left of the payment after the older invoices
+        allocate_query = """INSERT INTO temp.Allocation(fact_id, payment)
+                            SELECT id, MIN(reste, :payment - before) FROM (
+                                SELECT id, reste, SUM(reste) OVER (ORDER BY credit_date, id) - reste AS before
+                                FROM Credits WHERE client_id = :client_id AND reste > 0)
+                            WHERE before < :payment ORDER BY before"""
+        update_pay_query = """UPDATE Credits SET versement = versement + Allocation.payment,
+                                                 reste = reste - Allocation.payment,
+                                                 paid = CASE WHEN reste - Allocation.payment <= 0
+                                                             THEN 'paid' ELSE paid END
+                              FROM temp.Allocation WHERE Credits.id = Allocation.fact_id"""
+        insert_pays = """INSERT INTO Payments_log(fact_id, payment_date, payment)
+                         SELECT fact_id, :tday, payment FROM temp.Allocation ORDER BY position"""
+        update_client_credit = 'UPDATE Clients SET credit = credit - :payment WHERE id = :client_id'
+        payment = Money.from_amount(payment)
+        if payment <= 0:
+            self.error_msg('Payment must be greater than 0.')
+            return
+        params = {'payment': payment, 'client_id': client_id, 'tday': datetime.now()}
 
-        update_pay_query = 'UPDATE Credits SET versement = ?, reste = ? WHERE id = ?'
-        update_client_credit = 'UPDATE Clients SET credit = credit - ? WHERE id = ?'
-        insert_new_pay = 'INSERT INTO Payments_log(fact_id, payment_date, payment) VALUES(?, ?, ?)'
+        def pay(curs):
+            curs.execute('CREATE TEMP TABLE IF NOT EXISTS Allocation('
+                         'position INTEGER PRIMARY KEY, fact_id INTEGER NOT NULL, payment INTEGER NOT NULL)')
+            curs.execute('DELETE FROM temp.Allocation')
+            curs.execute(allocate_query, params)
+            curs.execute('SELECT COALESCE(SUM(payment), 0) FROM temp.Allocation')
+            allocated = curs.fetchone()[0]
+            if allocated < payment:
+                raise Error('Payment {} is greater than the client open credit {}.'.format(payment, Money(allocated)))
+            curs.execute('SELECT COALESCE(MAX(id), 0) FROM Payments_log')
+            last_log = curs.fetchone()[0]
+            curs.execute(update_pay_query)
+            curs.execute(insert_pays, params)
+            curs.execute(update_client_credit, params)
+            curs.execute('SELECT fact_id FROM temp.Allocation')
+            fact_ids = [fact_id for fact_id, in curs.fetchall()]
+            curs.execute('SELECT id FROM Payments_log WHERE id > ?', [last_log])
+            return fact_ids, [log_id for log_id, in curs.fetchall()]
         try:
-            curs.execute(update_pay_query, [new_payment, reste, fact_id])
-            curs.execute(update_client_credit, [payment, client_id])
-            curs.execute(insert_new_pay, [fact_id, tday, payment])
+            fact_ids, log_ids = self.write(pay)
         except Error as err:
             self.error_msg(err)
         else:
-            conn.commit()
-            conn.close()
-            self.check_if_paid(fact_id)
+            self.badge_cache.invalidate(int(client_id))
+            changes = ChangeSet().change('Clients', int(client_id)).change('Credits', *fact_ids)
+            return changes.change('Payments_log', *log_ids)
 
+    @timed
     def check_if_paid(self, fact_id):
-        conn, curs = self.login()
-        query = 'SELECT reste FROM Credits WHERE id = ?'
-        params = [fact_id]
-        desc, rows = self.make_query(query, params)
-        reste = rows[0][0]
-        if reste == 0:
-            query = 'UPDATE Credits SET paid = ? WHERE id = ?'
-            params = ["paid", fact_id]
-            try:
-                curs.execute(query, params)
-            except Error as err:
-                self.error_msg(err)
-            else:
-                conn.commit()
-                conn.close()
+        query = 'UPDATE Credits SET paid = ? WHERE id = ? AND reste <= 0'
+        params = ["paid", fact_id]
+        return self.make_query(query, params)
 
+    @timed
     def get_payment_log(self, fact_id):
         query = 'SELECT DATE(payment_date), payment FROM Payments_log WHERE fact_id = ?'
         params = [fact_id]
         desc, rows = self.make_query(query, params)
         return rows
 
+    @timed
     def search(self, search_word, table_name, fields, search_fields):
+        money = MONEY_COLUMNS.get(table_name, [])
         for field in search_fields:
             if field == 'paid':
-                search_word = search_word.replace('%', '').title()
+                word = search_word.replace('%', '').title()
                 query = 'SELECT {} FROM {} WHERE {} = ?'.format(', '.join(fields), table_name, field)
             else:
-                search_word = '%' + search_word + '%'
-                query = 'SELECT {} FROM {} WHERE {} LIKE ?'.format(', '.join(fields), table_name, field)
+                # amounts are cents; match the text the user sees (5000.00)
+                word = '%' + search_word + '%'
+                column = money_text(field) if field in money else field
+                query = 'SELECT {} FROM {} WHERE {} LIKE ?'.format(', '.join(fields), table_name, column)
 
-            desc, rows = self.make_query(query, [search_word])
+            desc, rows = self.make_query(query, [word])
             if len(rows) > 0:
                 break
         return rows
 
+    def table_exists(self, table_name):
+        query = 'SELECT name FROM sqlite_master WHERE type = "table" AND name = ?'
+        desc, rows = self.make_query(query, [table_name])
+        return len(rows) > 0
+
+    @timed
+    def search_clients(self, search_word, limit=-1):
+        """
+        search name and phone at once with the Clients_fts index; best match first
+        words shorter than 3 chars (trigram) or a database without the index use LIKE
+        the credit is matched as shown (5000.00), outside the index
+        return: list of (id, name, phone, credit)
+        """
+        search_word = search_word.strip()
+        credit = "{} LIKE :word".format(money_text('credit'))
+        if len(search_word) >= 3 and self.table_exists('Clients_fts'):
+            query = """SELECT Clients.id, Clients.name, Clients.phone, Clients.credit
+                       FROM Clients_fts JOIN Clients ON Clients.id = Clients_fts.rowid
+                       WHERE Clients_fts MATCH :match ORDER BY Clients_fts.rank LIMIT :limit"""
+            params = {'match': '"{}"'.format(search_word.replace('"', '""')),
+                      'word': '%' + search_word + '%', 'limit': limit}
+            desc, rows = self.make_query(query, params)
+            if (re.fullmatch(r'[\d.]+', search_word) and ('.' in search_word or not rows)
+                    and (limit < 0 or len(rows) < limit)):
+                # an amount (a phone prefix found by the index is not); scan the credits after the matches
+                query = 'SELECT id, name, phone, credit FROM Clients WHERE {} ORDER BY id LIMIT :limit'.format(credit)
+                found = {row[0] for row in rows}
+                desc, amounts = self.make_query(query, params)
+                rows += [row for row in amounts if row[0] not in found]
+                if limit >= 0:
+                    rows = rows[:limit]
+            return rows
+        query = """SELECT id, name, phone, credit FROM Clients
+                   WHERE name LIKE :word OR phone LIKE :word OR {} ORDER BY id LIMIT :limit""".format(credit)
+        params = {'word': '%' + search_word + '%', 'limit': limit}
+        desc, rows = self.make_query(query, params)
+        return rows
+
     def get_client_reste(self, fact_id):
         query = 'SELECT reste FROM Credits WHERE id = ?'
         params = [fact_id]
         desc, rows = self.make_query(query, params)
-        return rows[0][0]
+        return Money(rows[0][0])
+
+    def refresh_badges(self):
+        # once per refresh of the views, not per badge: another process wrote, any badge may be outdated
+        if self.manager.external_changes():
+            self.badge_cache.clear()
 
+    @timed
     def client_badge(self, client_id):
-        # this will return client details as a namedtuple.
+        # this will return client details as a namedtuple; served from badge_cache (see refresh_badges)
+        client_id = int(client_id)
+        badge = self.badge_cache.get(client_id)
+        if badge is not None:
+            return badge
+        version = self.badge_cache.version
         query = 'SELECT name, phone, credit FROM Clients WHERE id = ?'
         rows = self.make_query(query, [client_id], display=True).as_namedtuple
-        return rows[0]
+        badge = rows[0]._replace(credit=Money(rows[0].credit))
+        self.badge_cache.put(client_id, badge, version)
+        return badge
+
+    @timed
+    def dashboard(self):
+        # totals maintained by the Dashboard triggers; a single row read
+        query = 'SELECT total_clients, total_credit, open_invoices, paid_invoices, total_payments FROM Dashboard'
+        rows = self.make_query(query, display=True).as_namedtuple
+        return rows[0]._replace(total_credit=Money(rows[0].total_credit), total_payments=Money(rows[0].total_payments))
+
+    @timed
+    def clients_page(self, after_id=0, limit=500):
+        """
+        keyset pagination; the next `limit` clients after after_id; constant cost whatever the page
+        return: list of (id, name, phone, credit)
+        """
+        query = 'SELECT id, name, phone, credit FROM Clients WHERE id > ? ORDER BY id LIMIT ?'
+        desc, rows = self.make_query(query, [after_id, limit])
+        return rows
 
     def get_clients(self):
         query = 'SELECT id, name FROM Clients ORDER BY id'
         desc, clients = self.make_query(query)
         return clients
 
+    @timed
     def delete_client(self, client_id):
+        # the client Credits and Payments_log rows go with it (ON DELETE CASCADE)
         query = 'DELETE FROM clients WHERE id = ?'
         result = self.make_query(query, [client_id])
-        return result
+        if result:
+            self.badge_cache.invalidate(int(client_id))
+            return ChangeSet().delete('Clients', int(client_id))
+
+    def client_rows(self, ids):
+        # rows of the main table for these client ids
+        ids = list(ids)
+        query = 'SELECT id, name, phone, credit FROM Clients WHERE id IN ({}) ORDER BY id'
+        desc, rows = self.make_query(query.format(', '.join('?' * len(ids))), ids)
+        return rows
+
+    @timed
+    def load_client_history(self, client_id, archived=False):
+        """
+        invoices and payment logs of a client in one query; see ClientHistory
+        archived: also the paid invoices moved to the yearly archives (sqlite_archive)
+        """
+        if archived:
+            desc, years = self.make_query('SELECT year FROM Archive_index WHERE client_id = ? ORDER BY year',
+                                          [client_id])
+            if years:
+                return ClientHistory(client_id, self.archived_history(client_id, [year for year, in years]))
+        desc, rows = self.make_query(HISTORY_QUERY.format('main'), [client_id])
+        return ClientHistory(client_id, rows)
+
+    def archived_history(self, client_id, years):
+        """
+        history rows of the hot database and of the archives of these years;
+        the archives are attached one at a time to a short lived connection, never to the app connections
+        """
+        conn = self.manager.connect()
+        try:
+            curs = conn.cursor()
+            rows = curs.execute(HISTORY_QUERY.format('main'), [client_id]).fetchall()
+            seen = {row[0] for row in rows}
+            for year in years:
+                path = archive_path(self.db_name, year)
+                if not pathlib.Path(path).exists():
+                    continue
+                atache_database(curs, "'{}'".format(path.replace("'", "''")), 'archive')
+                try:
+                    # an invoice still in the hot database (archive job interrupted) is read from there
+                    rows.extend(row for row in curs.execute(HISTORY_QUERY.format('archive'), [client_id])
+                                if row[0] not in seen)
+                finally:
+                    curs.execute('DETACH DATABASE archive')
+        finally:
+            conn.close()
+        rows.sort(key=lambda row: (row[0], row[8] or 0))
+        return rows
+
+    def payment_logs(self, fact_ids):
+        # payment logs of several invoices at once: (fact_id, date, payment)
+        fact_ids = list(fact_ids)
+        query = ('SELECT fact_id, DATE(payment_date), payment FROM Payments_log '
+                 'WHERE fact_id IN ({}) ORDER BY fact_id, id')
+        desc, rows = self.make_query(query.format(', '.join('?' * len(fact_ids))), fact_ids)
+        return rows
+
+    def credit_rows(self, ids):
+        # rows of the details table for these invoice ids
+        ids = list(ids)
+        query = ('SELECT id, DATE(credit_date), credit, versement, reste, paid FROM Credits '
+                 'WHERE id IN ({}) ORDER BY id')
+        desc, rows = self.make_query(query.format(', '.join('?' * len(ids))), ids)
+        return rows
 
     def product_exists(self, table, column, value):
         """
         usage : product_exists('magasin', 'reference', 'product_reference')
         return True or False
         """
-        conn, curs = self.login()
-        try:
-            curs.execute('SELECT id FROM ' + table + ' WHERE ' + column + ' = ?', [value])
-        except Error as err:
-            self.error_msg(err)
-        else:
-            if curs.fetchone(): return True
-            else: return False
-        finally:
-            if conn: conn.close()
+        with self.manager.reading() as conn:
+            curs = conn.cursor()
+            try:
+                curs.execute('SELECT id FROM ' + table + ' WHERE ' + column + ' = ?', [value])
+            except Error as err:
+                self.error_msg(err)
+            else:
+                if curs.fetchone(): return True
+                else: return False
 
     def display(self, desc, rows):
         display_inst = Display(desc, rows)
@@ -280,6 +1547,56 @@ class SqliteFunc:
 # ------------------ End of Class
 
 
+class IncrementalSearch:
+    def __init__(self, search_func, fields=(1, 2, 3), money_fields=(3,)):
+        """
+        Keep the rows of the last search; a term that extends the previous one can only match
+        a subset of them, so it is answered by filtering in memory instead of a new query.
+        usage : client_search = IncrementalSearch(db_handler.search_clients)
+                rows = client_search.cached(word) or run the query and client_search.store(word, rows)
+        """
+        self.search_func = search_func
+        self.fields = fields
+        self.money_fields = money_fields
+        self.reset()
+
+    def reset(self):
+        # call after every write; cached rows may be outdated
+        self.term = None
+        self.rows = None
+
+    def cached(self, term):
+        """
+        return: rows for term refined from the previous result | None if a query is needed
+        """
+        term = term.strip().lower()
+        if self.rows is None or self.term is None or not self.term or self.term not in term:
+            return None
+        if '.' in term and '.' not in self.term:
+            return None         # now an amount: search_clients scan the credits the previous term did not
+        if term != self.term:
+            self.rows = [row for row in self.rows if any(term in self.text(row, field) for field in self.fields)]
+            self.term = term
+        return self.rows
+
+    def text(self, row, field):
+        # the cents of a money field are matched as shown, like search_clients does
+        if field in self.money_fields:
+            return format_money(row[field])
+        return str(row[field]).lower()
+
+    def store(self, term, rows):
+        self.term = term.strip().lower()
+        self.rows = rows
+
+    def search(self, term):
+        rows = self.cached(term)
+        if rows is None:
+            rows = self.search_func(term)
+            self.store(term, rows)
+        return rows
+
+
 def atache_database(curs, dbname, alias):
     """
     # When you have multiple databases available and you want to use any one of them at a time.
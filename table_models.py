@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# author        : el3arbi bdabve@gmail.com
+# created       : 18-October-2026
+# description   : table models for the QTableView of the credit app
+#                 rows are kept column by column; the view ask only for the visible cells
+# ----------------------------------------------------------------------------
+
+from array import array
+from bisect import bisect_left
+from PyQt5 import QtCore
+from sqlite_utils import format_money
+
+
+class ColumnStore:
+    def __init__(self, rows=(), column_count=0):
+        """
+        Column oriented row store.
+        integer columns are kept in array('q'), real columns in array('d');
+        other columns (text, dates, NULL) keep the values returned by sqlite in a list
+        """
+        self.columns = [list(column) for column in zip(*rows)] if rows else [[] for _ in range(column_count)]
+        self.columns = [self.compact(column) for column in self.columns]
+
+    @staticmethod
+    def compact(values):
+        if all(type(v) is int for v in values):
+            try:
+                return array('q', values)
+            except OverflowError:
+                return values
+        if all(type(v) in (int, float) for v in values):
+            return array('d', values)
+        return values
+
+    def extend(self, rows):
+        # append rows; a column that can no longer stay in its array become a wider array or a list
+        for index, values in enumerate(zip(*rows)):
+            column = self.columns[index]
+            if isinstance(column, array):
+                try:
+                    column.extend(values)
+                    continue
+                except (TypeError, OverflowError):
+                    column = list(column)
+            column.extend(values)
+            self.columns[index] = self.compact(column)
+
+    def set_row(self, index, row):
+        for column, value in enumerate(row):
+            try:
+                self.columns[column][index] = value
+            except (TypeError, OverflowError):
+                values = list(self.columns[column])
+                values[index] = value
+                self.columns[column] = self.compact(values)
+
+    def remove_row(self, index):
+        for column in self.columns:
+            del column[index]
+
+    def find(self, row_id, ordered=False):
+        """
+        index of the row with this id (column 0) | -1
+        ordered: ids are ascending (keyset pages); binary search instead of a scan
+        """
+        ids = self.columns[0] if self.columns else []
+        if ordered:
+            index = bisect_left(ids, row_id)
+            return index if index < len(ids) and ids[index] == row_id else -1
+        try:
+            return ids.index(row_id)
+        except ValueError:
+            return -1
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def value(self, row, column):
+        return self.columns[column][row]
+
+    def row(self, row):
+        return tuple(column[row] for column in self.columns)
+
+
+def format_value(value):
+    # real columns are stored as double; show integral amounts like sqlite return them
+    if type(value) is float and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class RecordTableModel(QtCore.QAbstractTableModel):
+    def __init__(self, headers, right_column=(), money_column=(), parent=None):
+        super().__init__(parent)
+        self.headers = list(headers)
+        self.right_column = set(right_column)
+        self.money_column = set(money_column)           # integer cents shown as 1234.50
+        self.store = ColumnStore(column_count=len(self.headers))
+        self.fetch_page = None
+        self.submit = None
+        self.page_size = 500
+        self.exhausted = True
+        self.fetching = False
+        self.source = 0                 # bumped by each reset; a page of an older source is dropped
+
+    def set_source(self, fetch_page, page_size=500, submit=None):
+        """
+        lazy rows; the view call fetchMore when it scroll near the end
+        fetch_page(after_id, limit) return the next rows ordered by id (keyset pagination)
+        submit(fetch_page, after_id, limit, callback) run it off the gui thread and call callback(rows) back
+        on it (QueryWorker); without submit the page is read in fetchMore
+        usage : model.set_source(db_handler.clients_page, submit=self.fetch_clients)
+        """
+        self.beginResetModel()
+        self.fetch_page = fetch_page
+        self.submit = submit
+        self.page_size = page_size
+        self.exhausted = False
+        self.fetching = False
+        self.source += 1
+        self.store = ColumnStore(column_count=len(self.headers))
+        self.endResetModel()
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and self.fetch_page is not None and not self.exhausted and not self.fetching
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        count = len(self.store)
+        after_id = self.row_id(count - 1) if count else 0
+        if self.submit is None:
+            self.add_page(self.fetch_page(after_id, self.page_size))
+            return
+        # one page at a time; the view ask again once it is inserted
+        source = self.source
+        self.fetching = True
+
+        def done(rows):
+            if source == self.source:
+                self.fetching = False
+                self.add_page(rows)
+
+        self.submit(self.fetch_page, after_id, self.page_size, done)
+
+    def add_page(self, rows):
+        rows = rows or []
+        count = len(self.store)
+        self.exhausted = len(rows) < self.page_size
+        if rows:
+            self.beginInsertRows(QtCore.QModelIndex(), count, count + len(rows) - 1)
+            self.store.extend(rows)
+            self.endInsertRows()
+
+    def set_rows(self, rows, headers=None, right_column=None, money_column=None):
+        """
+        replace all the rows of the model
+        usage : model.set_rows(rows, ['ID', 'Name'], [1])
+        """
+        self.beginResetModel()
+        if headers is not None:
+            self.headers = list(headers)
+        if right_column is not None:
+            self.right_column = set(right_column)
+        if money_column is not None:
+            self.money_column = set(money_column)
+        self.fetch_page = None
+        self.exhausted = True
+        self.fetching = False
+        self.source += 1
+        self.store = ColumnStore(rows, len(self.headers))
+        self.endResetModel()
+
+    def patch_rows(self, rows, append=None):
+        """
+        update the rows with the same id (column 0) in place; O(changed rows) instead of a reset.
+        unknown ids are appended only to a paged source fully fetched (else fetchMore bring them);
+        rows set with set_rows (a search result) only get their known rows updated
+        """
+        ordered = self.fetch_page is not None
+        if append is None:
+            append = ordered and self.exhausted
+        for row in rows:
+            index = self.store.find(row[0], ordered)
+            if index >= 0:
+                self.store.set_row(index, row)
+                self.dataChanged.emit(self.index(index, 0), self.index(index, len(self.headers) - 1))
+            elif append:
+                count = len(self.store)
+                self.beginInsertRows(QtCore.QModelIndex(), count, count)
+                self.store.extend([row])
+                self.endInsertRows()
+
+    def remove_ids(self, ids):
+        ordered = self.fetch_page is not None
+        for row_id in ids:
+            index = self.store.find(row_id, ordered)
+            if index >= 0:
+                self.beginRemoveRows(QtCore.QModelIndex(), index, index)
+                self.store.remove_row(index)
+                self.endRemoveRows()
+
+    def row_id(self, row):
+        # column 0 is always the record id
+        return self.store.value(row, 0)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.store)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == QtCore.Qt.DisplayRole:
+            value = self.store.value(index.row(), index.column())
+            if index.column() in self.money_column:
+                return format_money(value)
+            return format_value(value)
+        if role == QtCore.Qt.TextAlignmentRole and index.column() in self.right_column:
+            return QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal and section < len(self.headers):
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
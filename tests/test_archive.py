@@ -0,0 +1,48 @@
+import pathlib
+
+import sqlite_archive
+import sqlite_utils
+
+
+def test_archive_paid_invoices(tmp_path):
+    db_name = str(tmp_path / 'creadit.db')
+    sqlite_utils.create_database(db_name)
+    db_handler = sqlite_utils.SqliteFunc(db_name)
+    try:
+        db_handler.migrate()
+        db_handler.add_clients('Ali', '0555123456')
+        db_handler.add_clients('Omar', '0661000000')
+        invoices = [(1, '100', '2019-05-01'), (1, '200', '2020-05-01'), (1, '300', '2024-05-01'),
+                    (2, '50', '2019-07-01'), (2, '70', '2019-08-01')]
+        for client_id, amount, day in invoices:
+            db_handler.add_credit(client_id, amount, day)
+        for client_id, fact_id, payment in ((1, 1, '40'), (1, 1, '60'), (1, 2, '200'), (1, 3, '10'), (2, 4, '50')):
+            db_handler.add_payment(client_id, fact_id, payment)
+        history = db_handler.load_client_history(1).invoices
+        dashboard = db_handler.dashboard()
+
+        # one invoice per batch; invoice 5 is not paid and stays
+        moved = sqlite_archive.archive_paid(db_handler, before='2021-01-01', batch_size=1)
+        assert moved == {2019: 2, 2020: 1}
+        assert pathlib.Path(sqlite_utils.archive_path(db_name, 2019)).exists()
+        assert [fact_id for fact_id, in db_handler.make_query('SELECT id FROM Credits ORDER BY id')[1]] == [3, 5]
+        assert db_handler.make_query('SELECT COUNT(*) FROM Payments_log')[1][0][0] == 1
+        desc, rows = db_handler.make_query('SELECT client_id, year, invoices FROM Archive_index '
+                                           'ORDER BY client_id, year')
+        assert rows == [(1, 2019, 1), (1, 2020, 1), (2, 2019, 1)]
+        # the archived invoices still count in the totals
+        assert db_handler.dashboard() == dashboard
+        desc, rows = db_handler.make_query("SELECT DISTINCT op FROM Changes WHERE op IN ('A', 'D')")
+        assert rows == [('A',)]
+
+        # the details read them back with their payments
+        archived = db_handler.load_client_history(1, archived=True)
+        assert archived.invoices == history
+        assert [payment for day, payment in archived.payment_log(1)] == [4000, 6000]
+        assert [row[0] for row in db_handler.load_client_history(1).invoices] == [3]
+        assert [row[0] for row in db_handler.load_client_history(2, archived=True).invoices] == [4, 5]
+
+        # nothing left to move
+        assert sqlite_archive.archive_paid(db_handler, before='2021-01-01') == {}
+    finally:
+        db_handler.close()
@@ -0,0 +1,67 @@
+import gzip
+from datetime import datetime
+
+import pytest
+
+import sqlite_backup
+import sqlite_utils
+
+
+def make_handler(tmp_path):
+    db_name = str(tmp_path / 'creadit.db')
+    sqlite_utils.create_database(db_name)
+    db_handler = sqlite_utils.SqliteFunc(db_name)
+    db_handler.migrate()
+    db_handler.add_clients('Ali', '0555123456')
+    return db_handler
+
+
+def test_backup_verify_and_rotation(tmp_path):
+    db_handler = make_handler(tmp_path)
+    backups = tmp_path / 'backups'
+    try:
+        paths = [sqlite_backup.backup(db_handler, backups, keep=3) for _ in range(5)]
+        # same second: still five generations, the last three kept
+        assert len(set(paths)) == 5
+        assert sqlite_backup.generations(backups, 'creadit') == paths[:1:-1]
+        assert sqlite_backup.verify_backup(paths[-1]) == []
+
+        plain = sqlite_backup.backup(db_handler, backups, keep=3, compress=False)
+        assert plain.suffix == '.db' and sqlite_backup.verify_backup(plain) == []
+        assert len(sqlite_backup.generations(backups, 'creadit')) == 3
+    finally:
+        db_handler.close()
+
+
+def test_backup_never_replace_a_generation(tmp_path, monkeypatch):
+    db_handler = make_handler(tmp_path)
+    backups = tmp_path / 'backups'
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2026, 10, 18, 12, 0, 0)
+
+    monkeypatch.setattr(sqlite_backup, 'datetime', FrozenDatetime)
+    try:
+        path = sqlite_backup.backup(db_handler, backups)
+        with pytest.raises(sqlite_backup.BackupError):
+            sqlite_backup.backup(db_handler, backups)
+        assert sqlite_backup.generations(backups, 'creadit') == [path]
+    finally:
+        db_handler.close()
+
+
+def test_verify_a_damaged_backup(tmp_path):
+    db_handler = make_handler(tmp_path)
+    try:
+        path = sqlite_backup.backup(db_handler, tmp_path / 'backups')
+    finally:
+        db_handler.close()
+    with gzip.open(path, 'rb') as file:
+        data = bytearray(file.read())
+    page_size = int.from_bytes(data[16:18], 'big')
+    data[page_size + 8:page_size * 2] = b'\xff' * (page_size - 8)       # second page: garbage cells
+    with gzip.open(path, 'wb') as file:
+        file.write(bytes(data))
+    assert sqlite_backup.verify_backup(path) != []
@@ -0,0 +1,33 @@
+import sqlite3
+
+import sqlite_utils
+
+
+def test_external_writes_are_checked_once_per_refresh(tmp_path):
+    db_name = str(tmp_path / 'creadit.db')
+    sqlite_utils.create_database(db_name)
+    db_handler = sqlite_utils.SqliteFunc(db_name)
+    try:
+        db_handler.migrate()
+        db_handler.add_clients('Ali', '0555123456')
+        client_id = db_handler.make_query("SELECT id FROM Clients WHERE phone = '0555123456'")[1][0][0]
+        db_handler.refresh_badges()
+        assert db_handler.client_badge(client_id).name == 'Ali'
+
+        # another process rename the client: the badges are served from the cache until the next refresh
+        other = sqlite3.connect(db_name)
+        other.execute("UPDATE Clients SET name = 'Ali B' WHERE id = ?", [client_id])
+        other.commit()
+        other.close()
+        calls = []
+        external_changes = db_handler.manager.external_changes
+        db_handler.manager.external_changes = lambda: calls.append(1) or external_changes()
+        for _ in range(3):
+            assert db_handler.client_badge(client_id).name == 'Ali'
+        assert calls == []
+
+        db_handler.refresh_badges()
+        assert calls == [1]
+        assert db_handler.client_badge(client_id).name == 'Ali B'
+    finally:
+        db_handler.close()
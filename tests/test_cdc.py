@@ -0,0 +1,96 @@
+import shutil
+
+import pytest
+
+import sqlite_archive
+import sqlite_cdc
+import sqlite_utils
+
+
+def make_handler(db_name):
+    sqlite_utils.create_database(db_name)
+    db_handler = sqlite_utils.SqliteFunc(db_name)
+    db_handler.migrate()
+    return db_handler
+
+
+def add_client(db_handler, name, phone, credit):
+    db_handler.add_clients(name, phone)
+    client_id = db_handler.make_query('SELECT id FROM Clients WHERE phone = ?', [phone])[1][0][0]
+    db_handler.add_credit(client_id, credit, '2026-10-18')
+    return client_id
+
+
+def rows(db_handler):
+    return (db_handler.make_query('SELECT id, name, phone, credit FROM Clients ORDER BY id')[1],
+            db_handler.make_query('SELECT id, client_id, credit, uid FROM Credits ORDER BY id')[1])
+
+
+def test_apply_exported_batch(tmp_path):
+    shop_a = make_handler(str(tmp_path / 'shop_a.db'))
+    shop_b = make_handler(str(tmp_path / 'shop_b.db'))
+    try:
+        add_client(shop_a, 'Ali', '0555123456', '5000')
+        omar = add_client(shop_a, 'Omar', '0661000000', '150.5')
+        path = tmp_path / 'changes.json.gz'
+        sqlite_cdc.write_batch(sqlite_cdc.export_changes(shop_a), path)
+        batch = sqlite_cdc.read_batch(path)
+        assert sqlite_cdc.apply_changes(shop_b, batch).changed['Clients'] == {1, omar}
+        assert rows(shop_b) == rows(shop_a)
+        # applied twice: skipped
+        assert sqlite_cdc.apply_changes(shop_b, batch).changed == {}
+
+        shop_a.make_query('DELETE FROM Credits WHERE client_id = ?', [omar])
+        shop_a.make_query('DELETE FROM Clients WHERE id = ?', [omar])
+        since = sqlite_cdc.last_seq(shop_b, batch['node'])
+        for batch in sqlite_cdc.export_batches(shop_a, since, batch_size=2):
+            sqlite_cdc.apply_changes(shop_b, batch)
+        assert rows(shop_b) == rows(shop_a)
+    finally:
+        shop_a.close()
+        shop_b.close()
+
+
+def test_copied_database_get_its_own_node(tmp_path):
+    shop_a = make_handler(str(tmp_path / 'shop_a.db'))
+    add_client(shop_a, 'Ali', '0555123456', '5000')
+    shutil.copy(str(tmp_path / 'shop_a.db'), str(tmp_path / 'shop_b.db'))
+    shop_b = sqlite_utils.SqliteFunc(str(tmp_path / 'shop_b.db'))
+    try:
+        add_client(shop_a, 'Omar', '0661000000', '150.5')
+        with pytest.raises(sqlite_utils.Error, match='renew'):
+            sqlite_cdc.apply_changes(shop_b, sqlite_cdc.export_changes(shop_a))
+
+        # pull see the copy and renew it; only the rows added after the copy are shipped
+        assert sqlite_cdc.pull(shop_b, shop_a) == 1
+        assert rows(shop_b) == rows(shop_a)
+        node_a = shop_a.make_query('SELECT node_id FROM Cdc_node')[1][0][0]
+        assert shop_b.make_query('SELECT node_id FROM Cdc_node')[1][0][0] != node_a
+        assert sqlite_cdc.pull(shop_b, shop_a) == 0
+    finally:
+        shop_a.close()
+        shop_b.close()
+
+
+def test_archived_invoices_are_not_deleted_on_pull(tmp_path):
+    shop_a = make_handler(str(tmp_path / 'shop_a.db'))
+    shop_b = make_handler(str(tmp_path / 'shop_b.db'))
+    try:
+        client_id = add_client(shop_a, 'Ali', '0555123456', '100')
+        add_client(shop_a, 'Omar', '0661000000', '150')
+        shop_a.make_query("UPDATE Credits SET credit_date = '2020-03-01' WHERE client_id = ?", [client_id])
+        fact_id = shop_a.make_query('SELECT id FROM Credits WHERE client_id = ?', [client_id])[1][0][0]
+        shop_a.add_payment(client_id, fact_id, '100')
+        sqlite_cdc.pull(shop_b, shop_a)
+        dashboard = shop_a.dashboard()
+
+        assert sqlite_archive.archive_paid(shop_a, before='2021-01-01') == {2020: 1}
+        assert shop_a.dashboard() == dashboard
+        sqlite_cdc.pull(shop_b, shop_a)
+        # the archive is local to shop A: B keep the invoice and its payment, and the same totals
+        assert shop_b.make_query('SELECT COUNT(*) FROM Credits WHERE id = ?', [fact_id])[1][0][0] == 1
+        assert shop_b.make_query('SELECT COUNT(*) FROM Payments_log WHERE fact_id = ?', [fact_id])[1][0][0] == 1
+        assert shop_b.dashboard() == dashboard
+    finally:
+        shop_a.close()
+        shop_b.close()
@@ -0,0 +1,62 @@
+import csv
+import json
+
+import pytest
+
+import sqlite_export
+import sqlite_utils
+
+
+def make_ledger(tmp_path):
+    db_name = str(tmp_path / 'creadit.db')
+    sqlite_utils.create_database(db_name)
+    db_handler = sqlite_utils.SqliteFunc(db_name)
+    db_handler.migrate()
+    for name, phone in (('Ali', '0555123456'), ('Omar', '0661000000')):
+        db_handler.add_clients(name, phone)
+    db_handler.add_credit(1, '1500.5', '2024-01-10')
+    db_handler.add_credit(1, '200', '2024-06-01')
+    db_handler.add_credit(2, '0.1', '2024-03-01')
+    db_handler.add_payment(1, 1, '500')
+    return db_handler
+
+
+def test_export_csv_and_jsonl(tmp_path):
+    db_handler = make_ledger(tmp_path)
+    try:
+        # batch_size 1: the rows are streamed one fetchmany at a time
+        counts = sqlite_export.export_ledger(db_handler, tmp_path / 'csv', 'csv', batch_size=1)
+        assert counts == {'Clients': 2, 'Credits': 3, 'Payments_log': 1}
+        with open(tmp_path / 'csv' / 'Credits.csv', newline='') as file:
+            rows = list(csv.reader(file))
+        assert rows[0] == ['id', 'client_id', 'credit_date', 'credit', 'versement', 'reste', 'paid']
+        # amounts as shown, not the stored cents
+        assert [row[3:6] for row in rows[1:]] == [['1500.50', '500.00', '1000.50'], ['200.00', '0.00', '200.00'],
+                                                  ['0.10', '0.00', '0.10']]
+
+        counts = sqlite_export.export_ledger(db_handler, tmp_path / 'jsonl', 'jsonl', date_from='2024-02-01',
+                                             date_to='2024-12-31', client_ids=[1])
+        assert counts['Credits'] == 1
+        with open(tmp_path / 'jsonl' / 'Credits.jsonl', encoding='utf-8') as file:
+            rows = [json.loads(line) for line in file]
+        assert [(row['id'], row['credit']) for row in rows] == [(2, '200.00')]
+
+        with pytest.raises(ValueError):
+            sqlite_export.export_ledger(db_handler, tmp_path / 'ledger.ods')
+    finally:
+        db_handler.close()
+
+
+def test_export_xlsx(tmp_path):
+    pytest.importorskip('xlsxwriter')
+    openpyxl = pytest.importorskip('openpyxl')
+    db_handler = make_ledger(tmp_path)
+    try:
+        counts = sqlite_export.export_ledger(db_handler, tmp_path / 'ledger.xlsx')
+        assert counts == {'Clients': 2, 'Credits': 3, 'Payments_log': 1}
+        workbook = openpyxl.load_workbook(tmp_path / 'ledger.xlsx')
+        assert workbook.sheetnames == ['Clients', 'Credits', 'Payments_log']
+        # amounts are numbers
+        assert [row[3] for row in workbook['Credits'].iter_rows(min_row=2, values_only=True)] == [1500.5, 200, 0.1]
+    finally:
+        db_handler.close()
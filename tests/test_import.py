@@ -0,0 +1,67 @@
+import pytest
+
+import sqlite_import
+import sqlite_utils
+
+LEGACY = '''nom;telephone;solde;date
+Ali;0555 12 34 56;1 500,50;2024-01-10
+Omar;+213 661-00-00-00;200;2024-02-01
+Ali bis;0555123456;10;2024-03-01
+Sami;0770000000;0;
+Karim;12345;100;2024-01-01
+Nadia;0699999999;abc;2024-01-01
+Yacine;0550000001;75.25;2024-04-01
+'''
+
+
+def make_handler(tmp_path):
+    db_name = str(tmp_path / 'creadit.db')
+    sqlite_utils.create_database(db_name)
+    db_handler = sqlite_utils.SqliteFunc(db_name)
+    db_handler.migrate()
+    return db_handler
+
+
+def test_import_report_duplicates_and_resume(tmp_path):
+    db_handler = make_handler(tmp_path)
+    source = tmp_path / 'legacy.csv'
+    source.write_text(LEGACY, encoding='utf-8')
+    try:
+        # Sami is already a client
+        db_handler.add_clients('Sami', '0770000000')
+
+        def interrupt(report):
+            raise KeyboardInterrupt()
+
+        with pytest.raises(KeyboardInterrupt):
+            sqlite_import.import_clients(db_handler, source, chunk_size=3, progress=interrupt)
+        desc, rows = db_handler.make_query('SELECT phone FROM Clients ORDER BY id')
+        assert [phone for phone, in rows] == ['0770000000', '0555123456', '0661000000']
+
+        report = sqlite_import.import_clients(db_handler, source, chunk_size=3)
+        assert report.resumed_at == 4
+        assert report.imported == 3
+        # Sami (line 5) is a client already; the repeated Ali of line 4 was reported by the interrupted run
+        assert [line for line, phone, name in report.duplicates] == [5]
+        assert sorted(line for line, value, reason in report.invalid) == [6, 7]
+        desc, rows = db_handler.make_query('SELECT last_line, imported, duplicates, invalid, finished FROM Import_jobs')
+        assert rows == [(8, 3, 2, 2, 1)]
+
+        desc, rows = db_handler.make_query('SELECT name, phone, credit FROM Clients ORDER BY id')
+        assert rows == [('Sami', '0770000000', 0), ('Ali', '0555123456', 150050),
+                        ('Omar', '0661000000', 20000), ('Yacine', '0550000001', 7525)]
+        desc, rows = db_handler.make_query('SELECT client_id, DATE(credit_date), credit, reste '
+                                           'FROM Credits ORDER BY id')
+        assert rows == [(2, '2024-01-10', 150050, 150050), (3, '2024-02-01', 20000, 20000),
+                        (4, '2024-04-01', 7525, 7525)]
+        assert db_handler.dashboard().total_credit == 177575
+        # the full-text trigger dropped during the chunks is back and the new clients are indexed
+        assert [row[1] for row in db_handler.search_clients('Yac')] == ['Yacine']
+        db_handler.add_clients('Yasmine', '0550000002')
+        assert [row[1] for row in db_handler.search_clients('Ya')] == ['Yacine', 'Yasmine']
+
+        # finished: the same file again start over and find every phone taken
+        report = sqlite_import.import_clients(db_handler, source, chunk_size=3)
+        assert report.resumed_at == 0 and report.imported == 0
+    finally:
+        db_handler.close()
@@ -0,0 +1,28 @@
+import sqlite_utils
+
+
+def test_writes_are_instrumented(tmp_path):
+    db_name = str(tmp_path / 'creadit.db')
+    sqlite_utils.create_database(db_name)
+    db_handler = sqlite_utils.SqliteFunc(db_name)
+    try:
+        db_handler.migrate()
+        db_handler.add_clients('Ali', '0555123456')
+        client_id = db_handler.make_query("SELECT id FROM Clients WHERE phone = '0555123456'")[1][0][0]
+        stats = sqlite_utils.QueryStats(slow_ms=0)
+        db_handler.add_instrument(stats)
+        db_handler.add_credit(client_id, '5000', '2026-10-18')
+        db_handler.add_credit(client_id, '300', '2026-10-19')
+        fact_id = db_handler.make_query('SELECT MIN(id) FROM Credits')[1][0][0]
+        db_handler.add_payment(client_id, fact_id, '1000')
+        db_handler.pay_on_account(client_id, '4300')
+
+        summary = {item['fingerprint']: item for item in stats.summary()}
+        inserts = [key for key in summary if key.startswith('INSERT INTO Payments_log')]
+        assert len(inserts) == 2
+        assert sum(summary[key]['rows'] for key in inserts) == 3       # one payment, then one per open invoice
+        assert summary['UPDATE Clients SET credit = credit + ? WHERE id = ?']['calls'] == 2
+        # slow_ms=0: every statement get its plan
+        assert all(entry['plan'] for entry in stats.slow_log if entry['query'].startswith('INSERT INTO Credits'))
+    finally:
+        db_handler.close()
@@ -0,0 +1,57 @@
+import sqlite3
+
+import sqlite_utils
+
+
+def test_real_amounts_become_cents(tmp_path, monkeypatch):
+    db_name = str(tmp_path / 'creadit.db')
+    sqlite_utils.create_database(db_name)
+    # a baseline database: amounts are REAL, the client credit a sum of them
+    conn = sqlite3.connect(db_name)
+    conn.execute("INSERT INTO Clients(name, phone, credit) VALUES('Ali', '0555123456', 0)")
+    for amount in (0.1, 0.2):
+        conn.execute("INSERT INTO Credits(client_id, credit_date, credit, versement, reste) "
+                     "VALUES(1, '2026-10-18', ?, 0, ?)", [amount, amount])
+        conn.execute('UPDATE Clients SET credit = credit + ? WHERE id = 1', [amount])
+    conn.execute("UPDATE Credits SET versement = 0.05, reste = credit - 0.05 WHERE id = 1")
+    conn.execute("INSERT INTO Payments_log(fact_id, payment_date, payment) VALUES(1, '2026-10-18', 0.05)")
+    conn.execute('UPDATE Clients SET credit = credit - 0.05 WHERE id = 1')
+    conn.commit()
+    assert conn.execute('SELECT credit FROM Clients').fetchone()[0] != 0.25
+    conn.close()
+
+    db_handler = sqlite_utils.SqliteFunc(db_name)
+    try:
+        # the shadow columns, then a backfill interrupted after one row per table
+        monkeypatch.setattr(sqlite_utils, 'MIGRATIONS', sqlite_utils.MIGRATIONS[:4])
+        assert db_handler.migrate() == [1, 2, 3, 4]
+        monkeypatch.undo()
+        with db_handler.manager.transaction() as curs:
+            for table, columns in sqlite_utils.MONEY_COLUMNS.items():
+                sets = ', '.join('{}_cents = {}'.format(column, sqlite_utils.to_cents(column)) for column in columns)
+                curs.execute('UPDATE {} SET {} WHERE id <= 1'.format(table, sets))
+            curs.execute('UPDATE Money_migration SET last_id = 1')
+        # the old code keep writing REAL amounts meanwhile; the triggers convert them
+        db_handler.make_query("INSERT INTO Credits(client_id, credit_date, credit, versement, reste) "
+                              "VALUES(1, '2026-10-19', 0.7, 0, 0.7)")
+        db_handler.make_query('UPDATE Clients SET credit = credit + 0.7 WHERE id = 1')
+
+        assert db_handler.migrate()[0] == 5
+        desc, rows = db_handler.make_query('SELECT credit, typeof(credit) FROM Clients')
+        assert rows == [(95, 'integer')]
+        desc, rows = db_handler.make_query('SELECT credit, versement, reste FROM Credits ORDER BY id')
+        assert rows == [(10, 5, 5), (20, 0, 20), (70, 0, 70)]
+        assert db_handler.make_query('SELECT payment FROM Payments_log')[1] == [(5,)]
+        dashboard = db_handler.dashboard()
+        assert (dashboard.total_clients, dashboard.total_credit, dashboard.total_payments) == (1, 95, 5)
+        assert (dashboard.open_invoices, dashboard.paid_invoices) == (3, 0)
+        assert not db_handler.table_exists('Money_migration')
+
+        # the index and the triggers dropped for the swap are back
+        assert [row[1] for row in db_handler.search_clients('Ali')] == ['Ali']
+        assert all(used for index_name, query, plan, used in db_handler.verify_indexes())
+        db_handler.add_credit(1, '0.1', '2026-10-20')
+        assert db_handler.dashboard().total_credit == 105
+        assert db_handler.client_badge(1).credit == sqlite_utils.Money(105)
+    finally:
+        db_handler.close()
@@ -0,0 +1,57 @@
+import sqlite_utils
+
+
+def make_handler(tmp_path):
+    db_name = str(tmp_path / 'creadit.db')
+    sqlite_utils.create_database(db_name)
+    db_handler = sqlite_utils.SqliteFunc(db_name)
+    db_handler.migrate()
+    db_handler.add_clients('Ali', '0555123456')
+    db_handler.add_clients('Omar', '0661000000')
+    # ids are not in date order: the oldest invoice is 2
+    for client_id, amount, day in ((1, '100', '2024-03-01'), (1, '50', '2024-01-01'), (1, '80', '2024-02-01'),
+                                   (2, '40', '2023-01-01')):
+        db_handler.add_credit(client_id, amount, day)
+    db_handler.add_payment(1, 3, '30')
+    return db_handler
+
+
+def invoices(db_handler):
+    return db_handler.make_query('SELECT id, versement, reste, paid FROM Credits WHERE client_id = 1 ORDER BY id')[1]
+
+
+def test_payment_spread_oldest_first(tmp_path):
+    db_handler = make_handler(tmp_path)
+    try:
+        last_log = db_handler.make_query('SELECT MAX(id) FROM Payments_log')[1][0][0]
+        changes = db_handler.pay_on_account(1, '120')
+        assert invoices(db_handler) == [(1, 2000, 8000, 'not paid'), (2, 5000, 0, 'paid'), (3, 8000, 0, 'paid')]
+        desc, rows = db_handler.make_query('SELECT fact_id, payment FROM Payments_log WHERE id > ? ORDER BY id',
+                                           [last_log])
+        assert rows == [(2, 5000), (3, 5000), (1, 2000)]
+        assert changes.changed == {'Clients': {1}, 'Credits': {1, 2, 3}, 'Payments_log': {last_log + 1, last_log + 2,
+                                                                                          last_log + 3}}
+        assert db_handler.client_badge(1).credit == sqlite_utils.Money(8000)
+        dashboard = db_handler.dashboard()
+        assert (dashboard.total_payments, dashboard.paid_invoices, dashboard.open_invoices) == (15000, 2, 2)
+
+        # the whole open reste: the last invoice is paid too
+        db_handler.pay_on_account(1, '80')
+        assert invoices(db_handler)[0] == (1, 10000, 0, 'paid')
+        assert db_handler.client_badge(1).credit == 0
+    finally:
+        db_handler.close()
+
+
+def test_overpayment_is_refused(tmp_path):
+    db_handler = make_handler(tmp_path)
+    try:
+        before = (invoices(db_handler), db_handler.make_query('SELECT COUNT(*) FROM Payments_log')[1],
+                  db_handler.dashboard(), db_handler.client_badge(1))
+        # open reste of Ali: 100 + 50 + 50; Omar's invoice is not his
+        assert db_handler.pay_on_account(1, '200.01') is None
+        assert db_handler.pay_on_account(1, '0') is None
+        assert (invoices(db_handler), db_handler.make_query('SELECT COUNT(*) FROM Payments_log')[1],
+                db_handler.dashboard(), db_handler.client_badge(1)) == before
+    finally:
+        db_handler.close()
@@ -0,0 +1,71 @@
+import sqlite_utils
+
+
+def make_handler(tmp_path):
+    db_name = str(tmp_path / 'creadit.db')
+    sqlite_utils.create_database(db_name)
+    db_handler = sqlite_utils.SqliteFunc(db_name)
+    db_handler.migrate()
+    return db_handler
+
+
+def test_search_clients_by_shown_amount(tmp_path):
+    db_handler = make_handler(tmp_path)
+    for name, phone, credit in (('Ali', '0555123456', '5000'), ('Omar', '0661000000', '150.5')):
+        db_handler.add_clients(name, phone)
+        client_id = db_handler.make_query('SELECT id FROM Clients WHERE phone = ?', [phone])[1][0][0]
+        db_handler.add_credit(client_id, credit, '2026-10-18')
+    for word in ('5000', '5000.00', '500'):
+        assert [row[1] for row in db_handler.search_clients(word)] == ['Ali']
+    assert [row[1] for row in db_handler.search_clients('150.50')] == ['Omar']
+    assert [row[1] for row in db_handler.search_clients('0661')] == ['Omar']
+    assert [row[1] for row in db_handler.search_clients('50')] == ['Ali', 'Omar']
+
+    # a phone found by the index: the credits are not scanned, unless the term is an amount (a dot)
+    db_handler.add_clients('Sami', '0550060500')
+    assert [row[1] for row in db_handler.search_clients('500')] == ['Sami']
+    assert [row[1] for row in db_handler.search_clients('5000.')] == ['Ali']
+
+    # a refined term is filtered in memory against the amount as shown; a dot make it an amount search
+    client_search = sqlite_utils.IncrementalSearch(db_handler.search_clients)
+    client_search.search('500')
+    assert client_search.cached('5000') == []
+    assert client_search.cached('500.0') is None
+    assert [row[1] for row in client_search.search('5000.0')] == ['Ali']
+    db_handler.manager.close()
+
+
+def test_clients_fts_rebuilt_without_credit(tmp_path, monkeypatch):
+    db_name = str(tmp_path / 'creadit.db')
+    sqlite_utils.create_database(db_name)
+    db_handler = sqlite_utils.SqliteFunc(db_name)
+    try:
+        monkeypatch.setattr(sqlite_utils, 'MIGRATIONS', sqlite_utils.MIGRATIONS[:9])
+        db_handler.migrate()
+        monkeypatch.undo()
+        # the index as migration 2 made it before: credit included
+        with db_handler.manager.transaction() as curs:
+            for trigger in ('clients_fts_insert', 'clients_fts_delete', 'clients_fts_update'):
+                curs.execute('DROP TRIGGER {}'.format(trigger))
+            curs.execute('DROP TABLE Clients_fts')
+            curs.execute("CREATE VIRTUAL TABLE Clients_fts USING fts5(name, phone, credit, content='Clients', "
+                         "content_rowid='id', tokenize='trigram')")
+            curs.execute("""CREATE TRIGGER clients_fts_insert AFTER INSERT ON Clients BEGIN
+                                INSERT INTO Clients_fts(rowid, name, phone, credit)
+                                VALUES(new.id, new.name, new.phone, new.credit);
+                            END""")
+        db_handler.add_clients('Ali', '0555123456')
+
+        assert db_handler.migrate() == [10]
+        columns = [name for name, in db_handler.make_query("SELECT name FROM pragma_table_info('Clients_fts')")[1]]
+        assert columns == ['name', 'phone']
+        desc, rows = db_handler.make_query("SELECT sql FROM sqlite_master WHERE name = 'clients_fts_update'")
+        assert 'UPDATE OF name, phone ON' in rows[0][0]
+        db_handler.add_credit(1, '5000', '2026-10-18')
+        db_handler.make_query("UPDATE Clients SET name = 'Omar' WHERE id = 1")
+        assert [row[1] for row in db_handler.search_clients('Oma')] == ['Omar']
+        assert db_handler.search_clients('Ali') == []
+        assert [row[1] for row in db_handler.search_clients('0555')] == ['Omar']
+        assert db_handler.make_query("INSERT INTO Clients_fts(Clients_fts) VALUES('integrity-check')")
+    finally:
+        db_handler.close()
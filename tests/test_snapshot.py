@@ -0,0 +1,57 @@
+import json
+
+import sqlite_snapshot
+import sqlite_utils
+
+
+def make_ledger(tmp_path):
+    db_name = str(tmp_path / 'creadit.db')
+    sqlite_utils.create_database(db_name)
+    db_handler = sqlite_utils.SqliteFunc(db_name)
+    db_handler.migrate()
+    for name, phone in (('Ali', '0555123456'), ('Omar', '0661000000'), ('Sami', '0770000000')):
+        db_handler.add_clients(name, phone)
+    db_handler.add_credit(1, '100', '2024-01-10')
+    db_handler.add_credit(2, '50', '2024-02-10')
+    return db_handler
+
+
+def part_rows(directory, part):
+    rows = []
+    for group in sqlite_snapshot.read_columns(directory / part['part']):
+        rows += [dict(zip(group, values)) for values in zip(*group.values())]
+    return rows
+
+
+def test_snapshot_increments(tmp_path):
+    db_handler = make_ledger(tmp_path)
+    directory = tmp_path / 'analytics'
+    try:
+        counts = sqlite_snapshot.snapshot(db_handler, directory, fmt='columns', row_group=2)
+        assert counts == {'Clients': 3, 'Credits': 2, 'Payments_log': 0}
+
+        # nothing new: no part
+        assert sqlite_snapshot.snapshot(db_handler, directory) == {'Clients': 0, 'Credits': 0, 'Payments_log': 0}
+
+        # a payment change an old invoice and its client; a new invoice for Sami
+        db_handler.add_payment(1, 1, '100')
+        db_handler.add_credit(3, '25', '2024-03-10')
+        counts = sqlite_snapshot.snapshot(db_handler, directory)
+        assert counts == {'Clients': 2, 'Credits': 2, 'Payments_log': 1}
+
+        manifest = json.loads((directory / 'snapshot.json').read_text())
+        assert manifest['snapshot'] == 3 and manifest['format'] == 'columns'
+        assert manifest['last_ids'] == {'client': 3, 'credit': 3, 'payment': 1}
+        credits = manifest['tables']['Credits']
+        assert [part['rows'] for part in credits] == [2, 2]
+        rows = part_rows(directory, credits[-1])
+        assert [(row['id'], row['reste'], row['paid'], row['_snapshot']) for row in rows] == [
+            (1, 0, 'paid', 3), (3, 2500, 'not paid', 3)]
+        assert [row['id'] for row in part_rows(directory, manifest['tables']['Clients'][-1])] == [1, 3]
+
+        # full: one complete part per table again
+        counts = sqlite_snapshot.snapshot(db_handler, directory, fmt='columns', full=True)
+        assert counts == {'Clients': 3, 'Credits': 3, 'Payments_log': 1}
+        assert sorted(path.name for path in (directory / 'Credits').iterdir()) == ['part-00001.json.gz']
+    finally:
+        db_handler.close()
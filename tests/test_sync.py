@@ -0,0 +1,91 @@
+import sqlite_sync
+import sqlite_utils
+
+
+def make_handler(db_name):
+    sqlite_utils.create_database(db_name)
+    db_handler = sqlite_utils.SqliteFunc(db_name)
+    db_handler.migrate()
+    return db_handler
+
+
+def add_client(db_handler, name, phone, credit):
+    db_handler.add_clients(name, phone)
+    client_id = db_handler.make_query('SELECT id FROM Clients WHERE phone = ?', [phone])[1][0][0]
+    db_handler.add_credit(client_id, credit, '2026-10-18')
+    fact_id = db_handler.make_query('SELECT MAX(id) FROM Credits WHERE client_id = ?', [client_id])[1][0][0]
+    return client_id, fact_id
+
+
+def ledger(db_handler):
+    # the rows by their global keys; local ids differ between the two shops
+    return (db_handler.make_query('SELECT phone, name, credit FROM Clients ORDER BY phone')[1],
+            db_handler.make_query("""SELECT Credits.uid, phone, Credits.credit, versement, reste, paid
+                                     FROM Credits JOIN Clients ON Clients.id = client_id ORDER BY Credits.uid""")[1],
+            db_handler.make_query("""SELECT Payments_log.uid, Credits.uid, payment FROM Payments_log
+                                     JOIN Credits ON Credits.id = fact_id ORDER BY Payments_log.uid""")[1])
+
+
+def change_ops(db_handler):
+    return [op for op, in db_handler.make_query('SELECT op FROM Changes ORDER BY seq')[1]]
+
+
+def test_uid_is_not_logged_as_an_update(tmp_path, monkeypatch):
+    db_name = str(tmp_path / 'creadit.db')
+    sqlite_utils.create_database(db_name)
+    db_handler = sqlite_utils.SqliteFunc(db_name)
+    try:
+        monkeypatch.setattr(sqlite_utils, 'MIGRATIONS', sqlite_utils.MIGRATIONS[:8])
+        db_handler.migrate()
+        client_id, fact_id = add_client(db_handler, 'Ali', '0555123456', '5000')
+        db_handler.add_payment(client_id, fact_id, '1000')
+        before = change_ops(db_handler)
+        monkeypatch.undo()
+        assert 9 in db_handler.migrate()
+        # the backfill of the uid is not a change
+        assert change_ops(db_handler) == before
+        assert db_handler.make_query('SELECT COUNT(*) FROM Credits WHERE uid IS NULL')[1][0][0] == 0
+
+        # a new invoice or payment is logged as an insert only
+        seq = db_handler.make_query('SELECT MAX(seq) FROM Changes')[1][0][0]
+        client_id, fact_id = add_client(db_handler, 'Omar', '0661000000', '150')
+        db_handler.add_payment(client_id, fact_id, '50')
+        rows = db_handler.make_query('SELECT table_name, op FROM Changes WHERE seq > ? ORDER BY seq', [seq])[1]
+        # the invoice update is the payment itself (versement, reste)
+        assert [row for row in rows if row[0] != 'Clients'] == [('Credits', 'I'), ('Credits', 'U'), ('Payments_log', 'I')]
+    finally:
+        db_handler.close()
+
+
+def test_merge_two_shops(tmp_path):
+    shop_a = make_handler(str(tmp_path / 'shop_a.db'))
+    shop_b = make_handler(str(tmp_path / 'shop_b.db'))
+    try:
+        ali_a, fact_a = add_client(shop_a, 'Ali', '0555123456', '5000')
+        shop_a.add_payment(ali_a, fact_a, '1000')
+        add_client(shop_a, 'Omar', '0661000000', '150')
+        ali_b, fact_b = add_client(shop_b, 'Ali', '0555123456', '200')
+        add_client(shop_b, 'Sami', '0770000000', '300')
+
+        sqlite_sync.merge(shop_a, shop_b)
+        assert ledger(shop_a) == ledger(shop_b)
+        clients, credits, payments = ledger(shop_a)
+        assert [phone for phone, name, credit in clients] == ['0555123456', '0661000000', '0770000000']
+        assert len(credits) == 4 and len(payments) == 1
+        # the balance of Ali is computed from the invoices of both shops
+        assert clients[0][2] == 4000 * 100 + 200 * 100
+
+        # merged again: nothing new either way
+        changes, other_changes = sqlite_sync.merge(shop_a, shop_b)
+        assert changes.changed == {} and other_changes.changed == {}
+        assert ledger(shop_a) == ledger(shop_b)
+
+        # a client deleted in one shop is deleted in the other one
+        sami = shop_a.make_query("SELECT id FROM Clients WHERE phone = '0770000000'")[1][0][0]
+        shop_a.delete_client(sami)
+        sqlite_sync.merge(shop_a, shop_b)
+        assert ledger(shop_a) == ledger(shop_b)
+        assert '0770000000' not in [phone for phone, name, credit in ledger(shop_b)[0]]
+    finally:
+        shop_a.close()
+        shop_b.close()
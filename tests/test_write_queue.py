@@ -0,0 +1,25 @@
+import sqlite3
+
+import pytest
+
+import sqlite_utils
+
+
+def test_failed_begin_reach_the_callers(tmp_path):
+    db_name = str(tmp_path / 'creadit.db')
+    sqlite_utils.create_database(db_name)
+    manager = sqlite_utils.ConnectionManager(db_name, busy_timeout=10, retry=sqlite_utils.RetryPolicy(attempts=1))
+    write_queue = sqlite_utils.WriteQueue(manager, durable=False)
+    # another process hold the write lock: BEGIN IMMEDIATE of the queue is busy
+    other = sqlite3.connect(db_name)
+    other.execute('BEGIN IMMEDIATE')
+    try:
+        futures = [write_queue.submit(lambda curs: curs.execute('SELECT 1')) for i in range(3)]
+        for future in futures:
+            with pytest.raises(sqlite3.OperationalError):
+                future.result(timeout=5)
+    finally:
+        other.rollback()
+        other.close()
+        write_queue.close()
+        manager.close()